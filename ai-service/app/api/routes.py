@@ -1,27 +1,64 @@
 from __future__ import annotations
 
 import logging
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 
+from app.config import settings
+from app.core.embedder import embedding_service
 from app.core.llm import get_embeddings
+from app.core.scheduler import llm_scheduler
 from app.core.security import verify_api_key
-from app.models.database import async_fetch_one
+from app.models.database import async_fetch_one, get_pool_stats
 from app.models.schemas import (
+    AnalyzeConversationRequest,
     AnalyzeRequest,
     AnalyzeResponse,
+    BatchAnalyzeRequest,
+    BatchAnalyzeResponse,
     HealthResponse,
+    IngestJobResponse,
     IngestRequest,
-    IngestResponse,
+    ReadinessResponse,
+    StatsResponse,
 )
-from app.rag.ingest import ingest_texts
-from app.services.analyzer import analyze_conversation
+from app.rag.embedding_store import embedding_store
+from app.rag.retriever import retrieval_stats
+from app.services.admission import AdmissionRejected, analysis_admission
+from app.services.analysis_state import analysis_state
+from app.services.analyzer import (
+    AnalysisSuperseded,
+    analyze_conversation_by_id,
+    analyze_conversations_batch,
+    analyze_latest,
+    in_flight_analyses,
+)
+from app.services.compactor import conversation_compactor
+from app.services.jobs import IngestJob, job_manager
+from app.services.result_cache import analysis_cache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1")
 
 
+def _superseded(conversation_id: str) -> HTTPException:
+    # A newer analysis of the same conversation replaced this one
+    return HTTPException(
+        status_code=409,
+        detail=f"Analysis of conversation {conversation_id} superseded by a newer request",
+    )
+
+
+def _overloaded(exc: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(exc),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @router.post(
     "/analyze",
     response_model=AnalyzeResponse,
@@ -29,35 +66,132 @@ router = APIRouter(prefix="/v1")
 )
 async def analyze(request: AnalyzeRequest) -> AnalyzeResponse:
     try:
-        result = await analyze_conversation(
-            conversation_id=request.conversation_id,
-            messages=request.messages,
-        )
+        async with analysis_admission.slot():
+            result = await analyze_latest(
+                conversation_id=request.conversation_id,
+                messages=request.messages,
+                incremental=request.incremental,
+            )
         return result
+    except AdmissionRejected as exc:
+        raise _overloaded(exc) from exc
+    except AnalysisSuperseded as exc:
+        raise _superseded(request.conversation_id) from exc
     except Exception as exc:
         logger.exception("Error analysing conversation %s", request.conversation_id)
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
 @router.post(
-    "/ingest",
-    response_model=IngestResponse,
+    "/conversations/{conversation_id}/analyze",
+    response_model=AnalyzeResponse,
     dependencies=[Depends(verify_api_key)],
 )
-async def ingest(request: IngestRequest) -> IngestResponse:
+async def analyze_by_id(
+    conversation_id: UUID,
+    request: AnalyzeConversationRequest | None = None,
+) -> AnalyzeResponse:
+    # Messages are read from the database instead of being posted
     try:
-        texts = [doc.content for doc in request.documents]
-        metadatas = [doc.metadata for doc in request.documents]
-        chunks_created = ingest_texts(
-            project_name=request.project_name,
-            texts=texts,
-            metadatas=metadatas,
-        )
-        return IngestResponse(status="ok", chunks_created=chunks_created)
+        async with analysis_admission.slot():
+            result = await analyze_conversation_by_id(
+                conversation_id,
+                incremental=request.incremental if request else None,
+            )
+    except AdmissionRejected as exc:
+        raise _overloaded(exc) from exc
+    except AnalysisSuperseded as exc:
+        raise _superseded(str(conversation_id)) from exc
     except Exception as exc:
-        logger.exception("Error ingesting documents for project %s", request.project_name)
+        logger.exception("Error analysing conversation %s", conversation_id)
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
+    if result is None:
+        raise HTTPException(
+            status_code=404, detail=f"Conversation {conversation_id} has no messages"
+        )
+    return result
+
+
+@router.post(
+    "/analyze/batch",
+    response_model=BatchAnalyzeResponse,
+    dependencies=[Depends(verify_api_key)],
+)
+async def analyze_batch(request: BatchAnalyzeRequest) -> BatchAnalyzeResponse:
+    if len(request.items) > settings.ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.ANALYZE_BATCH_MAX_ITEMS} items",
+        )
+
+    results = await analyze_conversations_batch(request.items, request.max_concurrency)
+    failed = sum(1 for r in results if r.status == "error")
+    return BatchAnalyzeResponse(
+        results=results,
+        succeeded=len(results) - failed,
+        failed=failed,
+    )
+
+
+def _job_response(job: IngestJob) -> IngestJobResponse:
+    return IngestJobResponse(
+        job_id=job.id,
+        kind=job.kind,
+        status=job.status,
+        project_name=job.project_name,
+        documents_total=job.documents_total,
+        documents_done=job.documents_done,
+        chunks_split=job.chunks_split,
+        chunks_embedded=job.chunks_embedded,
+        chunks_written=job.chunks_written,
+        chunks_carried=job.chunks_carried,
+        unchanged_projects=list(job.unchanged_projects),
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post(
+    "/ingest",
+    response_model=IngestJobResponse,
+    status_code=202,
+    dependencies=[Depends(verify_api_key)],
+)
+async def ingest(request: IngestRequest) -> IngestJobResponse:
+    job = job_manager.submit_ingest(
+        project_name=request.project_name,
+        texts=[doc.content for doc in request.documents],
+        metadatas=[doc.metadata for doc in request.documents],
+        source_key=request.source,
+    )
+    return _job_response(job)
+
+
+@router.get(
+    "/ingest/{job_id}",
+    response_model=IngestJobResponse,
+    dependencies=[Depends(verify_api_key)],
+)
+async def ingest_status(job_id: str) -> IngestJobResponse:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return _job_response(job)
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def ready(response: Response) -> ReadinessResponse:
+    startup_job = job_manager.startup_job
+    if not job_manager.ready:
+        response.status_code = 503
+    return ReadinessResponse(
+        status="ready" if job_manager.ready else "starting",
+        startup_job=_job_response(startup_job) if startup_job else None,
+    )
+
 
 @router.get("/health", response_model=HealthResponse)
 async def health() -> HealthResponse:
@@ -74,7 +208,7 @@ async def health() -> HealthResponse:
 
     try:
         client = get_embeddings()
-        client.embed_query("ping")
+        await client.aembed_query("ping")
     except Exception:
         logger.warning("Health check: OpenAI API unreachable.")
         openai_status = "unavailable"
@@ -87,3 +221,24 @@ async def health() -> HealthResponse:
         openai_status=openai_status,
         vector_store_docs=doc_count,
     )
+
+
+@router.get(
+    "/stats",
+    response_model=StatsResponse,
+    dependencies=[Depends(verify_api_key)],
+)
+async def stats() -> StatsResponse:
+    return StatsResponse(
+        database=get_pool_stats(),
+        analysis_cache=analysis_cache.stats(),
+        analysis_state=analysis_state.stats(),
+        analysis_in_flight=in_flight_analyses.stats(),
+        admission=analysis_admission.stats(),
+        llm=llm_scheduler.stats(),
+        embeddings=embedding_service.stats(),
+        embedding_store=embedding_store.stats(),
+        compaction=conversation_compactor.stats(),
+        retrieval=retrieval_stats(),
+        jobs=job_manager.stats(),
+    )
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+from functools import lru_cache
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
+
+from app.chains.priority import VALID_PRIORITIES
+from app.chains.prompts import COMBINED_ANALYSIS_PROMPT
+from app.chains.tagger import filter_valid_tags
+from app.core.llm import get_llm
+from app.core.scheduler import run_chain
+from app.models.schemas import AnalyzeResponse
+
+logger = logging.getLogger(__name__)
+
+
+class CombinedAnalysisError(ValueError):
+    pass
+
+
+def parse_analysis(raw: str) -> AnalyzeResponse:
+    # Strip markdown code fences if present
+    cleaned = re.sub(r"```(?:json)?", "", raw).strip().strip("`")
+
+    try:
+        parsed = json.loads(cleaned)
+    except json.JSONDecodeError:
+        match = re.search(r"\{.*}", cleaned, re.DOTALL)
+        if not match:
+            raise CombinedAnalysisError(f"No JSON object in output: {raw[:200]}")
+        try:
+            parsed = json.loads(match.group())
+        except json.JSONDecodeError as exc:
+            raise CombinedAnalysisError(f"Invalid JSON in output: {raw[:200]}") from exc
+
+    if not isinstance(parsed, dict):
+        raise CombinedAnalysisError(f"Expected a JSON object, got: {raw[:200]}")
+
+    summary = parsed.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        raise CombinedAnalysisError("Missing or empty 'summary'")
+
+    priority = parsed.get("priority")
+    if not isinstance(priority, str) or priority.strip().lower() not in VALID_PRIORITIES:
+        raise CombinedAnalysisError(f"Invalid 'priority': {priority!r}")
+
+    tags = parsed.get("tags")
+    if not isinstance(tags, list):
+        raise CombinedAnalysisError(f"Invalid 'tags': {tags!r}")
+
+    return AnalyzeResponse(
+        summary=summary.strip(),
+        tags=filter_valid_tags(tags),
+        priority=priority.strip().lower(),
+    )
+
+
+@lru_cache(maxsize=1)
+def build_combined_chain() -> Runnable:
+    # JSON mode guarantees a syntactically valid object; the schema is still
+    # validated by parse_analysis.
+    llm = get_llm(temperature=0.0).bind(response_format={"type": "json_object"})
+    return COMBINED_ANALYSIS_PROMPT | llm | StrOutputParser()
+
+
+async def generate_analysis(
+    conversation_id: str,
+    conversation_text: str,
+    project_context: str = "",
+) -> AnalyzeResponse:
+    chain = build_combined_chain()
+    raw: str = await run_chain(
+        chain,
+        {
+            "conversation_id": conversation_id,
+            "conversation": conversation_text,
+            "project_context": project_context or "No hay contexto adicional disponible.",
+        },
+    )
+    return parse_analysis(raw)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
+
+from app.chains.prompts import CONDENSE_PROMPT
+from app.config import settings
+from app.core.llm import get_llm
+from app.core.scheduler import run_chain
+
+
+@lru_cache(maxsize=1)
+def build_condense_chain() -> Runnable:
+    llm = get_llm(temperature=0.0)
+    return CONDENSE_PROMPT | llm | StrOutputParser()
+
+
+async def generate_condensed_history(
+    conversation_text: str,
+    previous_summary: str = "",
+) -> str:
+    chain = build_condense_chain()
+    result: str = await run_chain(
+        chain,
+        {
+            "conversation": conversation_text,
+            "previous_summary": previous_summary or "(ninguno)",
+            "max_words": settings.CONVERSATION_SUMMARY_MAX_WORDS,
+        },
+    )
+    return result.strip()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import json
+from functools import lru_cache
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
+
+from app.chains.combined import parse_analysis
+from app.chains.prompts import INCREMENTAL_ANALYSIS_PROMPT
+from app.core.llm import get_llm
+from app.core.scheduler import run_chain
+from app.models.schemas import AnalyzeResponse
+
+
+@lru_cache(maxsize=1)
+def build_incremental_chain() -> Runnable:
+    llm = get_llm(temperature=0.0).bind(response_format={"type": "json_object"})
+    return INCREMENTAL_ANALYSIS_PROMPT | llm | StrOutputParser()
+
+
+# Updates a previous analysis with the messages that arrived after it. Raises
+# CombinedAnalysisError when the output does not validate.
+async def generate_incremental_analysis(
+    conversation_id: str,
+    previous: AnalyzeResponse,
+    previous_count: int,
+    new_messages_text: str,
+    project_context: str = "",
+) -> AnalyzeResponse:
+    chain = build_incremental_chain()
+    raw: str = await run_chain(
+        chain,
+        {
+            "conversation_id": conversation_id,
+            "previous_count": previous_count,
+            "previous_summary": previous.summary,
+            "previous_tags": json.dumps(previous.tags, ensure_ascii=False),
+            "previous_priority": previous.priority,
+            "conversation": new_messages_text,
+            "project_context": project_context or "No hay contexto adicional disponible.",
+        },
+    )
+    return parse_analysis(raw)
@@ -8,6 +8,7 @@ from langchain_core.runnables import Runnable
 
 from app.chains.prompts import PRIORITY_PROMPT
 from app.core.llm import get_llm
+from app.core.scheduler import run_chain
 
 logger = logging.getLogger(__name__)
 
@@ -42,10 +43,11 @@ async def generate_priority(
     project_context: str = "",
 ) -> str:
     chain = build_priority_chain()
-    raw: str = await chain.ainvoke(
+    raw: str = await run_chain(
+        chain,
         {
             "conversation": conversation_text,
             "project_context": project_context or "No hay contexto adicional disponible.",
-        }
+        },
     )
     return _parse_priority(raw)
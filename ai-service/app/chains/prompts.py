@@ -1,5 +1,46 @@
 from langchain_core.prompts import ChatPromptTemplate
 
+# Bump whenever any prompt below changes; it is part of the analysis cache key.
+PROMPT_VERSION = "3"
+
+_TAG_DEFINITIONS = (
+    "- hot-lead: El prospecto muestra alta intencion de compra, quiere agendar visita o pide cotizacion formal.\n"
+    "- cold-lead: Interes bajo o nulo; solo busca informacion general sin compromiso.\n"
+    "- pricing: Se discuten precios, enganche, mensualidades o descuentos.\n"
+    "- financing: Se mencionan creditos (Infonavit, Fovissste, bancario), pre-aprobaciones o esquemas de pago.\n"
+    "- site-visit: Se agenda, solicita o menciona una visita al desarrollo o showroom.\n"
+    "- follow-up: Hay tareas pendientes que requieren seguimiento del asesor.\n"
+    "- urgent: El prospecto expresa urgencia explicita (fecha limite, cambio de residencia pronto, etc.).\n"
+    "- investor: El prospecto busca la propiedad como inversion o para renta.\n"
+    "- first-home: El prospecto busca su primera vivienda.\n"
+    "- family: El prospecto tiene familia y busca espacio adecuado para hijos.\n"
+    "- premium: Interes en unidades de lujo, penthouses o amenidades premium.\n"
+    "- comparison: El prospecto compara activamente con otros desarrollos o proyectos.\n"
+    "- early-stage: Primeros contactos; el prospecto aun esta en etapa de exploracion.\n"
+    "- infonavit: Se menciona especificamente el uso de credito Infonavit.\n"
+    "- documentation: Se discuten documentos requeridos (identificacion, comprobantes, etc.).\n"
+    "- negotiation: Se negocia precio, condiciones o extras.\n"
+)
+
+_PRIORITY_CRITERIA = (
+    "HIGH (alta):\n"
+    "- El prospecto quiere agendar una visita o ya la tiene agendada.\n"
+    "- Pregunta por disponibilidad inmediata o pasos para apartar.\n"
+    "- Tiene pre-aprobacion de credito o menciona tener enganche listo.\n"
+    "- Expresa urgencia o una fecha limite para decidir.\n"
+    "- Solicita cotizacion formal o contrato.\n\n"
+    "MEDIUM (media):\n"
+    "- Muestra interes activo: hace preguntas especificas sobre precios, planos o amenidades.\n"
+    "- Compara opciones entre proyectos.\n"
+    "- Pregunta sobre esquemas de financiamiento sin tener pre-aprobacion.\n"
+    "- Solicita mas informacion pero sin compromiso inmediato.\n\n"
+    "LOW (baja):\n"
+    "- Solo pide informacion general.\n"
+    "- Etapa muy temprana de exploracion.\n"
+    "- No hay senales de urgencia ni de intencion de compra proxima.\n"
+    "- Respuestas escuetas o evasivas.\n"
+)
+
 SUMMARY_PROMPT = ChatPromptTemplate.from_messages(
     [
         (
@@ -41,22 +82,8 @@ TAGGER_PROMPT = ChatPromptTemplate.from_messages(
                 "en Mexico. Analiza conversaciones entre asesores y prospectos y asigna "
                 "las etiquetas (tags) que apliquen.\n\n"
                 "Etiquetas disponibles y sus criterios:\n"
-                "- hot-lead: El prospecto muestra alta intencion de compra, quiere agendar visita o pide cotizacion formal.\n"
-                "- cold-lead: Interes bajo o nulo; solo busca informacion general sin compromiso.\n"
-                "- pricing: Se discuten precios, enganche, mensualidades o descuentos.\n"
-                "- financing: Se mencionan creditos (Infonavit, Fovissste, bancario), pre-aprobaciones o esquemas de pago.\n"
-                "- site-visit: Se agenda, solicita o menciona una visita al desarrollo o showroom.\n"
-                "- follow-up: Hay tareas pendientes que requieren seguimiento del asesor.\n"
-                "- urgent: El prospecto expresa urgencia explicita (fecha limite, cambio de residencia pronto, etc.).\n"
-                "- investor: El prospecto busca la propiedad como inversion o para renta.\n"
-                "- first-home: El prospecto busca su primera vivienda.\n"
-                "- family: El prospecto tiene familia y busca espacio adecuado para hijos.\n"
-                "- premium: Interes en unidades de lujo, penthouses o amenidades premium.\n"
-                "- comparison: El prospecto compara activamente con otros desarrollos o proyectos.\n"
-                "- early-stage: Primeros contactos; el prospecto aun esta en etapa de exploracion.\n"
-                "- infonavit: Se menciona especificamente el uso de credito Infonavit.\n"
-                "- documentation: Se discuten documentos requeridos (identificacion, comprobantes, etc.).\n"
-                "- negotiation: Se negocia precio, condiciones o extras.\n\n"
+                + _TAG_DEFINITIONS
+                + "\n"
                 "Informacion de proyectos para contexto:\n"
                 "---\n"
                 "{project_context}\n"
@@ -83,22 +110,8 @@ PRIORITY_PROMPT = ChatPromptTemplate.from_messages(
                 "Eres un sistema de priorizacion de prospectos para un CRM inmobiliario "
                 "en Mexico. Evalua la conversacion y determina el nivel de prioridad.\n\n"
                 "Criterios:\n\n"
-                "HIGH (alta):\n"
-                "- El prospecto quiere agendar una visita o ya la tiene agendada.\n"
-                "- Pregunta por disponibilidad inmediata o pasos para apartar.\n"
-                "- Tiene pre-aprobacion de credito o menciona tener enganche listo.\n"
-                "- Expresa urgencia o una fecha limite para decidir.\n"
-                "- Solicita cotizacion formal o contrato.\n\n"
-                "MEDIUM (media):\n"
-                "- Muestra interes activo: hace preguntas especificas sobre precios, planos o amenidades.\n"
-                "- Compara opciones entre proyectos.\n"
-                "- Pregunta sobre esquemas de financiamiento sin tener pre-aprobacion.\n"
-                "- Solicita mas informacion pero sin compromiso inmediato.\n\n"
-                "LOW (baja):\n"
-                "- Solo pide informacion general.\n"
-                "- Etapa muy temprana de exploracion.\n"
-                "- No hay senales de urgencia ni de intencion de compra proxima.\n"
-                "- Respuestas escuetas o evasivas.\n\n"
+                + _PRIORITY_CRITERIA
+                + "\n"
                 "Informacion de proyectos para contexto:\n"
                 "---\n"
                 "{project_context}\n"
@@ -114,3 +127,118 @@ PRIORITY_PROMPT = ChatPromptTemplate.from_messages(
         ),
     ]
 )
+
+COMBINED_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            (
+                "Eres un analista experto en ventas inmobiliarias en Mexico que trabaja "
+                "para un CRM. Analiza conversaciones entre asesores de ventas y "
+                "prospectos (leads) y produce, en una sola respuesta, un resumen, "
+                "las etiquetas aplicables y el nivel de prioridad.\n\n"
+                "Informacion relevante de los proyectos inmobiliarios:\n"
+                "---\n"
+                "{project_context}\n"
+                "---\n\n"
+                "RESUMEN:\n"
+                "- Un parrafo de 3 a 5 oraciones en espanol, con tono profesional y directo.\n"
+                "- Enfocate en el nivel de interes, las preguntas clave (precio, financiamiento, "
+                "ubicacion, amenidades), los puntos de accion pendientes para el asesor y "
+                "cualquier senal de urgencia.\n"
+                "- Si se menciona un proyecto especifico, incluye detalles relevantes del contexto.\n\n"
+                "ETIQUETAS disponibles y sus criterios:\n"
+                + _TAG_DEFINITIONS
+                + "\n"
+                "Asigna entre 1 y 6 etiquetas; solo las que genuinamente apliquen. "
+                "No inventes etiquetas fuera de la lista.\n\n"
+                "PRIORIDAD - criterios:\n\n"
+                + _PRIORITY_CRITERIA
+                + "\n"
+                "REGLAS:\n"
+                "- Responde UNICAMENTE con un objeto JSON valido, sin texto adicional, "
+                "con exactamente estas claves:\n"
+                '  {{"summary": "<resumen>", "tags": ["<tag>", ...], "priority": "high|medium|low"}}\n'
+                "- El resumen SIEMPRE en espanol."
+            ),
+        ),
+        (
+            "human",
+            "Conversacion (ID: {conversation_id}):\n\n{conversation}",
+        ),
+    ]
+)
+
+CONDENSE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            (
+                "Eres un asistente que condensa el historial de conversaciones entre "
+                "asesores inmobiliarios y prospectos para que otro analista pueda "
+                "continuar el analisis sin leer todos los mensajes.\n\n"
+                "Instrucciones:\n"
+                "1. Integra el resumen previo (si existe) con los mensajes nuevos en un "
+                "solo resumen actualizado.\n"
+                "2. Conserva los datos concretos: proyectos y unidades de interes, "
+                "presupuesto, enganche, tipo de credito (Infonavit, Fovissste, bancario), "
+                "fechas, visitas agendadas, documentos y compromisos pendientes.\n"
+                "3. Conserva como cambio el interes o las objeciones del prospecto a lo "
+                "largo del tiempo.\n"
+                "4. Maximo {max_words} palabras, en espanol, sin encabezados ni listas."
+            ),
+        ),
+        (
+            "human",
+            "Resumen previo:\n{previous_summary}\n\nMensajes nuevos:\n\n{conversation}",
+        ),
+    ]
+)
+
+INCREMENTAL_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            (
+                "Eres un analista experto en ventas inmobiliarias en Mexico que trabaja "
+                "para un CRM. Ya existe un analisis previo de la conversacion entre un "
+                "asesor y un prospecto; actualizalo con los mensajes nuevos y produce, "
+                "en una sola respuesta, el resumen, las etiquetas y la prioridad vigentes "
+                "para toda la conversacion.\n\n"
+                "Informacion relevante de los proyectos inmobiliarios:\n"
+                "---\n"
+                "{project_context}\n"
+                "---\n\n"
+                "RESUMEN:\n"
+                "- Un parrafo de 3 a 5 oraciones en espanol que integre el resumen previo "
+                "con lo nuevo; no solo describas los mensajes nuevos.\n"
+                "- Enfocate en el nivel de interes, las preguntas clave, los puntos de "
+                "accion pendientes para el asesor y cualquier senal de urgencia.\n\n"
+                "ETIQUETAS disponibles y sus criterios:\n"
+                + _TAG_DEFINITIONS
+                + "\n"
+                "Conserva las etiquetas previas que sigan aplicando y agrega o quita segun "
+                "los mensajes nuevos; entre 1 y 6 etiquetas, sin inventar etiquetas.\n\n"
+                "PRIORIDAD - criterios:\n\n"
+                + _PRIORITY_CRITERIA
+                + "\n"
+                "REGLAS:\n"
+                "- Responde UNICAMENTE con un objeto JSON valido, sin texto adicional, "
+                "con exactamente estas claves:\n"
+                '  {{"summary": "<resumen>", "tags": ["<tag>", ...], "priority": "high|medium|low"}}\n'
+                "- El resumen SIEMPRE en espanol."
+            ),
+        ),
+        (
+            "human",
+            (
+                "Conversacion (ID: {conversation_id})\n\n"
+                "Analisis previo ({previous_count} mensajes):\n"
+                "- Resumen: {previous_summary}\n"
+                "- Etiquetas: {previous_tags}\n"
+                "- Prioridad: {previous_priority}\n\n"
+                "Mensajes nuevos:\n\n{conversation}"
+            ),
+        ),
+    ]
+)
@@ -7,6 +7,7 @@ from langchain_core.runnables import Runnable
 
 from app.chains.prompts import SUMMARY_PROMPT
 from app.core.llm import get_llm
+from app.core.scheduler import run_chain
 
 
 @lru_cache(maxsize=1)
@@ -21,11 +22,12 @@ async def generate_summary(
     project_context: str = "",
 ) -> str:
     chain = build_summary_chain()
-    result: str = await chain.ainvoke(
+    result: str = await run_chain(
+        chain,
         {
             "conversation_id": conversation_id,
             "conversation": conversation_text,
             "project_context": project_context or "No hay contexto adicional disponible.",
-        }
+        },
     )
     return result.strip()
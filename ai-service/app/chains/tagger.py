@@ -10,6 +10,7 @@ from langchain_core.runnables import Runnable
 
 from app.chains.prompts import TAGGER_PROMPT
 from app.core.llm import get_llm
+from app.core.scheduler import run_chain
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,10 @@ VALID_TAGS: frozenset[str] = frozenset(
 )
 
 
+def filter_valid_tags(values: list) -> list[str]:
+    return [t for t in values if isinstance(t, str) and t in VALID_TAGS]
+
+
 def _parse_tags(raw: str) -> list[str]:
     # Strip markdown code fences if present
     cleaned = re.sub(r"```(?:json)?", "", raw).strip().strip("`")
@@ -42,7 +47,7 @@ def _parse_tags(raw: str) -> list[str]:
     try:
         parsed = json.loads(cleaned)
         if isinstance(parsed, list):
-            return [t for t in parsed if isinstance(t, str) and t in VALID_TAGS]
+            return filter_valid_tags(parsed)
     except json.JSONDecodeError:
         pass
 
@@ -52,7 +57,7 @@ def _parse_tags(raw: str) -> list[str]:
         try:
             parsed = json.loads(match.group())
             if isinstance(parsed, list):
-                return [t for t in parsed if isinstance(t, str) and t in VALID_TAGS]
+                return filter_valid_tags(parsed)
         except json.JSONDecodeError:
             pass
 
@@ -71,10 +76,11 @@ async def generate_tags(
     project_context: str = "",
 ) -> list[str]:
     chain = build_tagger_chain()
-    raw: str = await chain.ainvoke(
+    raw: str = await run_chain(
+        chain,
         {
             "conversation": conversation_text,
             "project_context": project_context or "No hay contexto adicional disponible.",
-        }
+        },
     )
     return _parse_tags(raw)
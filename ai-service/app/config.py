@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,13 +13,104 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-4o-mini"
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    # Output size of EMBEDDING_MODEL; part of the embedding store key
+    EMBEDDING_DIMENSIONS: int = 1536
+    EMBEDDING_STORE_ENABLED: bool = True
+    # Retries per chain call, each through a new scheduler slot
     LLM_MAX_RETRIES: int = 3
+    # LLM scheduler limits; per-minute budgets of 0 are unlimited
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_RPM_LIMIT: int = 500
+    LLM_TPM_LIMIT: int = 200_000
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = 300
+
+    EMBED_BATCH_WINDOW_MS: float = 5.0
+    EMBED_MAX_BATCH_SIZE: int = 64
+    EMBED_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+
+    # "combined" asks for summary, tags and priority in one structured call
+    ANALYSIS_MODE: Literal["parallel", "combined"] = "parallel"
+
+    # Admission for the analyze routes; requests beyond it get a 429
+    ANALYZE_MAX_IN_FLIGHT: int = 32
+    ANALYZE_MAX_QUEUE: int = 64
+    ANALYZE_MAX_QUEUE_WAIT_SECONDS: float = 10.0
+
+    ANALYZE_BATCH_CONCURRENCY: int = 8
+    ANALYZE_BATCH_MAX_ITEMS: int = 1_000
+
+    ANALYSIS_CACHE_ENABLED: bool = True
+    ANALYSIS_CACHE_TTL_SECONDS: int = 86_400
+    ANALYSIS_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    ANALYSIS_CACHE_PERSIST: bool = False
+
+    # Stateful analysis: later analyses send only the messages past the watermark
+    ANALYSIS_INCREMENTAL: bool = False
+    ANALYSIS_INCREMENTAL_MAX_NEW_TOKENS: int = 2_000
+    # Rows per round trip when /v1/conversations/{id}/analyze streams messages
+    CONVERSATION_FETCH_BATCH: int = 200
+
+    # Threads over CONVERSATION_MAX_TOKENS summarize all but the newest messages
+    CONVERSATION_COMPACTION_ENABLED: bool = True
+    CONVERSATION_MAX_TOKENS: int = 3_000
+    CONVERSATION_KEEP_RECENT: int = 12
+    CONVERSATION_SUMMARY_MAX_WORDS: int = 180
+    CONVERSATION_SUMMARY_CACHE_MAX_BYTES: int = 4 * 1024 * 1024
+    CONVERSATION_SUMMARY_CACHE_TTL_SECONDS: int = 7 * 86_400
 
     DATABASE_URL: str
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 5.0
 
     RAG_CHUNK_SIZE: int = 600
     RAG_CHUNK_OVERLAP: int = 100
     RAG_TOP_K: int = 4
+    # Context handed to the chains, picked by MMR from the candidates
+    RAG_CONTEXT_CANDIDATES: int = 6
+    RAG_CONTEXT_MAX_CHUNKS_PER_PROJECT: int = 3
+    RAG_CONTEXT_MMR_LAMBDA: float = 0.7
+    RAG_CONTEXT_MAX_TOKENS: int = 1200
+    # Project JSON files: one chunk per section, or flattened text ("flat")
+    RAG_JSON_CHUNKING: Literal["structured", "flat"] = "structured"
+    RAG_SECTION_MAX_CHARS: int = 1500
+
+    # Chunks per embedding request and requests in flight during ingestion
+    INGEST_EMBED_BATCH_SIZE: int = 128
+    INGEST_MAX_INFLIGHT_BATCHES: int = 3
+    # Finished ingest jobs kept for GET /v1/ingest/{id}
+    JOBS_HISTORY_LIMIT: int = 200
+
+    # Approximate nearest-neighbour index on project_embeddings.embedding
+    RAG_INDEX_TYPE: Literal["hnsw", "ivfflat", "none"] = "hnsw"
+    # Quantized profiles re-rank top_k * RAG_RERANK_FACTOR at full precision
+    RAG_VECTOR_PRECISION: Literal["full", "half", "binary"] = "full"
+    RAG_RERANK_FACTOR: int = 4
+    RAG_INDEX_AUTO_CREATE: bool = True
+    RAG_HNSW_M: int = 16
+    RAG_HNSW_EF_CONSTRUCTION: int = 64
+    RAG_HNSW_EF_SEARCH: int = 40
+    RAG_IVFFLAT_LISTS: int = 0  # 0 = derive from row count at build time
+    RAG_IVFFLAT_PROBES: int = 10
+    # Rebuild once rows ingested since the last build exceed this fraction
+    RAG_INDEX_REBUILD_THRESHOLD: float = 0.3
+
+    # "memory" searches per-project matrices held in process
+    RAG_RETRIEVAL_BACKEND: Literal["postgres", "memory"] = "postgres"
+    RAG_MEMORY_INDEX_REFRESH_SECONDS: float = 30.0
+
+    # "hybrid" fuses full-text and vector results with reciprocal-rank fusion
+    RAG_RETRIEVAL_MODE: Literal["vector", "hybrid"] = "vector"
+    RAG_RRF_K: int = 60
+    RAG_HYBRID_CANDIDATE_FACTOR: int = 3
+    # Hybrid only: skip embedding when keyword matches reach the confidence
+    RAG_LEXICAL_FAST_PATH: bool = False
+    RAG_LEXICAL_CONFIDENCE: float = 0.5
+
+    # Retrieval results, keyed on the live project versions
+    RAG_RETRIEVAL_CACHE_ENABLED: bool = True
+    RAG_RETRIEVAL_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+    RAG_RETRIEVAL_CACHE_TTL_SECONDS: int = 900
 
     AI_SERVICE_API_KEY: str = ""
 
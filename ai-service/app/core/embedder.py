@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any
+
+import numpy as np
+
+from app.config import settings
+from app.core.cache import ByteLRUCache
+from app.core.llm import get_embeddings
+from app.rag.embedding_store import embedding_store
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_SAMPLES = 1_000
+
+
+# Single-flight, micro-batched embeddings behind an LRU and the persistent store
+class EmbeddingService:
+    def __init__(self) -> None:
+        self._cache: ByteLRUCache[np.ndarray] = ByteLRUCache(
+            max_bytes=settings.EMBED_CACHE_MAX_BYTES
+        )
+        self._in_flight: dict[str, asyncio.Future[np.ndarray]] = {}
+        self._queue: list[str] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._background: set[asyncio.Task[None]] = set()
+
+        self.requests = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.texts_embedded = 0
+        self.errors = 0
+        self._batch_latencies_ms: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._batch_sizes: deque[int] = deque(maxlen=_LATENCY_SAMPLES)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        self.requests += 1
+
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+
+        future = self._in_flight.get(text)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[text] = future
+            self._enqueue(text)
+
+        # Shielded so a cancelled caller does not cancel the shared result
+        return await asyncio.shield(future)
+
+    async def embed_many(self, texts: list[str]) -> list[np.ndarray]:
+        return list(await asyncio.gather(*(self.embed_query(t) for t in texts)))
+
+    async def embed_documents(self, texts: list[str]) -> list[np.ndarray]:
+        # Bulk path for ingestion: bypasses the micro-batcher and the LRU so
+        # document chunks do not evict hot query vectors.
+        unique = list(dict.fromkeys(texts))
+        vectors, fresh = await self._resolve(unique)
+        await embedding_store.store(fresh)
+        return [vectors[t] for t in texts]
+
+    async def _resolve(
+        self, texts: list[str]
+    ) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+        vectors = await embedding_store.lookup(texts)
+        missing = [t for t in texts if t not in vectors]
+        if not missing:
+            return vectors, {}
+
+        start = time.perf_counter()
+        try:
+            raw = await get_embeddings().aembed_documents(missing)
+        except Exception:
+            self.errors += 1
+            raise
+
+        latency_ms = (time.perf_counter() - start) * 1_000
+        self.batches += 1
+        self.texts_embedded += len(missing)
+        self._batch_latencies_ms.append(latency_ms)
+        self._batch_sizes.append(len(missing))
+        logger.debug("Embedded batch of %d texts in %.0fms", len(missing), latency_ms)
+
+        fresh: dict[str, np.ndarray] = {}
+        for text, vector in zip(missing, raw):
+            array = np.asarray(vector, dtype=np.float32)
+            array.setflags(write=False)
+            fresh[text] = array
+        vectors.update(fresh)
+        return vectors, fresh
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _enqueue(self, text: str) -> None:
+        self._queue.append(text)
+
+        if len(self._queue) >= settings.EMBED_MAX_BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                settings.EMBED_BATCH_WINDOW_MS / 1_000, self._flush
+            )
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        while self._queue:
+            batch = self._queue[: settings.EMBED_MAX_BATCH_SIZE]
+            del self._queue[: settings.EMBED_MAX_BATCH_SIZE]
+            self._spawn(self._run_batch(batch))
+
+    def _fail(self, futures: dict[str, asyncio.Future[np.ndarray]], exc: BaseException) -> None:
+        for text, future in futures.items():
+            if future.done():
+                continue
+            future.set_exception(exc)
+            # Mark retrieved so an abandoned future does not log noise
+            future.exception()
+            if self._in_flight.get(text) is future:
+                del self._in_flight[text]
+
+    async def _run_batch(self, batch: list[str]) -> None:
+        futures = {text: f for text in batch if (f := self._in_flight.get(text)) is not None}
+        try:
+            try:
+                vectors, fresh = await self._resolve(batch)
+            except Exception as exc:
+                logger.warning("Embedding batch of %d texts failed: %s", len(batch), exc)
+                self._fail(futures, exc)
+                return
+
+            if fresh:
+                # Persisting is off the request path
+                self._spawn(embedding_store.store(fresh))
+
+            for text in batch:
+                array = vectors[text]
+                self._cache.set(text, array, size=array.nbytes)
+                future = self._in_flight.pop(text, None)
+                if future is not None and not future.done():
+                    future.set_result(array)
+        finally:
+            # A cancelled batch must not leave callers, or later callers
+            # coalescing onto the same texts, waiting on dead futures
+            self._fail(
+                futures, RuntimeError(f"Embedding batch of {len(batch)} texts was cancelled")
+            )
+
+    def stats(self) -> dict[str, Any]:
+        latencies = np.asarray(self._batch_latencies_ms) if self._batch_latencies_ms else None
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "texts_embedded": self.texts_embedded,
+            "errors": self.errors,
+            "in_flight": len(self._in_flight),
+            "avg_batch_size": (
+                round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0.0
+            ),
+            "batch_latency_p50_ms": (
+                round(float(np.percentile(latencies, 50)), 1) if latencies is not None else 0.0
+            ),
+            "batch_latency_p99_ms": (
+                round(float(np.percentile(latencies, 99)), 1) if latencies is not None else 0.0
+            ),
+            "cache": self._cache.stats(),
+        }
+
+
+embedding_service = EmbeddingService()
@@ -7,25 +7,38 @@ from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from app.config import settings
 
 
+# Chat models back the scheduled chains only. The client does not retry:
+# app.core.scheduler.run_chain retries through a new scheduler slot, so every
+# attempt is counted against the request and token budgets.
 @lru_cache(maxsize=4)
 def get_llm(temperature: float = 0.0) -> ChatOpenAI:
     return ChatOpenAI(
         model=settings.OPENAI_MODEL,
         api_key=settings.OPENAI_API_KEY,
         temperature=temperature,
-        max_retries=settings.LLM_MAX_RETRIES,
+        max_retries=0,
     )
 
 
 _embeddings: OpenAIEmbeddings | None = None
 
 
+def supports_dimensions(model: str) -> bool:
+    # Only the text-embedding-3 family accepts a shortened output size
+    return model.startswith("text-embedding-3")
+
+
 def get_embeddings() -> OpenAIEmbeddings:
     global _embeddings
     if _embeddings is None:
         _embeddings = OpenAIEmbeddings(
             model=settings.EMBEDDING_MODEL,
             api_key=settings.OPENAI_API_KEY,
+            dimensions=(
+                settings.EMBEDDING_DIMENSIONS
+                if supports_dimensions(settings.EMBEDDING_MODEL)
+                else None
+            ),
         )
     return _embeddings
 
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Literal
+
+import numpy as np
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+from app.config import settings
+from app.core.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+Priority = Literal["interactive", "batch"]
+
+# Lower value is served first
+_PRIORITY_ORDER: dict[str, int] = {"interactive": 0, "batch": 1}
+_WAIT_SAMPLES = 1_000
+# Backoff between attempts when the response names no retry-after
+_RETRY_BASE_SECONDS = 0.5
+_RETRY_MAX_SECONDS = 30.0
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "llm_priority", default="interactive"
+)
+
+
+@contextmanager
+def llm_priority(priority: Priority) -> Iterator[None]:
+    # Applies to LLM calls made in this context and in tasks started from it
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    # Holds up to one minute of budget, refilled continuously; rate 0 disables
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        # A request larger than the whole budget waits for a full bucket
+        missing = min(amount, self.capacity) - self._level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def consume(self, amount: float) -> None:
+        if self.enabled:
+            self._refill()
+            self._level -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        if self.enabled:
+            self._level = 0.0
+            self._updated = time.monotonic()
+
+    @property
+    def level(self) -> float:
+        if self.enabled:
+            self._refill()
+        return self._level
+
+
+@dataclass(order=True)
+class _Waiter:
+    order: int
+    seq: int
+    tokens: int = field(compare=False)
+    priority: Priority = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+
+
+# Serves chain calls by priority, then arrival, within the concurrency and
+# per-minute budgets; a 429 drains the budgets so queued calls back off together
+class LLMScheduler:
+    def __init__(self) -> None:
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._wakeup: asyncio.TimerHandle | None = None
+        self._rpm = TokenBucket(settings.LLM_RPM_LIMIT)
+        self._tpm = TokenBucket(settings.LLM_TPM_LIMIT)
+
+        self.granted: dict[str, int] = {p: 0 for p in _PRIORITY_ORDER}
+        self.rate_limited = 0
+        self.retries = 0
+        self.max_queue_depth = 0
+        self._waits_ms: dict[str, deque[float]] = {
+            p: deque(maxlen=_WAIT_SAMPLES) for p in _PRIORITY_ORDER
+        }
+
+    def _dispatch(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        while self._queue and self._in_flight < settings.LLM_MAX_CONCURRENCY:
+            head = self._queue[0]
+            if head.future.done():
+                # Cancelled while queued
+                heapq.heappop(self._queue)
+                continue
+
+            delay = max(self._rpm.seconds_until(1), self._tpm.seconds_until(head.tokens))
+            if delay > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._queue)
+            self._rpm.consume(1)
+            self._tpm.consume(head.tokens)
+            self._in_flight += 1
+            self.granted[head.priority] += 1
+            self._waits_ms[head.priority].append(
+                (time.monotonic() - head.enqueued_at) * 1_000
+            )
+            head.future.set_result(None)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int) -> AsyncIterator[None]:
+        priority = _priority.get()
+        waiter = _Waiter(
+            order=_PRIORITY_ORDER[priority],
+            seq=next(self._seq),
+            tokens=estimated_tokens,
+            priority=priority,
+            enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._queue, waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted in the same tick the caller was cancelled
+                self._release()
+            raise
+
+        try:
+            yield
+        except RateLimitError:
+            self.rate_limited += 1
+            self._rpm.drain()
+            self._tpm.drain()
+            logger.warning("LLM rate limit hit; draining request and token budgets.")
+            raise
+        finally:
+            self._release()
+
+    def stats(self) -> dict[str, Any]:
+        queued: dict[str, int] = {p: 0 for p in _PRIORITY_ORDER}
+        for waiter in self._queue:
+            if not waiter.future.done():
+                queued[waiter.priority] += 1
+
+        waits: dict[str, Any] = {}
+        for priority, samples in self._waits_ms.items():
+            arr = np.asarray(samples) if samples else None
+            waits[priority] = {
+                "granted": self.granted[priority],
+                "queued": queued[priority],
+                "wait_p50_ms": round(float(np.percentile(arr, 50)), 2) if arr is not None else 0.0,
+                "wait_p99_ms": round(float(np.percentile(arr, 99)), 2) if arr is not None else 0.0,
+            }
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "queue_depth": sum(queued.values()),
+            "max_queue_depth": self.max_queue_depth,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "rpm_limit": settings.LLM_RPM_LIMIT,
+            "rpm_available": round(self._rpm.level, 1),
+            "tpm_limit": settings.LLM_TPM_LIMIT,
+            "tpm_available": round(self._tpm.level, 1),
+            "priorities": waits,
+        }
+
+
+llm_scheduler = LLMScheduler()
+
+
+def estimate_call_tokens(chain: Runnable, inputs: dict[str, Any]) -> int:
+    # Renders the chain's prompt when it starts with one; otherwise counts
+    # the inputs alone
+    first = getattr(chain, "first", None)
+    if isinstance(first, BasePromptTemplate):
+        prompt = first.format(**inputs)
+    else:
+        prompt = " ".join(str(v) for v in inputs.values())
+    return estimate_tokens(prompt) + settings.LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+def _is_retryable(exc: Exception) -> bool:
+    # The conditions the OpenAI client itself would retry on
+    if isinstance(exc, APIConnectionError):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    response = getattr(exc, "response", None)
+    if response is not None:
+        for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            try:
+                seconds = float(response.headers.get(header, "")) * scale
+            except ValueError:
+                continue
+            if 0 < seconds <= _RETRY_MAX_SECONDS:
+                return seconds
+    backoff = min(_RETRY_BASE_SECONDS * 2**attempt, _RETRY_MAX_SECONDS)
+    return backoff * random.uniform(0.5, 1.0)
+
+
+# Every attempt, retries included, queues for its own slot: a 429 has
+# already drained the buckets in slot(), so retries wait behind the budget
+# together with everything else instead of hammering the API.
+async def run_chain(chain: Runnable, inputs: dict[str, Any]) -> Any:
+    tokens = estimate_call_tokens(chain, inputs)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        try:
+            async with llm_scheduler.slot(tokens):
+                return await chain.ainvoke(inputs)
+        except Exception as exc:
+            if attempt == settings.LLM_MAX_RETRIES or not _is_retryable(exc):
+                raise
+            delay = _retry_delay(exc, attempt)
+            llm_scheduler.retries += 1
+            logger.warning(
+                "LLM call failed (%s); retry %d/%d in %.1fs.",
+                exc.__class__.__name__,
+                attempt + 1,
+                settings.LLM_MAX_RETRIES,
+                delay,
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import logging
+from functools import lru_cache
+from typing import Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# OPENAI_MODEL's tiktoken encoding (loaded off the loop at startup), or ~4 chars per token
+@lru_cache(maxsize=1)
+def token_counter() -> tuple[str, Callable[[str], int]]:
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return f"tiktoken:{encoding.name}", lambda text: len(encoding.encode(text))
+    except Exception:
+        logger.info("tiktoken unavailable; estimating tokens as characters / 4.")
+        return "chars/4", lambda text: max(1, len(text) // 4)
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return token_counter()[1](text)
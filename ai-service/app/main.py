@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
@@ -10,8 +11,9 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import router
 from app.config import settings
-from app.models.database import async_fetch_one
-from app.rag.ingest import ingest_all_project_files
+from app.core.tokens import token_counter
+from app.models.database import close_pool, open_pool
+from app.services.jobs import job_manager
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,21 +26,12 @@ logger = logging.getLogger(__name__)
 async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
     logger.info("EstateFlow AI Service starting up...")
 
+    # Loading the tokenizer may download its BPE file; keep that off the loop
+    counter_name, _ = await asyncio.to_thread(token_counter)
+    logger.info("Counting tokens with %s.", counter_name)
+
     try:
-        row = await async_fetch_one("SELECT COUNT(*) AS cnt FROM project_embeddings")
-        doc_count = row["cnt"] if row else 0
-
-        if doc_count == 0:
-            logger.info(
-                "Vector store is empty -- auto-ingesting project documents..."
-            )
-            total = ingest_all_project_files()
-            logger.info("Auto-ingest complete: %d chunks created.", total)
-        else:
-            logger.info(
-                "Vector store already contains %d chunks; skipping auto-ingest.",
-                doc_count,
-            )
+        await open_pool()
     except Exception:
         logger.warning(
             "Could not connect to the database during startup. "
@@ -46,10 +39,18 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
             "You can trigger ingestion later via POST /v1/ingest.",
             exc_info=True,
         )
+        job_manager.skip_startup_ingest()
+    else:
+        # Ingestion and index creation run in the background; /v1/ready
+        # reports 503 until this job finishes
+        job = job_manager.submit_startup_ingest()
+        logger.info("Startup auto-ingest running as job %s.", job.id)
 
     yield
 
     logger.info("EstateFlow AI Service shutting down.")
+    await job_manager.shutdown()
+    await close_pool()
 
 
 app = FastAPI(
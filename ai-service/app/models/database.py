@@ -2,45 +2,186 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from contextlib import contextmanager
-from functools import partial
-from typing import Any, Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Generator
 
-import psycopg2
-import psycopg2.extras
-from psycopg2 import pool
+import psycopg
+from pgvector.psycopg import register_vector, register_vector_async
+from psycopg import sql
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-_pool: pool.SimpleConnectionPool | None = None
+# Sync pool: used by scripts and ingestion code running outside the event loop
+_pool: ConnectionPool | None = None
 
+# Async pool: used by every request-path query
+_async_pool: AsyncConnectionPool | None = None
+_async_pool_lock = asyncio.Lock()
 
-def _get_pool() -> pool.SimpleConnectionPool:
+# Session defaults for ANN search; individual queries can override them
+# with local_settings.
+_SQL_SESSION_DEFAULTS = """
+    SELECT set_config('hnsw.ef_search', %s, false),
+           set_config('ivfflat.probes', %s, false)
+"""
+
+
+def _session_defaults() -> tuple[str, str]:
+    return (str(settings.RAG_HNSW_EF_SEARCH), str(settings.RAG_IVFFLAT_PROBES))
+
+
+# Registering the pgvector types lets numpy arrays be sent and received as
+# binary vector values instead of ~30 KB decimal strings.
+def _configure_connection(conn: psycopg.Connection) -> None:
+    register_vector(conn)
+    conn.execute(_SQL_SESSION_DEFAULTS, _session_defaults())
+    conn.commit()
+
+
+async def _configure_async_connection(conn: psycopg.AsyncConnection) -> None:
+    await register_vector_async(conn)
+    await conn.execute(_SQL_SESSION_DEFAULTS, _session_defaults())
+    await conn.commit()
+
+
+def _get_pool() -> ConnectionPool:
     global _pool
     if _pool is None or _pool.closed:
-        logger.info("Creating database connection pool for %s", settings.DATABASE_URL)
-        _pool = pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dsn=settings.DATABASE_URL,
+        logger.info("Creating sync database connection pool")
+        _pool = ConnectionPool(
+            conninfo=settings.DATABASE_URL,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            kwargs={"row_factory": dict_row},
+            configure=_configure_connection,
+            name="estateflow-sync",
+            open=True,
         )
     return _pool
 
 
+async def _get_async_pool() -> AsyncConnectionPool:
+    global _async_pool
+    if _async_pool is not None and not _async_pool.closed:
+        return _async_pool
+
+    async with _async_pool_lock:
+        if _async_pool is None or _async_pool.closed:
+            logger.info(
+                "Creating async database connection pool (min=%d, max=%d)",
+                settings.DB_POOL_MIN_SIZE,
+                settings.DB_POOL_MAX_SIZE,
+            )
+            pool = AsyncConnectionPool(
+                conninfo=settings.DATABASE_URL,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                kwargs={"row_factory": dict_row},
+                configure=_configure_async_connection,
+                name="estateflow-async",
+                open=False,
+            )
+            await pool.open()
+            _async_pool = pool
+    return _async_pool
+
+
+async def open_pool() -> None:
+    await _get_async_pool()
+
+
+async def close_pool() -> None:
+    global _async_pool, _pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def get_pool_stats() -> dict[str, Any]:
+    if _async_pool is None or _async_pool.closed:
+        return {"status": "closed"}
+
+    stats = _async_pool.get_stats()
+    size = stats.get("pool_size", 0)
+    in_use = size - stats.get("pool_available", 0)
+    max_size = stats.get("pool_max", settings.DB_POOL_MAX_SIZE) or 1
+    return {
+        "status": "open",
+        "min_size": stats.get("pool_min", settings.DB_POOL_MIN_SIZE),
+        "max_size": max_size,
+        "size": size,
+        "in_use": in_use,
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "saturation": round(in_use / max_size, 3),
+        "requests_total": stats.get("requests_num", 0),
+        "requests_queued": stats.get("requests_queued", 0),
+        "requests_wait_ms": stats.get("requests_wait_ms", 0),
+        "requests_errors": stats.get("requests_errors", 0),
+        "connections_errors": stats.get("connections_errors", 0),
+    }
+
+
 @contextmanager
-def get_connection() -> Generator[psycopg2.extensions.connection, None, None]:
-    p = _get_pool()
-    conn = p.getconn()
-    try:
+def get_connection() -> Generator[psycopg.Connection, None, None]:
+    # The pool commits on clean exit and rolls back if the block raises
+    with _get_pool().connection() as conn:
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        p.putconn(conn)
+
+
+@asynccontextmanager
+async def get_async_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    pool = await _get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def async_execute_autocommit(
+    query: str | sql.Composable,
+    params: tuple[Any, ...] | None = None,
+) -> None:
+    # Dedicated connection outside the pool for statements that cannot run
+    # inside a transaction (CREATE/DROP INDEX CONCURRENTLY, REINDEX ...).
+    async with await psycopg.AsyncConnection.connect(
+        settings.DATABASE_URL, autocommit=True
+    ) as conn:
+        await conn.execute(query, params)
+
+
+@asynccontextmanager
+async def advisory_lock(name: str) -> AsyncIterator[None]:
+    # Own connection outside any transaction, so CREATE INDEX CONCURRENTLY
+    # does not wait on it; never nest two locks with the same name
+    async with await psycopg.AsyncConnection.connect(
+        settings.DATABASE_URL, autocommit=True
+    ) as conn:
+        await conn.execute("SELECT pg_advisory_lock(hashtextextended(%s, 0))", (name,))
+        try:
+            yield
+        finally:
+            await conn.execute(
+                "SELECT pg_advisory_unlock(hashtextextended(%s, 0))", (name,)
+            )
+
+
+async def _apply_local_settings(
+    cur: psycopg.AsyncCursor,
+    local_settings: dict[str, Any] | None,
+) -> None:
+    if not local_settings:
+        return
+    exprs = ", ".join(["set_config(%s, %s, true)"] * len(local_settings))
+    params = tuple(x for k, v in local_settings.items() for x in (k, str(v)))
+    await cur.execute(f"SELECT {exprs}", params)
 
 
 def execute_query(query: str, params: tuple[Any, ...] | None = None) -> None:
@@ -50,42 +191,59 @@ def execute_query(query: str, params: tuple[Any, ...] | None = None) -> None:
 
 
 def fetch_all(
-    query: str,
+    query: str | sql.Composable,
     params: tuple[Any, ...] | None = None,
 ) -> list[dict[str, Any]]:
     with get_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute(query, params)
-            return [dict(row) for row in cur.fetchall()]
+            return cur.fetchall()
 
 
 def fetch_one(
-    query: str,
+    query: str | sql.Composable,
     params: tuple[Any, ...] | None = None,
 ) -> dict[str, Any] | None:
     with get_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute(query, params)
-            row = cur.fetchone()
-            return dict(row) if row else None
+            return cur.fetchone()
 
 
 async def async_execute_query(
-    query: str, params: tuple[Any, ...] | None = None
+    query: str | sql.Composable,
+    params: tuple[Any, ...] | None = None,
+    *,
+    prepare: bool | None = None,
 ) -> None:
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, partial(execute_query, query, params))
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, params, prepare=prepare)
 
 
 async def async_fetch_all(
-    query: str, params: tuple[Any, ...] | None = None
+    query: str | sql.Composable,
+    params: tuple[Any, ...] | None = None,
+    *,
+    prepare: bool | None = None,
+    local_settings: dict[str, Any] | None = None,
 ) -> list[dict[str, Any]]:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, partial(fetch_all, query, params))
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await _apply_local_settings(cur, local_settings)
+            await cur.execute(query, params, prepare=prepare)
+            return await cur.fetchall()
 
 
 async def async_fetch_one(
-    query: str, params: tuple[Any, ...] | None = None
+    query: str | sql.Composable,
+    params: tuple[Any, ...] | None = None,
+    *,
+    prepare: bool | None = None,
+    local_settings: dict[str, Any] | None = None,
 ) -> dict[str, Any] | None:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, partial(fetch_one, query, params))
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await _apply_local_settings(cur, local_settings)
+            await cur.execute(query, params, prepare=prepare)
+            return await cur.fetchone()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Any, Literal
 
 from pydantic import BaseModel, Field
@@ -20,6 +21,25 @@ class AnalyzeRequest(BaseModel):
     messages: list[MessageInput] = Field(
         ..., min_length=1, description="Ordered list of conversation messages."
     )
+    incremental: bool | None = Field(
+        default=None,
+        description=(
+            "Update the conversation's stored analysis with the messages past its "
+            "watermark instead of re-analysing the full history. Defaults to the "
+            "server setting."
+        ),
+    )
+
+
+class AnalyzeConversationRequest(BaseModel):
+    incremental: bool | None = Field(
+        default=None,
+        description=(
+            "Update the conversation's stored analysis with the messages past its "
+            "watermark instead of re-analysing the full history. Defaults to the "
+            "server setting."
+        ),
+    )
 
 
 class AnalyzeResponse(BaseModel):
@@ -32,6 +52,36 @@ class AnalyzeResponse(BaseModel):
     )
 
 
+class BatchAnalyzeRequest(BaseModel):
+    items: list[AnalyzeRequest] = Field(
+        ..., min_length=1, description="Conversations to analyse."
+    )
+    max_concurrency: int | None = Field(
+        default=None,
+        ge=1,
+        description="Concurrent analyses for this batch; capped by the server limit.",
+    )
+
+
+class BatchAnalyzeItem(BaseModel):
+    conversation_id: str = Field(..., description="Conversation this result is for.")
+    status: Literal["ok", "error"] = Field(..., description="Outcome of the item.")
+    result: AnalyzeResponse | None = Field(
+        default=None, description="Analysis result when status is 'ok'."
+    )
+    error: str | None = Field(
+        default=None, description="Error message when status is 'error'."
+    )
+
+
+class BatchAnalyzeResponse(BaseModel):
+    results: list[BatchAnalyzeItem] = Field(
+        ..., description="One entry per request item, in request order."
+    )
+    succeeded: int = Field(..., description="Number of items analysed successfully.")
+    failed: int = Field(..., description="Number of items that failed.")
+
+
 class DocumentInput(BaseModel):
     content: str = Field(..., description="Plain-text content of the document.")
     metadata: dict[str, Any] = Field(
@@ -45,12 +95,49 @@ class IngestRequest(BaseModel):
     documents: list[DocumentInput] = Field(
         ..., min_length=1, description="Documents to ingest."
     )
+    source: str = Field(
+        default="api",
+        min_length=1,
+        max_length=255,
+        description=(
+            "Replaces only this source's chunks of the project; "
+            "'file:<name>' is used by the bundled documents."
+        ),
+    )
 
 
-class IngestResponse(BaseModel):
-    status: str = Field(default="ok")
-    chunks_created: int = Field(
-        ..., description="Number of vector-store chunks created."
+class IngestJobResponse(BaseModel):
+    job_id: str = Field(..., description="Identifier to poll the job with.")
+    kind: Literal["ingest", "auto_ingest", "cleanup"] = Field(..., description="Job type.")
+    status: Literal["queued", "running", "succeeded", "failed"] = Field(
+        ..., description="Current state of the job."
+    )
+    project_name: str | None = Field(
+        default=None, description="Project being ingested; null for startup auto-ingest."
+    )
+    documents_total: int = Field(..., description="Documents submitted to the job.")
+    documents_done: int = Field(default=0, description="Documents fully processed.")
+    chunks_split: int = Field(default=0, description="Chunks produced by the splitter.")
+    chunks_embedded: int = Field(default=0, description="Chunks embedded so far.")
+    chunks_written: int = Field(default=0, description="Newly embedded chunks written.")
+    chunks_carried: int = Field(
+        default=0, description="Unchanged chunks carried over from the live version."
+    )
+    unchanged_projects: list[str] = Field(
+        default_factory=list, description="Projects whose content matched the live version."
+    )
+    error: str | None = Field(default=None, description="Failure reason, if any.")
+    created_at: datetime = Field(..., description="When the job was submitted.")
+    started_at: datetime | None = Field(default=None, description="When the job started.")
+    finished_at: datetime | None = Field(default=None, description="When the job finished.")
+
+
+class ReadinessResponse(BaseModel):
+    status: Literal["ready", "starting"] = Field(
+        ..., description="Whether startup ingestion has finished."
+    )
+    startup_job: IngestJobResponse | None = Field(
+        default=None, description="Startup auto-ingest job, when one was started."
     )
 
 
@@ -65,3 +152,45 @@ class HealthResponse(BaseModel):
     vector_store_docs: int = Field(
         default=0, description="Total documents in the vector store."
     )
+
+
+class StatsResponse(BaseModel):
+    database: dict[str, Any] = Field(
+        default_factory=dict, description="Connection pool usage and saturation."
+    )
+    analysis_cache: dict[str, Any] = Field(
+        default_factory=dict, description="Analysis result cache counters."
+    )
+    analysis_state: dict[str, Any] = Field(
+        default_factory=dict, description="Stored per-conversation analysis state."
+    )
+    analysis_in_flight: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Running analyses, and requests coalesced or superseded.",
+    )
+    admission: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Analyze admission queue: in flight, queued, rejections and waits.",
+    )
+    llm: dict[str, Any] = Field(
+        default_factory=dict,
+        description="LLM scheduler concurrency, rate budgets, queue depth and waits.",
+    )
+    embeddings: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Embedding micro-batcher, coalescing and latency metrics.",
+    )
+    embedding_store: dict[str, Any] = Field(
+        default_factory=dict, description="Persistent embedding store hit rate."
+    )
+    compaction: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Conversation windowing: summaries reused or built, tokens saved.",
+    )
+    retrieval: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Retrieval backend, per-backend latency and in-memory index size.",
+    )
+    jobs: dict[str, Any] = Field(
+        default_factory=dict, description="Background ingest job counts and readiness."
+    )
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Iterator
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+from psycopg import sql
+
+from app.config import settings
+from app.rag.index import build_index_sql, index_params
+from app.rag.storage import candidate_distance
+
+logger = logging.getLogger(__name__)
+
+BENCH_TABLE = "bench_embeddings"
+BENCH_PROFILE_TABLE = "bench_embeddings_profile"
+BENCH_INDEX = "idx_bench_embeddings_ann"
+_LOAD_BATCH = 10_000
+
+_SEARCH_GUC = {"hnsw": "hnsw.ef_search", "ivfflat": "ivfflat.probes"}
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    dimensions: int
+    precision: str
+
+    @classmethod
+    def parse(cls, value: str) -> StorageProfile:
+        dims, _, precision = value.partition(":")
+        precision = precision or "full"
+        if precision not in ("full", "half", "binary"):
+            raise argparse.ArgumentTypeError(f"Unknown precision: {precision}")
+        return cls(int(dims), precision)
+
+    def __str__(self) -> str:
+        return f"{self.dimensions}:{self.precision}"
+
+
+@dataclass
+class BenchResult:
+    rows: int
+    profile: str
+    method: str
+    search_param: str
+    search_value: int
+    recall_at_k: float
+    p50_ms: float
+    p99_ms: float
+    exact_p50_ms: float
+    build_seconds: float
+    table_bytes: int
+    index_bytes: int
+
+
+class SyntheticCorpus:
+    # Clustered unit vectors: real embedding corpora are far from uniform, and
+    # uniform random data makes ANN recall look unrealistically bad.
+    def __init__(self, dim: int, clusters: int, spread: float, seed: int) -> None:
+        self.dim = dim
+        self.spread = spread
+        self._rng = np.random.default_rng(seed)
+        self._centers = self._rng.standard_normal((clusters, dim)).astype(np.float32)
+
+    def _sample(self, n: int) -> np.ndarray:
+        idx = self._rng.integers(0, len(self._centers), size=n)
+        noise = self._rng.standard_normal((n, self.dim)).astype(np.float32)
+        points = self._centers[idx] + noise * self.spread
+        points /= np.linalg.norm(points, axis=1, keepdims=True)
+        return points
+
+    def batches(self, n: int, batch_size: int = _LOAD_BATCH) -> Iterator[np.ndarray]:
+        remaining = n
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            remaining -= size
+            yield self._sample(size)
+
+    def queries(self, n: int) -> np.ndarray:
+        return self._sample(n)
+
+
+def _prepare_table(conn: psycopg.Connection, dim: int) -> None:
+    conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    register_vector(conn)
+    conn.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(BENCH_TABLE)))
+    conn.execute(
+        sql.SQL(
+            "CREATE UNLOGGED TABLE {} (id BIGSERIAL PRIMARY KEY, embedding vector({}))"
+        ).format(sql.Identifier(BENCH_TABLE), sql.Literal(dim))
+    )
+
+
+def _load(conn: psycopg.Connection, corpus: SyntheticCorpus, n: int) -> None:
+    copy_sql = sql.SQL("COPY {} (embedding) FROM STDIN WITH (FORMAT BINARY)").format(
+        sql.Identifier(BENCH_TABLE)
+    )
+    loaded = 0
+    with conn.cursor() as cur:
+        for batch in corpus.batches(n):
+            with cur.copy(copy_sql) as copy:
+                copy.set_types(["vector"])
+                for vector in batch:
+                    copy.write_row([vector])
+            loaded += len(batch)
+            logger.info("Loaded %d/%d rows", loaded, n)
+    conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(BENCH_TABLE)))
+
+
+def _truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+    # Matryoshka-style shortening, as done for text-embedding-3 vectors
+    cut = vectors[..., :dims]
+    return cut / np.linalg.norm(cut, axis=-1, keepdims=True)
+
+
+def _search_sql(table: str, profile: StorageProfile | None) -> sql.Composed:
+    if profile is None or profile.precision == "full":
+        return sql.SQL("SELECT id FROM {} ORDER BY embedding <=> %b LIMIT %s").format(
+            sql.Identifier(table)
+        )
+    # Walk the quantized index for candidates, re-rank at full precision
+    distance = candidate_distance(profile.precision, profile.dimensions, "embedding", "q.v")
+    return sql.SQL(
+        "WITH q AS (SELECT %b::vector AS v) "
+        "SELECT c.id FROM q CROSS JOIN LATERAL ("
+        "SELECT id, embedding FROM {} ORDER BY " + distance + " LIMIT %s"
+        ") c ORDER BY c.embedding <=> q.v LIMIT %s"
+    ).format(sql.Identifier(table))
+
+
+def _search(
+    conn: psycopg.Connection,
+    query_sql: sql.Composed,
+    queries: np.ndarray,
+    k: int,
+    candidates: int | None = None,
+) -> tuple[list[set[int]], list[float]]:
+    results: list[set[int]] = []
+    latencies: list[float] = []
+    with conn.cursor() as cur:
+        for vector in queries:
+            params = (vector, candidates, k) if candidates else (vector, k)
+            start = time.perf_counter()
+            cur.execute(query_sql, params, prepare=True)
+            ids = {row[0] for row in cur.fetchall()}
+            latencies.append((time.perf_counter() - start) * 1_000)
+            results.append(ids)
+    return results, latencies
+
+
+def _prepare_profile_table(
+    conn: psycopg.Connection,
+    profile: StorageProfile,
+    dim: int,
+) -> str:
+    if profile.dimensions == dim:
+        return BENCH_TABLE
+    conn.execute(
+        sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(BENCH_PROFILE_TABLE))
+    )
+    conn.execute(
+        sql.SQL(
+            "CREATE UNLOGGED TABLE {} AS SELECT id, "
+            "l2_normalize(subvector(embedding, 1, {}))::vector({}) AS embedding FROM {}"
+        ).format(
+            sql.Identifier(BENCH_PROFILE_TABLE),
+            sql.Literal(profile.dimensions),
+            sql.Literal(profile.dimensions),
+            sql.Identifier(BENCH_TABLE),
+        )
+    )
+    conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(BENCH_PROFILE_TABLE)))
+    return BENCH_PROFILE_TABLE
+
+
+def _drop_index(conn: psycopg.Connection) -> None:
+    conn.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(BENCH_INDEX)))
+
+
+def run_benchmark(
+    sizes: list[int],
+    method: str,
+    search_values: list[int],
+    dim: int,
+    k: int,
+    n_queries: int,
+    clusters: int,
+    spread: float,
+    seed: int,
+    profiles: list[StorageProfile] | None = None,
+    rerank_factor: int = 4,
+) -> list[BenchResult]:
+    corpus = SyntheticCorpus(dim, clusters, spread, seed)
+    queries = corpus.queries(n_queries)
+    profiles = profiles or [StorageProfile(dim, "full")]
+    guc = _SEARCH_GUC[method]
+    results: list[BenchResult] = []
+
+    with psycopg.connect(settings.DATABASE_URL, autocommit=True) as conn:
+        conn.execute("SET maintenance_work_mem = '1GB'")
+        _prepare_table(conn, dim)
+
+        loaded = 0
+        for size in sorted(sizes):
+            # Corpora are nested: each size extends the previous one
+            _drop_index(conn)
+            _load(conn, corpus, size - loaded)
+            loaded = size
+
+            # Ground truth is exact search over the original full vectors
+            exact, exact_latencies = _search(conn, _search_sql(BENCH_TABLE, None), queries, k)
+
+            for profile in profiles:
+                table = _prepare_profile_table(conn, profile, dim)
+                profile_queries = _truncate(queries, profile.dimensions)
+                candidates = k * rerank_factor if profile.precision != "full" else None
+
+                params = index_params(method, size)
+                start = time.perf_counter()
+                conn.execute(
+                    build_index_sql(
+                        table,
+                        BENCH_INDEX,
+                        method,
+                        params,
+                        concurrently=False,
+                        precision=profile.precision,
+                        dimensions=profile.dimensions,
+                    )
+                )
+                build_seconds = time.perf_counter() - start
+                table_bytes, index_bytes = conn.execute(
+                    "SELECT pg_table_size(%s::regclass), pg_relation_size(%s::regclass)",
+                    (table, BENCH_INDEX),
+                ).fetchone()
+
+                for value in search_values:
+                    conn.execute("SELECT set_config(%s, %s, false)", (guc, str(value)))
+                    approx, latencies = _search(
+                        conn, _search_sql(table, profile), profile_queries, k, candidates
+                    )
+                    recall = float(
+                        np.mean([len(a & e) / k for a, e in zip(approx, exact)])
+                    )
+                    result = BenchResult(
+                        rows=size,
+                        profile=str(profile),
+                        method=method,
+                        search_param=guc,
+                        search_value=value,
+                        recall_at_k=round(recall, 4),
+                        p50_ms=round(float(np.percentile(latencies, 50)), 2),
+                        p99_ms=round(float(np.percentile(latencies, 99)), 2),
+                        exact_p50_ms=round(float(np.percentile(exact_latencies, 50)), 2),
+                        build_seconds=round(build_seconds, 1),
+                        table_bytes=table_bytes,
+                        index_bytes=index_bytes,
+                    )
+                    results.append(result)
+                    logger.info("%s", result)
+
+                _drop_index(conn)
+                conn.execute(
+                    sql.SQL("DROP TABLE IF EXISTS {}").format(
+                        sql.Identifier(BENCH_PROFILE_TABLE)
+                    )
+                )
+
+        conn.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(BENCH_TABLE)))
+
+    return results
+
+
+def _print_table(results: list[BenchResult], k: int) -> None:
+    header = (
+        f"{'rows':>9} {'profile':>12} {'method':>8} {'param':>16} {'recall@' + str(k):>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'exact p50':>10} {'build s':>8} "
+        f"{'table MB':>9} {'index MB':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.rows:>9} {r.profile:>12} {r.method:>8} "
+            f"{r.search_param.split('.')[1] + '=' + str(r.search_value):>16} "
+            f"{r.recall_at_k:>9.4f} {r.p50_ms:>8.2f} {r.p99_ms:>8.2f} {r.exact_p50_ms:>10.2f} "
+            f"{r.build_seconds:>8.1f} {r.table_bytes / 1_048_576:>9.1f} "
+            f"{r.index_bytes / 1_048_576:>9.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure ANN recall@k against exact search, query latency and "
+            "table/index size per storage profile over synthetic corpora. Uses "
+            f"scratch tables ({BENCH_TABLE}, {BENCH_PROFILE_TABLE}) that are "
+            "dropped afterwards."
+        )
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument(
+        "--method",
+        choices=["hnsw", "ivfflat"],
+        default="ivfflat" if settings.RAG_INDEX_TYPE == "ivfflat" else "hnsw",
+    )
+    parser.add_argument(
+        "--search-values",
+        type=int,
+        nargs="+",
+        help="ef_search values (hnsw) or probes values (ivfflat) to sweep",
+    )
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=0.35)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--profiles",
+        type=StorageProfile.parse,
+        nargs="+",
+        help=(
+            "Storage profiles as DIMENSIONS:PRECISION (full, half, binary), e.g. "
+            "1536:full 1536:half 1536:binary 512:full. Shorter profiles truncate "
+            "and re-normalize the corpus; synthetic vectors are not trained for "
+            "truncation, so their recall there is a lower bound. Default: --dim:full"
+        ),
+    )
+    parser.add_argument(
+        "--rerank-factor",
+        type=int,
+        default=settings.RAG_RERANK_FACTOR,
+        help="Quantized profiles re-rank k * factor candidates at full precision",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    search_values = args.search_values or (
+        [20, 40, 80, 160] if args.method == "hnsw" else [1, 5, 10, 20]
+    )
+    results = run_benchmark(
+        sizes=args.sizes,
+        method=args.method,
+        search_values=search_values,
+        dim=args.dim,
+        k=args.k,
+        n_queries=args.queries,
+        clusters=args.clusters,
+        spread=args.spread,
+        seed=args.seed,
+        profiles=args.profiles,
+        rerank_factor=args.rerank_factor,
+    )
+
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        _print_table(results, args.k)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
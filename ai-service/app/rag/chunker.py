@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.config import settings
+from app.core.tokens import token_counter
+
+OVERVIEW_SECTION = "overview"
+
+# text-embedding-3-small list price, USD per million input tokens
+_DEFAULT_PRICE_PER_MILLION = 0.02
+
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    text: str
+    section: str
+    key_path: str
+
+
+def flatten_json(data: dict[str, Any], prefix: str = "") -> str:
+    lines: list[str] = []
+    for key, value in data.items():
+        full_key = f"{prefix} > {key}" if prefix else key
+        if isinstance(value, dict):
+            lines.append(flatten_json(value, full_key))
+        elif isinstance(value, list):
+            for idx, item in enumerate(value):
+                if isinstance(item, dict):
+                    lines.append(flatten_json(item, f"{full_key} > {idx}"))
+                else:
+                    lines.append(f"{full_key} > {idx}: {item}")
+        else:
+            lines.append(f"{full_key}: {value}")
+    return "\n".join(lines)
+
+
+def _render(key: str, value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return flatten_json({key: value})
+    return f"{key}: {value}"
+
+
+def _label(section: str, key: str) -> str:
+    # Overview fields keep their top-level key, as in the flat rendering
+    return key if section == OVERVIEW_SECTION else f"{section} > {key}"
+
+
+def _parts(section: str, value: dict[str, Any] | list[Any]) -> list[tuple[str, str]]:
+    # Smallest units a section may be split into: list items or sub-keys
+    items = enumerate(value) if isinstance(value, list) else value.items()
+    return [(str(key), _render(_label(section, str(key)), item)) for key, item in items]
+
+
+def _section_text(section: str, value: dict[str, Any] | list[Any]) -> str:
+    return "\n".join(text for _, text in _parts(section, value))
+
+
+def _key_range(section: str, keys: list[str]) -> str:
+    if len(keys) == 1:
+        return f"{section} > {keys[0]}"
+    return f"{section} > {keys[0]}..{keys[-1]}"
+
+
+def _split_section(
+    header: str,
+    section: str,
+    value: dict[str, Any] | list[Any],
+    max_chars: int,
+) -> list[Chunk]:
+    budget = max(max_chars - len(header) - 1, 1)
+    chunks: list[Chunk] = []
+    keys: list[str] = []
+    lines: list[str] = []
+    size = 0
+
+    def emit() -> None:
+        nonlocal keys, lines, size
+        if lines:
+            chunks.append(
+                Chunk(
+                    text="\n".join([header, *lines]),
+                    section=section,
+                    key_path=_key_range(section, keys),
+                )
+            )
+        keys, lines, size = [], [], 0
+
+    for key, text in _parts(section, value):
+        if len(text) > budget:
+            # A single item over budget: fall back to character splitting,
+            # each piece still carrying the project header
+            emit()
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=budget,
+                chunk_overlap=0,
+                separators=["\n", ". ", ", ", " ", ""],
+            )
+            for piece in splitter.split_text(text):
+                chunks.append(
+                    Chunk(
+                        text=f"{header}\n{piece}",
+                        section=section,
+                        key_path=f"{section} > {key}",
+                    )
+                )
+            continue
+        if lines and size + len(text) + 1 > budget:
+            emit()
+        keys.append(key)
+        lines.append(text)
+        size += len(text) + 1
+    emit()
+    return chunks
+
+
+# Scalar fields form an overview chunk and each nested section its own;
+# sections over max_chars are split on item boundaries first
+def chunk_project_document(
+    data: dict[str, Any],
+    max_chars: int | None = None,
+) -> list[Chunk]:
+    max_chars = max_chars or settings.RAG_SECTION_MAX_CHARS
+    project_name = data.get("project_name", "")
+    header = f"project_name: {project_name}"
+
+    sections: dict[str, dict[str, Any] | list[Any]] = {}
+    overview = {k: v for k, v in data.items() if not isinstance(v, (dict, list))}
+    if overview:
+        sections[OVERVIEW_SECTION] = overview
+    sections.update(
+        (k, v) for k, v in data.items() if isinstance(v, (dict, list)) and v
+    )
+
+    chunks: list[Chunk] = []
+    for section, value in sections.items():
+        text = f"{header}\n{_section_text(section, value)}"
+        if len(text) <= max_chars:
+            chunks.append(Chunk(text=text, section=section, key_path=section))
+        else:
+            chunks.extend(_split_section(header, section, value, max_chars))
+    return chunks
+
+
+def _flat_chunks(data: dict[str, Any]) -> list[str]:
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.RAG_CHUNK_SIZE,
+        chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ". ", ", ", " ", ""],
+    )
+    return splitter.split_text(flatten_json(data))
+
+
+def compare(paths: list[Path], price_per_million: float) -> list[dict[str, Any]]:
+    counter_name, count_tokens = token_counter()
+    rows: list[dict[str, Any]] = []
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        for strategy, texts in (
+            ("flat", _flat_chunks(data)),
+            ("structured", [c.text for c in chunk_project_document(data)]),
+        ):
+            tokens = sum(count_tokens(t) for t in texts)
+            rows.append(
+                {
+                    "file": path.name,
+                    "strategy": strategy,
+                    "chunks": len(texts),
+                    "avg_chars": round(sum(map(len, texts)) / len(texts)) if texts else 0,
+                    "tokens": tokens,
+                    "token_counter": counter_name,
+                    "cost_usd": round(tokens * price_per_million / 1_000_000, 6),
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    from app.rag.ingest import project_files
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare chunk count and embedding cost of the flat character "
+            "splitter against the structure-aware JSON chunker."
+        )
+    )
+    parser.add_argument("paths", type=Path, nargs="*", help="Project JSON files")
+    parser.add_argument(
+        "--price-per-million", type=float, default=_DEFAULT_PRICE_PER_MILLION
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    rows = compare(args.paths or project_files(), args.price_per_million)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    header = f"{'file':<26} {'strategy':>10} {'chunks':>7} {'avg chars':>10} {'tokens':>8} {'cost USD':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['file']:<26} {r['strategy']:>10} {r['chunks']:>7} {r['avg_chars']:>10} "
+            f"{r['tokens']:>8} {r['cost_usd']:>10.6f}"
+        )
+    for strategy in ("flat", "structured"):
+        subset = [r for r in rows if r["strategy"] == strategy]
+        print(
+            f"{'total':<26} {strategy:>10} {sum(r['chunks'] for r in subset):>7} {'':>10} "
+            f"{sum(r['tokens'] for r in subset):>8} {sum(r['cost_usd'] for r in subset):>10.6f}"
+        )
+    if rows:
+        print(f"\nTokens counted with {rows[0]['token_counter']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+
+from app.config import settings
+from app.core.tokens import estimate_tokens
+from app.rag.retriever import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n---\n"
+
+# Shortest shared edge treated as splitter overlap rather than coincidence
+_MIN_OVERLAP_CHARS = 20
+# Leftovers shorter than this after trimming are not worth a slot
+_MIN_CHUNK_CHARS = 40
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass(slots=True)
+class _Candidate:
+    chunk: RetrievedChunk
+    order: int
+    relevance: float
+    words: frozenset[str]
+
+
+def _words(text: str) -> frozenset[str]:
+    return frozenset(_WORD_RE.findall(text.lower()))
+
+
+def _jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(head: str, tail: str) -> int:
+    # Length of the longest suffix of ``head`` that is a prefix of ``tail``
+    probe = tail[:_MIN_OVERLAP_CHARS]
+    if len(probe) < _MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(head) - len(tail))
+    idx = head.find(probe, start)
+    while idx != -1:
+        if tail.startswith(head[idx:]):
+            return len(head) - idx
+        idx = head.find(probe, idx + 1)
+    return 0
+
+
+def _trim(text: str, kept: list[str]) -> str | None:
+    # Neighbouring chunks from the character splitter share up to
+    # RAG_CHUNK_OVERLAP characters; keep each span once
+    for other in kept:
+        if text in other:
+            return None
+        cut = _overlap(other, text)
+        if cut:
+            text = text[cut:]
+        cut = _overlap(text, other)
+        if cut:
+            text = text[:-cut]
+    text = text.strip()
+    return text if len(text) >= _MIN_CHUNK_CHARS else None
+
+
+def _candidates(chunks: list[RetrievedChunk]) -> list[_Candidate]:
+    # Scores are normalized per project: cosine, fusion and ts_rank scores
+    # are not comparable, and every project's best chunk should compete
+    best: dict[str | None, float] = {}
+    for chunk in chunks:
+        best[chunk.project_name] = max(best.get(chunk.project_name, 0.0), chunk.score)
+
+    seen: set[str] = set()
+    candidates: list[_Candidate] = []
+    for order, chunk in enumerate(chunks):
+        if chunk.text in seen:
+            continue
+        seen.add(chunk.text)
+        top = best[chunk.project_name]
+        candidates.append(
+            _Candidate(
+                chunk=chunk,
+                order=order,
+                relevance=chunk.score / top if top > 0 else 1.0,
+                words=_words(chunk.text),
+            )
+        )
+    return candidates
+
+
+# Greedy MMR over the retrieved chunks (Jaccard on word sets as redundancy)
+# within the token budget, kept in retrieval order and grouped by project
+def build_context(
+    chunks: list[RetrievedChunk],
+    max_tokens: int | None = None,
+    max_per_project: int | None = None,
+    mmr_lambda: float | None = None,
+    max_chunks: int | None = None,
+) -> str:
+    max_tokens = max_tokens or settings.RAG_CONTEXT_MAX_TOKENS
+    max_per_project = max_per_project or settings.RAG_CONTEXT_MAX_CHUNKS_PER_PROJECT
+    mmr_lambda = settings.RAG_CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    separator_tokens = estimate_tokens(SEPARATOR)
+
+    remaining = _candidates(chunks)
+    selected: list[tuple[_Candidate, str]] = []
+    per_project: dict[str | None, int] = {}
+    used = 0
+
+    while remaining and (max_chunks is None or len(selected) < max_chunks):
+        best = max(
+            remaining,
+            key=lambda c: mmr_lambda * c.relevance
+            - (1 - mmr_lambda)
+            * max((_jaccard(c.words, s.words) for s, _ in selected), default=0.0),
+        )
+        remaining.remove(best)
+
+        project = best.chunk.project_name
+        if per_project.get(project, 0) >= max_per_project:
+            continue
+        text = _trim(best.chunk.text, [t for _, t in selected])
+        if text is None:
+            continue
+        cost = estimate_tokens(text) + (separator_tokens if selected else 0)
+        if used + cost > max_tokens:
+            continue
+
+        selected.append((best, text))
+        per_project[project] = per_project.get(project, 0) + 1
+        used += cost
+
+    projects = list(dict.fromkeys(c.project_name for c in chunks))
+    selected.sort(key=lambda item: (projects.index(item[0].chunk.project_name), item[0].order))
+
+    logger.debug(
+        "RAG context: %d of %d chunks, ~%d tokens (budget %d)",
+        len(selected),
+        len(chunks),
+        used,
+        max_tokens,
+    )
+    return SEPARATOR.join(text for _, text in selected)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Any
+
+import numpy as np
+
+from app.config import settings
+from app.models.database import async_fetch_all, get_async_connection
+
+logger = logging.getLogger(__name__)
+
+_SQL_LOOKUP = """
+    SELECT text_hash, embedding
+    FROM   embedding_store
+    WHERE  model = %s
+      AND  dimensions = %s
+      AND  text_hash = ANY(%s)
+"""
+
+_SQL_INSERT = """
+    INSERT INTO embedding_store (text_hash, model, dimensions, embedding)
+    VALUES (%s, %s, %s, %b)
+    ON CONFLICT (text_hash, model, dimensions) DO NOTHING
+"""
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    def __init__(self) -> None:
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.errors = 0
+
+    async def lookup(self, texts: list[str]) -> dict[str, np.ndarray]:
+        if not settings.EMBEDDING_STORE_ENABLED or not texts:
+            return {}
+
+        hashes = {text_hash(t): t for t in texts}
+        self.lookups += 1
+        try:
+            rows = await async_fetch_all(
+                _SQL_LOOKUP,
+                (settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS, list(hashes)),
+                prepare=True,
+            )
+        except Exception:
+            self.errors += 1
+            logger.warning("Embedding store lookup failed.", exc_info=True)
+            return {}
+
+        found: dict[str, np.ndarray] = {}
+        for row in rows:
+            text = hashes.get(bytes(row["text_hash"]))
+            if text is not None:
+                found[text] = np.asarray(row["embedding"], dtype=np.float32)
+
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    async def store(self, items: dict[str, np.ndarray]) -> None:
+        if not settings.EMBEDDING_STORE_ENABLED or not items:
+            return
+
+        params = [
+            (
+                text_hash(text),
+                settings.EMBEDDING_MODEL,
+                settings.EMBEDDING_DIMENSIONS,
+                vector,
+            )
+            for text, vector in items.items()
+        ]
+        try:
+            async with get_async_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany(_SQL_INSERT, params)
+            self.stored += len(params)
+        except Exception:
+            self.errors += 1
+            logger.warning("Embedding store insert failed.", exc_info=True)
+
+    def stats(self) -> dict[str, Any]:
+        looked_up = self.hits + self.misses
+        return {
+            "enabled": settings.EMBEDDING_STORE_ENABLED,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / looked_up, 4) if looked_up else 0.0,
+            "stored": self.stored,
+            "errors": self.errors,
+        }
+
+
+embedding_store = EmbeddingStore()
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from typing import Any
+
+from psycopg import sql
+
+from app.config import settings
+from app.models.database import (
+    advisory_lock,
+    async_execute_autocommit,
+    async_fetch_all,
+    async_fetch_one,
+    close_pool,
+)
+from app.rag.storage import index_expression, index_opclass
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_NAME = "idx_embeddings_ann"
+
+_SQL_INDEX_INFO = """
+    SELECT i.relname                         AS name,
+           am.amname                         AS method,
+           ix.indisvalid                     AS valid,
+           pg_relation_size(i.oid)           AS size_bytes,
+           obj_description(i.oid, 'pg_class') AS build_info
+    FROM   pg_class i
+    JOIN   pg_index ix ON ix.indexrelid = i.oid
+    JOIN   pg_am am    ON am.oid = i.relam
+    WHERE  i.relname = %s
+"""
+
+_SQL_ROW_COUNT = "SELECT COUNT(*) AS cnt FROM project_embeddings WHERE live"
+_SQL_PROJECT_ROW_COUNT = (
+    "SELECT COUNT(*) AS cnt FROM project_embeddings WHERE project_name = %s AND live"
+)
+_SQL_PROJECT_NAMES = "SELECT DISTINCT project_name FROM project_embeddings"
+
+# The global index and every per-project partial index
+_SQL_ANN_INDEXES = """
+    SELECT relname AS name
+    FROM   pg_class
+    WHERE  relkind = 'i'
+      AND  (relname = %s OR starts_with(relname, %s))
+"""
+
+
+# ANN indexes are partial on live rows; each project also gets one on its own
+# rows, used by queries that inline the project name
+def project_index_name(project_name: str) -> str:
+    digest = hashlib.sha1(project_name.encode("utf-8")).hexdigest()[:12]
+    return f"{ANN_INDEX_NAME}_p_{digest}"
+
+
+def _index_name(project_name: str | None) -> str:
+    return project_index_name(project_name) if project_name else ANN_INDEX_NAME
+
+
+def _index_lock(project_name: str | None) -> str:
+    return f"ann-index:{_index_name(project_name)}"
+
+
+LIVE_PREDICATE = sql.SQL("live")
+
+
+def project_predicate(project_name: str) -> sql.Composed:
+    return sql.SQL("project_name = {} AND live").format(sql.Literal(project_name))
+
+
+async def _row_count(project_name: str | None) -> int:
+    if project_name:
+        row = await async_fetch_one(_SQL_PROJECT_ROW_COUNT, (project_name,))
+    else:
+        row = await async_fetch_one(_SQL_ROW_COUNT)
+    return row["cnt"] if row else 0
+
+
+def ivfflat_lists_for(row_count: int) -> int:
+    if settings.RAG_IVFFLAT_LISTS > 0:
+        return settings.RAG_IVFFLAT_LISTS
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond that
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1_000)
+    return int(math.sqrt(row_count))
+
+
+def index_params(method: str, row_count: int) -> dict[str, int]:
+    if method == "hnsw":
+        return {
+            "m": settings.RAG_HNSW_M,
+            "ef_construction": settings.RAG_HNSW_EF_CONSTRUCTION,
+        }
+    if method == "ivfflat":
+        return {"lists": ivfflat_lists_for(row_count)}
+    raise ValueError(f"Unsupported index method: {method}")
+
+
+def build_index_sql(
+    table: str,
+    index_name: str,
+    method: str,
+    params: dict[str, int],
+    concurrently: bool = True,
+    precision: str = "full",
+    dimensions: int | None = None,
+    where: sql.Composable | None = None,
+) -> sql.Composed:
+    with_clause = sql.SQL(", ").join(
+        sql.SQL("{} = {}").format(sql.SQL(key), sql.Literal(value))
+        for key, value in params.items()
+    )
+    return sql.SQL(
+        "CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {table} "
+        "USING {method} ({expression} {opclass}) WITH ({with_clause}){where}"
+    ).format(
+        concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+        index=sql.Identifier(index_name),
+        table=sql.Identifier(table),
+        method=sql.SQL(method),
+        expression=sql.SQL(
+            index_expression(precision, dimensions or settings.EMBEDDING_DIMENSIONS)
+        ),
+        opclass=sql.SQL(index_opclass(precision)),
+        with_clause=with_clause,
+        where=sql.SQL(" WHERE {}").format(where) if where is not None else sql.SQL(""),
+    )
+
+
+def search_settings(
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> dict[str, int] | None:
+    overrides: dict[str, int] = {}
+    if ef_search is not None:
+        overrides["hnsw.ef_search"] = ef_search
+    if probes is not None:
+        overrides["ivfflat.probes"] = probes
+    return overrides or None
+
+
+async def index_status(project_name: str | None = None) -> dict[str, Any]:
+    row = await async_fetch_one(_SQL_INDEX_INFO, (_index_name(project_name),))
+    row_count = await _row_count(project_name)
+
+    if row is None:
+        return {
+            "exists": False,
+            "project_name": project_name,
+            "configured_method": settings.RAG_INDEX_TYPE,
+            "rows": row_count,
+        }
+
+    build_info = json.loads(row["build_info"]) if row["build_info"] else {}
+    built_rows = build_info.get("rows", 0)
+    return {
+        "exists": True,
+        "project_name": project_name,
+        "name": row["name"],
+        "method": row["method"],
+        "configured_method": settings.RAG_INDEX_TYPE,
+        "valid": row["valid"],
+        "size_bytes": row["size_bytes"],
+        "params": build_info.get("params", {}),
+        # Indexes built before storage profiles are full precision
+        "precision": build_info.get("precision", "full"),
+        "dimensions": build_info.get("dimensions"),
+        # Indexes built before the live flag cover every version
+        "live_only": build_info.get("live_only", False),
+        "rows": row_count,
+        "rows_at_build": built_rows,
+        "stale": _is_stale(built_rows, row_count),
+    }
+
+
+def _is_stale(rows_at_build: int, row_count: int) -> bool:
+    grown = row_count - rows_at_build
+    return grown > max(1, rows_at_build) * settings.RAG_INDEX_REBUILD_THRESHOLD
+
+
+async def _create(
+    index_name: str,
+    method: str,
+    row_count: int,
+    project_name: str | None = None,
+) -> None:
+    params = index_params(method, row_count)
+    logger.info(
+        "Building %s index %s over %d rows (%s)", method, index_name, row_count, params
+    )
+    precision = settings.RAG_VECTOR_PRECISION
+    dimensions = settings.EMBEDDING_DIMENSIONS
+    await async_execute_autocommit(
+        build_index_sql(
+            "project_embeddings",
+            index_name,
+            method,
+            params,
+            precision=precision,
+            dimensions=dimensions,
+            where=project_predicate(project_name) if project_name else LIVE_PREDICATE,
+        )
+    )
+    build_info = json.dumps(
+        {
+            "rows": row_count,
+            "params": params,
+            "precision": precision,
+            "dimensions": dimensions,
+            "live_only": True,
+        }
+    )
+    await async_execute_autocommit(
+        sql.SQL("COMMENT ON INDEX {} IS {}").format(
+            sql.Identifier(index_name), sql.Literal(build_info)
+        )
+    )
+
+
+# Index builds and swaps run under an advisory lock on the index name; status
+# is re-read under the lock, so a caller that waited finds the work done
+async def ensure_index(project_name: str | None = None) -> bool:
+    if settings.RAG_INDEX_TYPE == "none":
+        return False
+    async with advisory_lock(_index_lock(project_name)):
+        return await _ensure(project_name)
+
+
+async def _ensure(project_name: str | None) -> bool:
+    status = await index_status(project_name)
+    if status["exists"] and status["valid"]:
+        built = (
+            status["method"],
+            status["precision"],
+            status["dimensions"],
+            status["live_only"],
+        )
+        wanted = (
+            settings.RAG_INDEX_TYPE,
+            settings.RAG_VECTOR_PRECISION,
+            # Older indexes did not record their size; the column type pins it
+            settings.EMBEDDING_DIMENSIONS if status["dimensions"] is not None else None,
+            True,
+        )
+        if built != wanted:
+            logger.info(
+                "ANN index %s profile changed (%s/%s/%s/live=%s -> %s/%s/%s/live=%s); "
+                "rebuilding.",
+                status["name"],
+                *built,
+                *wanted,
+            )
+            await _rebuild(project_name)
+            return True
+        return False
+
+    index_name = _index_name(project_name)
+    if status["exists"]:
+        # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind
+        await async_execute_autocommit(
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                sql.Identifier(index_name)
+            )
+        )
+
+    await _create(index_name, settings.RAG_INDEX_TYPE, status["rows"], project_name)
+    return True
+
+
+async def rebuild_index(project_name: str | None = None) -> None:
+    if settings.RAG_INDEX_TYPE == "none":
+        return
+    async with advisory_lock(_index_lock(project_name)):
+        await _rebuild(project_name)
+
+
+async def _rebuild(project_name: str | None) -> None:
+    # Build the replacement next to the live index, then swap, so queries
+    # keep using the old index while the new one is built.
+    index_name = _index_name(project_name)
+    staging_name = f"{index_name}_next"
+    row_count = await _row_count(project_name)
+
+    await async_execute_autocommit(
+        sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+            sql.Identifier(staging_name)
+        )
+    )
+    await _create(staging_name, settings.RAG_INDEX_TYPE, row_count, project_name)
+    await async_execute_autocommit(
+        sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+            sql.Identifier(index_name)
+        )
+    )
+    await async_execute_autocommit(
+        sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+            sql.Identifier(staging_name), sql.Identifier(index_name)
+        )
+    )
+    logger.info("ANN index %s rebuilt.", index_name)
+
+
+async def maybe_rebuild_after_ingest(project_name: str | None = None) -> bool:
+    if settings.RAG_INDEX_TYPE == "none":
+        return False
+
+    rebuilt = False
+    # The project's partial index is created on its first ingest
+    scopes = [None, project_name] if project_name else [None]
+    for scope in scopes:
+        async with advisory_lock(_index_lock(scope)):
+            status = await index_status(scope)
+            if not status["exists"]:
+                rebuilt = await _ensure(scope) or rebuilt
+            # HNSW graphs absorb inserts; IVFFlat centroids are fixed at build time
+            elif status["stale"] and status["method"] == "ivfflat":
+                logger.info(
+                    "ANN index %s built over %d rows, now %d; rebuilding.",
+                    status["name"],
+                    status["rows_at_build"],
+                    status["rows"],
+                )
+                await _rebuild(scope)
+                rebuilt = True
+    return rebuilt
+
+
+async def ensure_all_indexes() -> bool:
+    built = await ensure_index()
+    for row in await async_fetch_all(_SQL_PROJECT_NAMES):
+        built = await ensure_index(row["project_name"]) or built
+    return built
+
+
+async def drop_all_indexes() -> None:
+    rows = await async_fetch_all(
+        _SQL_ANN_INDEXES, (ANN_INDEX_NAME, f"{ANN_INDEX_NAME}_p_")
+    )
+    for row in rows:
+        await async_execute_autocommit(
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                sql.Identifier(row["name"])
+            )
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the project_embeddings ANN index.")
+    parser.add_argument("command", choices=["status", "create", "rebuild"])
+    parser.add_argument(
+        "--project", help="Act on this project's partial index instead of the global one"
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="With create, also build the partial index of every ingested project",
+    )
+    args = parser.parse_args()
+
+    async def run() -> Any:
+        try:
+            if args.command == "create" and args.all:
+                await ensure_all_indexes()
+            elif args.command == "create":
+                await ensure_index(args.project)
+            elif args.command == "rebuild":
+                await rebuild_index(args.project)
+            return await index_status(args.project)
+        finally:
+            await close_pool()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.config import settings
+from app.models.database import async_fetch_all
+
+# Full-text search over chunk_tsv; lexemes are OR-ed and normalization 32
+# maps ts_rank_cd to [0, 1)
+_SQL_LEXICAL_TOP_K = """
+    WITH t AS (
+        SELECT replace(plainto_tsquery('spanish', %s)::text, '&', '|')::tsquery AS q
+    )
+    SELECT e.chunk_text,
+           ts_rank_cd(e.chunk_tsv, t.q, 32) AS score
+    FROM   t, project_embeddings e
+    WHERE  e.chunk_tsv @@ t.q
+      AND  e.live
+    ORDER  BY score DESC
+    LIMIT  %s
+"""
+
+_SQL_LEXICAL_TOP_K_PER_PROJECT = """
+    WITH t AS (
+        SELECT replace(plainto_tsquery('spanish', %s)::text, '&', '|')::tsquery AS q
+    )
+    SELECT p.project_name,
+           c.chunk_text,
+           c.score
+    FROM   t
+    CROSS  JOIN unnest(%s::text[]) AS p(project_name)
+    CROSS  JOIN LATERAL (
+        SELECT e.chunk_text,
+               ts_rank_cd(e.chunk_tsv, t.q, 32) AS score
+        FROM   project_embeddings e
+        WHERE  e.project_name = p.project_name
+          AND  e.chunk_tsv @@ t.q
+          AND  e.live
+        ORDER  BY score DESC
+        LIMIT  %s
+    ) c
+    ORDER  BY p.project_name, c.score DESC
+"""
+
+
+async def lexical_search(
+    query: str,
+    top_k: int,
+    project_names: list[str] | None = None,
+) -> list[tuple[str | None, str, float]]:
+    if project_names is None:
+        rows = await async_fetch_all(_SQL_LEXICAL_TOP_K, (query, top_k), prepare=True)
+        return [(None, r["chunk_text"], float(r["score"])) for r in rows]
+
+    rows = await async_fetch_all(
+        _SQL_LEXICAL_TOP_K_PER_PROJECT,
+        (query, list(project_names), top_k),
+        prepare=True,
+    )
+    return [(r["project_name"], r["chunk_text"], float(r["score"])) for r in rows]
+
+
+def is_confident(hits: list[tuple[Any, str, float]], top_k: int) -> bool:
+    # Enough keyword matches, and the best one strong enough, to answer
+    # without the embedding call
+    return len(hits) >= top_k and hits[0][2] >= settings.RAG_LEXICAL_CONFIDENCE
+
+
+# Reciprocal-rank fusion: each list contributes 1 / (k + rank) per chunk, so
+# chunks ranked well by both searches rise to the top without having to
+# calibrate cosine similarity against ts_rank scores.
+def reciprocal_rank_fusion(
+    rankings: list[list[str]],
+    top_k: int,
+    k: int | None = None,
+) -> list[tuple[str, float]]:
+    k = settings.RAG_RRF_K if k is None else k
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, text in enumerate(ranking, start=1):
+            scores[text] = scores.get(text, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:top_k]
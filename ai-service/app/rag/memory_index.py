@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from app.config import settings
+from app.models.database import async_fetch_all
+
+logger = logging.getLogger(__name__)
+
+_SQL_LIVE_VERSIONS = """
+    SELECT p.project_name,
+           COALESCE(v.live_version, 0) AS live_version
+    FROM   (SELECT DISTINCT project_name FROM project_embeddings) p
+    LEFT   JOIN project_versions v ON v.project_name = p.project_name
+"""
+
+_SQL_LIVE_VERSION = """
+    SELECT COALESCE(MAX(live_version), 0) AS live_version
+    FROM   project_versions
+    WHERE  project_name = %s
+"""
+
+_SQL_LOAD_PROJECT = """
+    SELECT chunk_text, embedding
+    FROM   project_embeddings
+    WHERE  project_name = %s
+      AND  version = %s
+    ORDER  BY id
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class _ProjectMatrix:
+    version: int
+    texts: list[str]
+    # (rows, dimensions) float32, C-contiguous, rows L2-normalized
+    matrix: np.ndarray
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+# Exact cosine search over each project's live chunks held in memory;
+# matrices are swapped whole, never half-loaded
+class MemoryIndex:
+    def __init__(self) -> None:
+        self._projects: dict[str, _ProjectMatrix] = {}
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.searches = 0
+
+    async def _load_project(self, project_name: str, version: int) -> None:
+        rows = await async_fetch_all(_SQL_LOAD_PROJECT, (project_name, version))
+        if not rows:
+            self._projects.pop(project_name, None)
+            return
+        matrix = _normalize(
+            np.vstack([np.asarray(r["embedding"], dtype=np.float32) for r in rows])
+        )
+        self._projects[project_name] = _ProjectMatrix(
+            version=version,
+            texts=[r["chunk_text"] for r in rows],
+            matrix=matrix,
+        )
+        self.reloads += 1
+        logger.info(
+            "Memory index loaded project '%s' v%d (%d chunks, %.1f MB)",
+            project_name,
+            version,
+            len(rows),
+            matrix.nbytes / 1_048_576,
+        )
+
+    async def refresh(self, force: bool = False) -> None:
+        # Picks up ingests from this and other replicas by comparing each
+        # project's live version, at most every RAG_MEMORY_INDEX_REFRESH_SECONDS
+        async with self._lock:
+            now = time.monotonic()
+            interval = settings.RAG_MEMORY_INDEX_REFRESH_SECONDS
+            if not force and now - self._checked_at < interval:
+                return
+
+            live = {
+                r["project_name"]: r["live_version"]
+                for r in await async_fetch_all(_SQL_LIVE_VERSIONS)
+            }
+            for project_name in set(self._projects) - set(live):
+                del self._projects[project_name]
+            for project_name, version in live.items():
+                loaded = self._projects.get(project_name)
+                if loaded is None or loaded.version != version:
+                    await self._load_project(project_name, version)
+            self._checked_at = now
+
+    async def reload_project(self, project_name: str) -> None:
+        async with self._lock:
+            rows = await async_fetch_all(_SQL_LIVE_VERSION, (project_name,))
+            await self._load_project(project_name, rows[0]["live_version"])
+
+    async def search(
+        self,
+        query_vector: np.ndarray,
+        top_k: int,
+        project_names: list[str] | None = None,
+    ) -> list[tuple[str, str, float]]:
+        await self.refresh()
+        self.searches += 1
+
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        names = self._projects if project_names is None else project_names
+
+        hits: list[tuple[str, str, float]] = []
+        for name in names:
+            project = self._projects.get(name)
+            if project is None:
+                continue
+            scores = project.matrix @ query
+            for i in _top_k(scores, top_k):
+                hits.append((name, project.texts[i], float(scores[i])))
+
+        if project_names is None:
+            # Global search: best top_k across all projects
+            hits.sort(key=lambda h: h[2], reverse=True)
+            return hits[:top_k]
+        return hits
+
+    def versions(self, project_names: list[str] | None = None) -> tuple:
+        # Loaded version per project, as seen by search()
+        names = sorted(self._projects) if project_names is None else project_names
+        return tuple(
+            (name, project.version if (project := self._projects.get(name)) else None)
+            for name in names
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": settings.RAG_RETRIEVAL_BACKEND == "memory",
+            "projects": len(self._projects),
+            "chunks": sum(len(p.texts) for p in self._projects.values()),
+            "bytes": sum(p.matrix.nbytes for p in self._projects.values()),
+            "reloads": self.reloads,
+            "searches": self.searches,
+        }
+
+
+memory_index = MemoryIndex()
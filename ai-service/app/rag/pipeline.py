@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Iterable
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from psycopg.types.json import Jsonb
+
+from app.config import settings
+from app.core.embedder import embedding_service
+from app.models.database import async_execute_query, get_async_connection
+from app.rag.embedding_store import text_hash
+
+logger = logging.getLogger(__name__)
+
+_SQL_COPY = """
+    COPY project_embeddings
+         (project_name, version, source, chunk_hash, chunk_text, embedding, metadata)
+    FROM STDIN WITH (FORMAT BINARY)
+"""
+_COPY_TYPES = ["varchar", "int4", "varchar", "bytea", "text", "vector", "jsonb"]
+
+# Registers the project so the version swap always has a row to lock
+_SQL_REGISTER_PROJECT = """
+    INSERT INTO project_versions (project_name, live_version)
+    VALUES (%s, 0)
+    ON CONFLICT (project_name) DO NOTHING
+"""
+
+_SQL_LIVE_VERSION = """
+    SELECT live_version FROM project_versions WHERE project_name = %s
+"""
+
+_SQL_NEXT_VERSION = "SELECT nextval('project_version_seq') AS version"
+
+# Serializes version swaps of the same project across replicas
+_SQL_LOCK_VERSION_ROW = """
+    SELECT live_version FROM project_versions WHERE project_name = %s FOR UPDATE
+"""
+
+_SQL_LIVE_CHUNKS = """
+    SELECT DISTINCT ON (chunk_hash) chunk_hash, metadata
+    FROM   project_embeddings
+    WHERE  project_name = %s
+      AND  version = %s
+      AND  source = %s
+      AND  chunk_hash IS NOT NULL
+"""
+
+# Unchanged chunks keep their stored embedding and take the new metadata
+_SQL_CARRY = """
+    INSERT INTO project_embeddings
+           (project_name, version, source, chunk_hash, chunk_text, embedding, metadata)
+    SELECT %(project)s, %(version)s, %(source)s, c.chunk_hash,
+           prev.chunk_text, prev.embedding, c.metadata
+    FROM   unnest(%(hashes)s::bytea[], %(metadatas)s::jsonb[]) AS c(chunk_hash, metadata)
+    CROSS  JOIN LATERAL (
+        SELECT e.chunk_text, e.embedding
+        FROM   project_embeddings e
+        WHERE  e.project_name = %(project)s
+          AND  e.version = %(live)s
+          AND  e.source = %(source)s
+          AND  e.chunk_hash = c.chunk_hash
+        LIMIT  1
+    ) prev
+"""
+
+# The project's other sources move into the new version as they are live now
+_SQL_CARRY_OTHER_SOURCES = """
+    INSERT INTO project_embeddings
+           (project_name, version, source, chunk_hash, chunk_text, embedding, metadata)
+    SELECT project_name, %(version)s, source, chunk_hash, chunk_text, embedding, metadata
+    FROM   project_embeddings
+    WHERE  project_name = %(project)s
+      AND  live
+      AND  source <> %(source)s
+"""
+
+# New rows are written with live = FALSE (the column default) and become
+# visible together with the live_version switch
+_SQL_PUBLISH = """
+    UPDATE project_embeddings
+    SET    live = (version = %(version)s)
+    WHERE  project_name = %(project)s
+      AND  (live OR version = %(version)s)
+"""
+
+_SQL_SWAP = """
+    UPDATE project_versions
+    SET    live_version = %s, updated_at = NOW()
+    WHERE  project_name = %s
+"""
+
+_SQL_DELETE_STAGED = """
+    DELETE FROM project_embeddings
+    WHERE  project_name = %s
+      AND  version = %s
+      AND  NOT live
+"""
+
+_SQL_DELETE_OLD_VERSIONS = """
+    DELETE FROM project_embeddings e
+    WHERE  e.project_name = %s
+      AND  NOT e.live
+      AND  e.version < (
+          SELECT v.live_version FROM project_versions v WHERE v.project_name = %s
+      )
+"""
+
+
+@dataclass
+class IngestProgress:
+    project_name: str
+    documents_total: int
+    documents_split: int = 0
+    chunks_split: int = 0
+    chunks_embedded: int = 0
+    chunks_written: int = 0
+    chunks_carried: int = 0
+    batches_written: int = 0
+    version: int | None = None
+    unchanged: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def chunks_total(self) -> int:
+        return self.chunks_written + self.chunks_carried
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+ProgressCallback = Callable[[IngestProgress], None]
+# Yields (chunk_text, metadata) pairs and counts documents as it goes
+ChunkSource = Callable[[IngestProgress], AsyncIterator[tuple[str, dict[str, Any]]]]
+
+
+@dataclass
+class _Batch:
+    hashes: list[bytes] = field(default_factory=list)
+    texts: list[str] = field(default_factory=list)
+    metadatas: list[dict[str, Any]] = field(default_factory=list)
+    vectors: list[np.ndarray] | None = None
+    carried: bool = False
+
+
+@dataclass
+class _Snapshot:
+    source: str
+    live_version: int
+    version: int
+    # chunk_hash -> metadata of the source's chunks in the live version
+    live_chunks: dict[bytes, dict[str, Any]]
+    metadata_changed: bool = False
+
+
+def build_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings.RAG_CHUNK_SIZE,
+        chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ". ", ", ", " ", ""],
+    )
+
+
+def split_texts(
+    texts: list[str],
+    metadatas: list[dict[str, Any]] | None = None,
+) -> ChunkSource:
+    async def source(progress: IngestProgress) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        splitter = build_splitter()
+        for idx, text in enumerate(texts):
+            meta = metadatas[idx] if metadatas and idx < len(metadatas) else {}
+            # Splitting a long brochure is CPU-bound; keep it off the event loop
+            parts = await asyncio.to_thread(splitter.split_text, text)
+            progress.documents_split += 1
+            for part in parts:
+                yield part, meta
+
+    return source
+
+
+def prechunked(chunks: Iterable[tuple[str, dict[str, Any]]]) -> ChunkSource:
+    async def source(progress: IngestProgress) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        for chunk in chunks:
+            yield chunk
+        progress.documents_split = progress.documents_total
+
+    return source
+
+
+async def _begin_snapshot(project_name: str, source_key: str) -> _Snapshot:
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(_SQL_REGISTER_PROJECT, (project_name,))
+            await cur.execute(_SQL_LIVE_VERSION, (project_name,))
+            live_version = (await cur.fetchone())["live_version"]
+            await cur.execute(_SQL_NEXT_VERSION)
+            version = (await cur.fetchone())["version"]
+            await cur.execute(_SQL_LIVE_CHUNKS, (project_name, live_version, source_key))
+            live_chunks = {bytes(r["chunk_hash"]): r["metadata"] for r in await cur.fetchall()}
+    return _Snapshot(
+        source=source_key, live_version=live_version, version=version, live_chunks=live_chunks
+    )
+
+
+def _as_stored(meta: dict[str, Any]) -> dict[str, Any]:
+    # The metadata as it reads back from the jsonb column
+    return json.loads(json.dumps(meta))
+
+
+async def _write_batch(project_name: str, snapshot: _Snapshot, batch: _Batch) -> None:
+    # Each batch commits on its own: staged rows are not live, so nothing is
+    # visible before the swap, and no pooled connection or transaction is
+    # held across embedding calls
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            if batch.carried:
+                await cur.execute(
+                    _SQL_CARRY,
+                    {
+                        "project": project_name,
+                        "version": snapshot.version,
+                        "source": snapshot.source,
+                        "live": snapshot.live_version,
+                        "hashes": batch.hashes,
+                        "metadatas": [Jsonb(m) for m in batch.metadatas],
+                    },
+                )
+                if cur.rowcount != len(batch.hashes):
+                    # The rows to carry over were cleaned up after another
+                    # replica replaced the version this snapshot started from
+                    raise RuntimeError(
+                        f"Project '{project_name}' v{snapshot.live_version} was replaced "
+                        "during the ingest; run it again"
+                    )
+                return
+
+            async with cur.copy(_SQL_COPY) as copy:
+                copy.set_types(_COPY_TYPES)
+                for digest, text, vector, meta in zip(
+                    batch.hashes, batch.texts, batch.vectors or [], batch.metadatas
+                ):
+                    await copy.write_row(
+                        (
+                            project_name,
+                            snapshot.version,
+                            snapshot.source,
+                            digest,
+                            text,
+                            vector,
+                            Jsonb(meta),
+                        )
+                    )
+
+
+async def _publish(project_name: str, snapshot: _Snapshot, progress: IngestProgress) -> int:
+    # Adds the other sources' live rows and switches to the staged version,
+    # unless this source is unchanged. Returns the version left live.
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(_SQL_LOCK_VERSION_ROW, (project_name,))
+            live_version = (await cur.fetchone())["live_version"]
+
+            # If another ingest published meanwhile, its rows are taken from
+            # the current live version; for this source the last publish wins
+            keep = (
+                live_version == snapshot.live_version
+                and progress.chunks_written == 0
+                and progress.chunks_carried == len(snapshot.live_chunks)
+                and not snapshot.metadata_changed
+            )
+            if keep:
+                await cur.execute(_SQL_DELETE_STAGED, (project_name, snapshot.version))
+                return live_version
+
+            params = {
+                "project": project_name,
+                "version": snapshot.version,
+                "source": snapshot.source,
+            }
+            await cur.execute(_SQL_CARRY_OTHER_SOURCES, params)
+            await cur.execute(_SQL_PUBLISH, params)
+            await cur.execute(_SQL_SWAP, (snapshot.version, project_name))
+            return snapshot.version
+
+
+async def _discard(project_name: str, snapshot: _Snapshot) -> None:
+    try:
+        await async_execute_query(_SQL_DELETE_STAGED, (project_name, snapshot.version))
+    except Exception:
+        # Left for the cleanup job once a later version is live
+        logger.warning(
+            "Could not discard staged v%d of project '%s'.",
+            snapshot.version,
+            project_name,
+            exc_info=True,
+        )
+
+
+# Replaces one source's chunks ('file:<name>' or 'api') as a new version.
+# Split -> embed -> COPY run over bounded queues; chunks already live are
+# copied server-side instead of embedded
+async def run_ingest_pipeline(
+    project_name: str,
+    source_key: str,
+    source: ChunkSource,
+    documents_total: int,
+    on_progress: ProgressCallback | None = None,
+) -> IngestProgress:
+    batch_size = settings.INGEST_EMBED_BATCH_SIZE
+    workers = settings.INGEST_MAX_INFLIGHT_BATCHES
+    progress = IngestProgress(project_name=project_name, documents_total=documents_total)
+
+    to_embed: asyncio.Queue[_Batch | None] = asyncio.Queue(maxsize=workers)
+    to_write: asyncio.Queue[_Batch | None] = asyncio.Queue(maxsize=workers)
+
+    def report() -> None:
+        if on_progress is not None:
+            on_progress(progress)
+
+    async def produce(snapshot: _Snapshot) -> None:
+        seen: set[bytes] = set()
+        fresh, carried = _Batch(), _Batch(carried=True)
+        async for chunk, meta in source(progress):
+            progress.chunks_split += 1
+            digest = text_hash(chunk)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            meta = {**meta, "project_name": project_name}
+
+            live_meta = snapshot.live_chunks.get(digest)
+            if live_meta is not None and live_meta != _as_stored(meta):
+                snapshot.metadata_changed = True
+            batch = carried if live_meta is not None else fresh
+            batch.hashes.append(digest)
+            batch.texts.append(chunk)
+            batch.metadatas.append(meta)
+            if len(batch.hashes) < batch_size:
+                continue
+            if batch.carried:
+                await to_write.put(batch)
+                carried = _Batch(carried=True)
+            else:
+                await to_embed.put(batch)
+                fresh = _Batch()
+
+        if carried.hashes:
+            await to_write.put(carried)
+        if fresh.hashes:
+            await to_embed.put(fresh)
+        for _ in range(workers):
+            await to_embed.put(None)
+
+    async def embed() -> None:
+        while (batch := await to_embed.get()) is not None:
+            batch.vectors = await embedding_service.embed_documents(batch.texts)
+            progress.chunks_embedded += len(batch.texts)
+            report()
+            await to_write.put(batch)
+        await to_write.put(None)
+
+    async def write(snapshot: _Snapshot) -> None:
+        finished_workers = 0
+        while finished_workers < workers:
+            batch = await to_write.get()
+            if batch is None:
+                finished_workers += 1
+                continue
+
+            await _write_batch(project_name, snapshot, batch)
+            if batch.carried:
+                progress.chunks_carried += len(batch.hashes)
+            else:
+                progress.chunks_written += len(batch.hashes)
+            progress.batches_written += 1
+            report()
+            logger.info(
+                "Ingest '%s' v%d: %d chunks embedded, %d carried over (%.1fs)",
+                project_name,
+                snapshot.version,
+                progress.chunks_written,
+                progress.chunks_carried,
+                progress.elapsed_seconds,
+            )
+
+    snapshot = await _begin_snapshot(project_name, source_key)
+    try:
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(produce(snapshot))
+                for _ in range(workers):
+                    group.create_task(embed())
+                group.create_task(write(snapshot))
+        except ExceptionGroup as exc:
+            # Surface the first failure as-is; the remaining stages were cancelled
+            raise exc.exceptions[0] from None
+
+        if progress.chunks_total == 0:
+            # Publishing would leave the project with no chunks at all
+            raise ValueError(
+                f"Ingest of project '{project_name}' ({source_key}) produced no chunks; "
+                f"keeping v{snapshot.live_version}"
+            )
+        live_version = await _publish(project_name, snapshot, progress)
+    except BaseException:
+        await _discard(project_name, snapshot)
+        raise
+
+    progress.version = live_version
+    if live_version != snapshot.version:
+        progress.unchanged = True
+        logger.info(
+            "Project '%s' (%s) unchanged; keeping v%d", project_name, source_key, live_version
+        )
+        return progress
+
+    logger.info(
+        "Project '%s' (%s) switched to v%d (%d new chunks, %d carried, %d dropped)",
+        project_name,
+        source_key,
+        snapshot.version,
+        progress.chunks_written,
+        progress.chunks_carried,
+        len(snapshot.live_chunks) - progress.chunks_carried,
+    )
+    return progress
+
+
+async def delete_old_versions(project_name: str) -> None:
+    await async_execute_query(_SQL_DELETE_OLD_VERSIONS, (project_name, project_name))
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Any
+
+from app.config import settings
+from app.core.cache import ByteLRUCache
+from app.models.database import async_fetch_all, async_fetch_one
+from app.rag.memory_index import memory_index
+
+logger = logging.getLogger(__name__)
+
+Hit = tuple[str | None, str, float]
+
+# Per-hit bookkeeping on top of the chunk text (tuple, float, key share)
+_HIT_OVERHEAD_BYTES = 96
+
+_SQL_PROJECT_VERSIONS = """
+    SELECT project_name, live_version
+    FROM   project_versions
+    WHERE  project_name = ANY(%s)
+"""
+
+# Every version swap raises one project's live_version (versions come from
+# project_version_seq), so the sum changes with any swap on any replica
+_SQL_ALL_VERSIONS = """
+    SELECT COUNT(*) AS projects, COALESCE(SUM(live_version), 0) AS total
+    FROM   project_versions
+"""
+
+
+def _query_hash(query: str) -> str:
+    normalized = " ".join(query.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# Retrieval results keyed by (projects, query hash, top_k) and the live
+# versions read per lookup; bypassed when they cannot be read
+class RetrievalCache:
+    def __init__(self) -> None:
+        self._cache: ByteLRUCache[list[Hit]] = ByteLRUCache(
+            max_bytes=settings.RAG_RETRIEVAL_CACHE_MAX_BYTES,
+            ttl_seconds=settings.RAG_RETRIEVAL_CACHE_TTL_SECONDS,
+        )
+        self.version_errors = 0
+
+    async def _versions(self, project_names: list[str] | None) -> tuple:
+        if project_names is None:
+            row = await async_fetch_one(_SQL_ALL_VERSIONS, prepare=True)
+            scope: tuple = ("*", row["projects"], row["total"]) if row else ("*",)
+        else:
+            rows = await async_fetch_all(_SQL_PROJECT_VERSIONS, (project_names,), prepare=True)
+            live = {r["project_name"]: r["live_version"] for r in rows}
+            scope = tuple((name, live.get(name, 0)) for name in project_names)
+
+        if settings.RAG_RETRIEVAL_BACKEND == "memory":
+            await memory_index.refresh()
+            scope += (memory_index.versions(project_names),)
+        return scope
+
+    async def key(
+        self,
+        query: str,
+        top_k: int,
+        project_names: list[str] | None,
+        *extra: Any,
+    ) -> tuple | None:
+        if not settings.RAG_RETRIEVAL_CACHE_ENABLED:
+            return None
+        try:
+            scope = await self._versions(project_names)
+        except Exception:
+            self.version_errors += 1
+            logger.warning("Could not read project versions; bypassing retrieval cache.")
+            return None
+        return (scope, _query_hash(query), top_k, settings.RAG_RETRIEVAL_MODE, *extra)
+
+    def get(self, key: tuple | None) -> list[Hit] | None:
+        if key is None:
+            return None
+        return self._cache.get(key)
+
+    def set(self, key: tuple | None, hits: list[Hit]) -> None:
+        if key is None:
+            return
+        size = sum(len(text.encode("utf-8")) + _HIT_OVERHEAD_BYTES for _, text, _ in hits)
+        self._cache.set(key, hits, size + _HIT_OVERHEAD_BYTES)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": settings.RAG_RETRIEVAL_CACHE_ENABLED,
+            **self._cache.stats(),
+            "version_errors": self.version_errors,
+        }
+
+
+retrieval_cache = RetrievalCache()
@@ -1,13 +1,199 @@
 from __future__ import annotations
 
 import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+import numpy as np
+from psycopg import sql
 
 from app.config import settings
+from app.core.embedder import embedding_service
 from app.core.llm import embed_query_cached
 from app.models.database import async_fetch_all, fetch_all
+from app.rag.index import search_settings
+from app.rag.lexical import is_confident, lexical_search, reciprocal_rank_fusion
+from app.rag.memory_index import memory_index
+from app.rag.retrieval_cache import retrieval_cache
+from app.rag.storage import candidate_distance
 
 logger = logging.getLogger(__name__)
 
+# Prepared on the async path; the vector is bound once in "q" and only live
+# rows are searched, matching the partial ANN indexes
+_SQL_TOP_K = """
+    WITH q AS (SELECT %b::vector AS v)
+    SELECT e.chunk_text,
+           1 - (e.embedding <=> q.v) AS similarity
+    FROM   q, project_embeddings e
+    WHERE  e.live
+    ORDER  BY e.embedding <=> q.v
+    LIMIT  %s
+"""
+
+# One branch per project, with the name inlined so the planner can use that
+# project's partial index; a bound parameter never matches it
+_SQL_PROJECT_QUERY = """
+    WITH q AS NOT MATERIALIZED (SELECT %b::vector AS v)
+    {branches}
+    ORDER  BY project_name, similarity DESC
+"""
+
+_SQL_PROJECT_BRANCH = """
+    (SELECT {project}::text AS project_name,
+            e.chunk_text,
+            1 - (e.embedding <=> q.v) AS similarity
+     FROM   q, project_embeddings e
+     WHERE  e.project_name = {project}
+       AND  e.live
+     ORDER  BY e.embedding <=> q.v
+     LIMIT  {top_k})
+"""
+
+
+# Quantized profiles: candidates from the quantized index, re-scored at full
+# precision; {distance} comes from app.rag.storage.candidate_distance
+_SQL_RERANK_TOP_K = """
+    WITH q AS (SELECT %b::vector AS v)
+    SELECT c.chunk_text,
+           1 - (c.embedding <=> q.v) AS similarity
+    FROM   q
+    CROSS  JOIN LATERAL (
+        SELECT e.chunk_text, e.embedding
+        FROM   project_embeddings e
+        WHERE  e.live
+        ORDER  BY {distance}
+        LIMIT  %s
+    ) c
+    ORDER  BY c.embedding <=> q.v
+    LIMIT  %s
+"""
+
+_SQL_RERANK_PROJECT_BRANCH = """
+    (SELECT {project}::text AS project_name,
+            c.chunk_text,
+            1 - (c.embedding <=> q.v) AS similarity
+     FROM   q
+     CROSS  JOIN LATERAL (
+         SELECT e.chunk_text, e.embedding
+         FROM   project_embeddings e
+         WHERE  e.project_name = {project}
+           AND  e.live
+         ORDER  BY {distance}
+         LIMIT  {candidates}
+     ) c
+     ORDER  BY c.embedding <=> q.v
+     LIMIT  {top_k})
+"""
+
+_LATENCY_SAMPLES = 1_000
+_latencies_ms: dict[str, deque[float]] = {
+    "postgres": deque(maxlen=_LATENCY_SAMPLES),
+    "memory": deque(maxlen=_LATENCY_SAMPLES),
+    "lexical": deque(maxlen=_LATENCY_SAMPLES),
+}
+# Retrievals by path: vector-only mode, hybrid answered from keywords alone,
+# hybrid with the vector search and fusion
+_mode_counts: dict[str, int] = {"vector": 0, "lexical_fast_path": 0, "fused": 0}
+
+
+@dataclass(frozen=True, slots=True)
+class RetrievedChunk:
+    # None for searches not filtered by project
+    project_name: str | None
+    text: str
+    # Cosine similarity in vector mode; in hybrid mode the reciprocal-rank
+    # fusion score (or ts_rank_cd on the lexical fast path), which is on a
+    # different scale and must not be compared against similarity thresholds
+    score: float
+
+
+def _query_vector(query: str) -> np.ndarray:
+    return np.asarray(embed_query_cached(query), dtype=np.float32)
+
+
+async def _async_query_vector(query: str) -> np.ndarray:
+    return await embedding_service.embed_query(query)
+
+
+@lru_cache(maxsize=16)
+def _rerank_sql(template: str, precision: str, dimensions: int) -> str:
+    return template.format(
+        distance=candidate_distance(precision, dimensions, "e.embedding", "q.v")
+    )
+
+
+def _quantized() -> bool:
+    return settings.RAG_VECTOR_PRECISION != "full"
+
+
+def _candidates(top_k: int) -> int:
+    return top_k * max(1, settings.RAG_RERANK_FACTOR)
+
+
+def _inline(value: str | int) -> sql.SQL:
+    # The statement also binds the vector, so a literal "%" must be doubled
+    return sql.SQL(sql.Literal(value).as_string(None).replace("%", "%%"))
+
+
+@lru_cache(maxsize=256)
+def _project_branch(
+    project_name: str,
+    top_k: int,
+    precision: str,
+    dimensions: int,
+    rerank_factor: int,
+) -> sql.Composed:
+    project = _inline(project_name)
+    if precision == "full":
+        return sql.SQL(_SQL_PROJECT_BRANCH).format(project=project, top_k=_inline(top_k))
+    return sql.SQL(_SQL_RERANK_PROJECT_BRANCH).format(
+        project=project,
+        distance=sql.SQL(candidate_distance(precision, dimensions, "e.embedding", "q.v")),
+        candidates=_inline(top_k * max(1, rerank_factor)),
+        top_k=_inline(top_k),
+    )
+
+
+def _build_projects_query(
+    query_vector: np.ndarray,
+    project_names: list[str],
+    top_k: int,
+) -> tuple[sql.Composed, tuple]:
+    branches = sql.SQL("\n    UNION ALL\n").join(
+        _project_branch(
+            name,
+            top_k,
+            settings.RAG_VECTOR_PRECISION,
+            settings.EMBEDDING_DIMENSIONS,
+            settings.RAG_RERANK_FACTOR,
+        )
+        for name in project_names
+    )
+    return sql.SQL(_SQL_PROJECT_QUERY).format(branches=branches), (query_vector,)
+
+
+def _build_query(
+    query_vector: np.ndarray,
+    top_k: int,
+    project_name: str | None,
+) -> tuple[str | sql.Composed, tuple]:
+    if project_name:
+        return _build_projects_query(query_vector, [project_name], top_k)
+    if _quantized():
+        return (
+            _rerank_sql(
+                _SQL_RERANK_TOP_K,
+                settings.RAG_VECTOR_PRECISION,
+                settings.EMBEDDING_DIMENSIONS,
+            ),
+            (query_vector, _candidates(top_k), top_k),
+        )
+    return _SQL_TOP_K, (query_vector, top_k)
+
 
 def retrieve_relevant_chunks(
     query: str,
@@ -16,73 +202,245 @@ def retrieve_relevant_chunks(
 ) -> list[str]:
     top_k = top_k or settings.RAG_TOP_K
 
-    query_vector = list(embed_query_cached(query))
+    query_vector = _query_vector(query)
+    query_sql, params = _build_query(query_vector, top_k, project_name)
 
-    if project_name:
-        sql = """
-            SELECT chunk_text,
-                   1 - (embedding <=> %s::vector) AS similarity
-            FROM   project_embeddings
-            WHERE  project_name = %s
-            ORDER  BY embedding <=> %s::vector
-            LIMIT  %s
-        """
-        params = (str(query_vector), project_name, str(query_vector), top_k)
-    else:
-        sql = """
-            SELECT chunk_text,
-                   1 - (embedding <=> %s::vector) AS similarity
-            FROM   project_embeddings
-            ORDER  BY embedding <=> %s::vector
-            LIMIT  %s
-        """
-        params = (str(query_vector), str(query_vector), top_k)
-
-    rows = fetch_all(sql, params)
-    _log_results(rows, query)
+    rows = fetch_all(query_sql, params)
+    _log_results([row["similarity"] for row in rows], query)
     return [row["chunk_text"] for row in rows]
 
 
+async def _search(
+    query_vector: np.ndarray,
+    top_k: int,
+    project_name: str | None,
+    ef_search: int | None,
+    probes: int | None,
+) -> list[tuple[str | None, str, float]]:
+    backend = settings.RAG_RETRIEVAL_BACKEND
+    start = time.perf_counter()
+    if backend == "memory":
+        # Tagged with the requested scope like the Postgres rows: global
+        # hits stay unscoped even though the index knows their project
+        hits = [
+            (project_name, text, score)
+            for _, text, score in await memory_index.search(
+                query_vector, top_k, [project_name] if project_name else None
+            )
+        ]
+    else:
+        query_sql, params = _build_query(query_vector, top_k, project_name)
+        rows = await async_fetch_all(
+            query_sql,
+            params,
+            prepare=True,
+            local_settings=search_settings(ef_search, probes),
+        )
+        hits = [(project_name, r["chunk_text"], float(r["similarity"])) for r in rows]
+    _latencies_ms[backend].append((time.perf_counter() - start) * 1_000)
+    return hits
+
+
+async def _search_projects(
+    query_vector: np.ndarray,
+    project_names: list[str],
+    top_k: int,
+    ef_search: int | None,
+    probes: int | None,
+) -> list[tuple[str, str, float]]:
+    backend = settings.RAG_RETRIEVAL_BACKEND
+    start = time.perf_counter()
+    if backend == "memory":
+        hits = await memory_index.search(query_vector, top_k, project_names)
+    else:
+        query_sql, params = _build_projects_query(query_vector, project_names, top_k)
+        rows = await async_fetch_all(
+            query_sql,
+            params,
+            prepare=True,
+            local_settings=search_settings(ef_search, probes),
+        )
+        hits = [
+            (r["project_name"], r["chunk_text"], float(r["similarity"])) for r in rows
+        ]
+    _latencies_ms[backend].append((time.perf_counter() - start) * 1_000)
+    return hits
+
+
+def _by_project(
+    hits: list[tuple[str | None, str, float]],
+    project_names: list[str] | None,
+) -> dict[str | None, list[tuple[str | None, str, float]]]:
+    groups: dict[str | None, list[tuple[str | None, str, float]]] = {
+        name: [] for name in (project_names or [None])
+    }
+    for hit in hits:
+        groups[hit[0]].append(hit)
+    return groups
+
+
+# Hybrid retrieval. The keyword search runs first since it needs no API call;
+# when it is confident for every requested scope its hits are returned as is.
+# Otherwise the vector search runs and both rankings are fused per project.
+async def _hybrid(
+    query: str,
+    top_k: int,
+    project_names: list[str] | None,
+    ef_search: int | None,
+    probes: int | None,
+) -> list[tuple[str | None, str, float]]:
+    candidates = top_k * max(1, settings.RAG_HYBRID_CANDIDATE_FACTOR)
+
+    start = time.perf_counter()
+    lexical = _by_project(await lexical_search(query, candidates, project_names), project_names)
+    _latencies_ms["lexical"].append((time.perf_counter() - start) * 1_000)
+
+    if settings.RAG_LEXICAL_FAST_PATH and all(
+        is_confident(hits, top_k) for hits in lexical.values()
+    ):
+        _mode_counts["lexical_fast_path"] += 1
+        return [hit for hits in lexical.values() for hit in hits[:top_k]]
+
+    query_vector = await _async_query_vector(query)
+    if project_names is None:
+        vector_hits = await _search(query_vector, candidates, None, ef_search, probes)
+    else:
+        vector_hits = await _search_projects(
+            query_vector, project_names, candidates, ef_search, probes
+        )
+    vector = _by_project(vector_hits, project_names)
+
+    _mode_counts["fused"] += 1
+    fused: list[tuple[str | None, str, float]] = []
+    for name in lexical:
+        rankings = [
+            [text for _, text, _ in vector[name]],
+            [text for _, text, _ in lexical[name]],
+        ]
+        fused.extend(
+            (name, text, score) for text, score in reciprocal_rank_fusion(rankings, top_k)
+        )
+    return fused
+
+
+async def _retrieve(
+    query: str,
+    top_k: int,
+    project_names: list[str] | None,
+    ef_search: int | None,
+    probes: int | None,
+) -> list[tuple[str | None, str, float]]:
+    key = await retrieval_cache.key(query, top_k, project_names, ef_search, probes)
+    hits = retrieval_cache.get(key)
+    if hits is None:
+        hits = await _retrieve_uncached(query, top_k, project_names, ef_search, probes)
+        retrieval_cache.set(key, hits)
+    return hits
+
+
+async def _retrieve_uncached(
+    query: str,
+    top_k: int,
+    project_names: list[str] | None,
+    ef_search: int | None,
+    probes: int | None,
+) -> list[tuple[str | None, str, float]]:
+    if settings.RAG_RETRIEVAL_MODE == "hybrid":
+        return await _hybrid(query, top_k, project_names, ef_search, probes)
+
+    _mode_counts["vector"] += 1
+    query_vector = await _async_query_vector(query)
+    if project_names is None:
+        return await _search(query_vector, top_k, None, ef_search, probes)
+    return await _search_projects(query_vector, project_names, top_k, ef_search, probes)
+
+
+async def async_retrieve_scored_chunks(
+    query: str,
+    top_k: int | None = None,
+    project_name: str | None = None,
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> list[RetrievedChunk]:
+    top_k = top_k or settings.RAG_TOP_K
+
+    hits = await _retrieve(
+        query, top_k, [project_name] if project_name else None, ef_search, probes
+    )
+    _log_results([score for _, _, score in hits], query)
+    return [
+        RetrievedChunk(project_name=name, text=text, score=score)
+        for name, text, score in hits
+    ]
+
+
 async def async_retrieve_relevant_chunks(
     query: str,
     top_k: int | None = None,
     project_name: str | None = None,
+    ef_search: int | None = None,
+    probes: int | None = None,
 ) -> list[str]:
+    chunks = await async_retrieve_scored_chunks(
+        query, top_k, project_name, ef_search, probes
+    )
+    return [c.text for c in chunks]
+
+
+async def async_retrieve_for_projects(
+    query: str,
+    project_names: list[str],
+    top_k: int | None = None,
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> dict[str, list[RetrievedChunk]]:
     top_k = top_k or settings.RAG_TOP_K
+    results: dict[str, list[RetrievedChunk]] = {name: [] for name in project_names}
+    if not project_names:
+        return results
 
-    query_vector = list(embed_query_cached(query))
+    hits = await _retrieve(query, top_k, project_names, ef_search, probes)
+    _log_results([score for _, _, score in hits], query)
 
-    if project_name:
-        sql = """
-            SELECT chunk_text,
-                   1 - (embedding <=> %s::vector) AS similarity
-            FROM   project_embeddings
-            WHERE  project_name = %s
-            ORDER  BY embedding <=> %s::vector
-            LIMIT  %s
-        """
-        params = (str(query_vector), project_name, str(query_vector), top_k)
-    else:
-        sql = """
-            SELECT chunk_text,
-                   1 - (embedding <=> %s::vector) AS similarity
-            FROM   project_embeddings
-            ORDER  BY embedding <=> %s::vector
-            LIMIT  %s
-        """
-        params = (str(query_vector), str(query_vector), top_k)
-
-    rows = await async_fetch_all(sql, params)
-    _log_results(rows, query)
-    return [row["chunk_text"] for row in rows]
+    for name, text, score in hits:
+        results[name].append(RetrievedChunk(project_name=name, text=text, score=score))
+    return results
+
+
+def retrieval_stats() -> dict[str, Any]:
+    stats: dict[str, Any] = {
+        "backend": settings.RAG_RETRIEVAL_BACKEND,
+        "mode": settings.RAG_RETRIEVAL_MODE,
+    }
+    for backend, samples in _latencies_ms.items():
+        latencies = np.asarray(samples) if samples else None
+        stats[backend] = {
+            "queries": len(samples),
+            "latency_p50_ms": (
+                round(float(np.percentile(latencies, 50)), 2) if latencies is not None else 0.0
+            ),
+            "latency_p99_ms": (
+                round(float(np.percentile(latencies, 99)), 2) if latencies is not None else 0.0
+            ),
+        }
+    hybrid_total = _mode_counts["lexical_fast_path"] + _mode_counts["fused"]
+    stats["requests"] = {
+        **_mode_counts,
+        "lexical_fast_path_ratio": (
+            round(_mode_counts["lexical_fast_path"] / hybrid_total, 3) if hybrid_total else 0.0
+        ),
+    }
+    stats["cache"] = retrieval_cache.stats()
+    stats["memory_index"] = memory_index.stats()
+    return stats
 
 
-def _log_results(rows: list[dict], query: str) -> None:
-    if rows:
+def _log_results(scores: list[float], query: str) -> None:
+    if scores:
         logger.debug(
-            "Retrieved %d chunks (best similarity: %.4f)",
-            len(rows),
-            rows[0]["similarity"],
+            "Retrieved %d chunks (best score: %.4f)",
+            len(scores),
+            max(scores),
         )
     else:
         logger.debug("No chunks found for query: %s", query[:80])
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from typing import Any
+
+from psycopg import sql
+
+from app.config import settings
+from app.core.llm import supports_dimensions
+from app.models.database import async_fetch_one, close_pool, get_async_connection
+
+logger = logging.getLogger(__name__)
+
+# Index opclass per precision; quantized profiles index an expression over the
+# full-precision column, which is kept for re-ranking.
+_OPCLASSES: dict[str, str] = {
+    "full": "vector_cosine_ops",
+    "half": "halfvec_cosine_ops",
+    "binary": "bit_hamming_ops",
+}
+
+_SQL_COLUMN_DIMENSIONS = """
+    SELECT NULLIF(a.atttypmod, -1) AS dimensions
+    FROM   pg_attribute a
+    WHERE  a.attrelid = 'project_embeddings'::regclass
+      AND  a.attname = 'embedding'
+"""
+
+_SQL_SHRINK_COLUMN = """
+    ALTER TABLE project_embeddings
+    ALTER COLUMN embedding TYPE vector({dims})
+    USING l2_normalize(subvector(embedding, 1, {dims}))::vector({dims})
+"""
+
+# Lets ingests at the new size reuse stored embeddings instead of the API
+_SQL_SHRINK_STORE = """
+    INSERT INTO embedding_store (text_hash, model, dimensions, embedding)
+    SELECT text_hash, model, %(dims)s, l2_normalize(subvector(embedding, 1, %(dims)s))
+    FROM   embedding_store
+    WHERE  model = %(model)s
+      AND  dimensions = %(from_dims)s
+    ON CONFLICT (text_hash, model, dimensions) DO NOTHING
+"""
+
+
+def index_expression(precision: str, dimensions: int, column: str = "embedding") -> str:
+    if precision == "half":
+        return f"({column}::halfvec({dimensions}))"
+    if precision == "binary":
+        return f"(binary_quantize({column})::bit({dimensions}))"
+    return column
+
+
+def index_opclass(precision: str) -> str:
+    return _OPCLASSES[precision]
+
+
+def candidate_distance(precision: str, dimensions: int, column: str, query: str) -> str:
+    # ORDER BY expression that matches the quantized index
+    if precision == "half":
+        return f"{column}::halfvec({dimensions}) <=> {query}::halfvec({dimensions})"
+    if precision == "binary":
+        return (
+            f"binary_quantize({column})::bit({dimensions}) "
+            f"<~> binary_quantize({query})::bit({dimensions})"
+        )
+    return f"{column} <=> {query}"
+
+
+async def column_dimensions() -> int | None:
+    row = await async_fetch_one(_SQL_COLUMN_DIMENSIONS)
+    return row["dimensions"] if row else None
+
+
+async def storage_status() -> dict[str, Any]:
+    stored = await column_dimensions()
+    return {
+        "model": settings.EMBEDDING_MODEL,
+        "configured_dimensions": settings.EMBEDDING_DIMENSIONS,
+        "column_dimensions": stored,
+        "precision": settings.RAG_VECTOR_PRECISION,
+        "rerank_factor": settings.RAG_RERANK_FACTOR,
+        "needs_migration": stored != settings.EMBEDDING_DIMENSIONS,
+    }
+
+
+async def check_storage_profile() -> None:
+    status = await storage_status()
+    if status["needs_migration"]:
+        logger.warning(
+            "project_embeddings.embedding stores %s dimensions but "
+            "EMBEDDING_DIMENSIONS=%d; run `python -m app.rag.storage migrate`.",
+            status["column_dimensions"],
+            settings.EMBEDDING_DIMENSIONS,
+        )
+
+
+# Fewer dimensions truncate and re-normalize stored vectors in place; more
+# need a re-ingest and are refused
+async def migrate_storage() -> bool:
+    # Imported here: index imports this module for the profile expressions
+    from app.rag.index import drop_all_indexes, ensure_all_indexes
+
+    target = settings.EMBEDDING_DIMENSIONS
+    current = await column_dimensions()
+    if current == target:
+        return await ensure_all_indexes()
+    if current is not None and current < target:
+        raise ValueError(
+            f"Cannot grow vectors from {current} to {target} dimensions in place; "
+            "re-ingest the projects instead."
+        )
+    if not supports_dimensions(settings.EMBEDDING_MODEL):
+        raise ValueError(
+            f"{settings.EMBEDDING_MODEL} does not support shortened embeddings."
+        )
+
+    logger.info("Shrinking stored embeddings from %s to %d dimensions.", current, target)
+    # The ANN indexes are typed to the old size; drop them and rebuild afterwards
+    await drop_all_indexes()
+    async with get_async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql.SQL(_SQL_SHRINK_COLUMN).format(dims=sql.Literal(target)))
+            if current is not None:
+                await cur.execute(
+                    _SQL_SHRINK_STORE,
+                    {"dims": target, "model": settings.EMBEDDING_MODEL, "from_dims": current},
+                )
+
+    await ensure_all_indexes()
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Inspect or apply the vector storage profile "
+            "(EMBEDDING_DIMENSIONS, RAG_VECTOR_PRECISION)."
+        )
+    )
+    parser.add_argument("command", choices=["status", "migrate"])
+    args = parser.parse_args()
+
+    async def run() -> Any:
+        try:
+            if args.command == "migrate":
+                await migrate_storage()
+            return await storage_status()
+        finally:
+            await close_pool()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
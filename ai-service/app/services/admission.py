@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Literal
+
+import numpy as np
+
+from app.config import settings
+
+_WAIT_SAMPLES = 1_000
+# Weight of the newest request in the service time average
+_SERVICE_TIME_ALPHA = 0.2
+# Seed for the average until the first request completes
+_INITIAL_SERVICE_SECONDS = 5.0
+_MAX_RETRY_AFTER_SECONDS = 120
+
+RejectReason = Literal["queue_full", "expired"]
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: RejectReason, retry_after: int) -> None:
+        super().__init__(f"Analysis rejected ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(slots=True)
+class _Waiter:
+    future: asyncio.Future[None]
+    enqueued_at: float
+    deadline: float
+
+
+# Bounded FIFO admission for the analyze routes; a full queue or an expired
+# wait is rejected with a Retry-After estimate
+class AdmissionController:
+    def __init__(self) -> None:
+        self._in_flight = 0
+        self._queue: deque[_Waiter] = deque()
+        self._service_seconds = _INITIAL_SERVICE_SECONDS
+
+        self.admitted = 0
+        self.rejected_full = 0
+        self.expired = 0
+        self.max_queue_depth = 0
+        self._waits_ms: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def retry_after(self) -> int:
+        backlog = len(self._queue) + 1
+        drain = backlog * self._service_seconds / max(settings.ANALYZE_MAX_IN_FLIGHT, 1)
+        return min(max(1, math.ceil(drain)), _MAX_RETRY_AFTER_SECONDS)
+
+    def _grant_next(self) -> None:
+        now = time.monotonic()
+        while self._queue and self._in_flight < settings.ANALYZE_MAX_IN_FLIGHT:
+            waiter = self._queue.popleft()
+            if waiter.future.done():
+                # Timed out or cancelled while queued
+                continue
+            if now >= waiter.deadline:
+                waiter.future.set_exception(AdmissionRejected("expired", self.retry_after()))
+                continue
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    async def _admit(self) -> None:
+        if self._in_flight < settings.ANALYZE_MAX_IN_FLIGHT and not self._queue:
+            self._in_flight += 1
+            self._waits_ms.append(0.0)
+            return
+        if len(self._queue) >= settings.ANALYZE_MAX_QUEUE:
+            self.rejected_full += 1
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        now = time.monotonic()
+        timeout = settings.ANALYZE_MAX_QUEUE_WAIT_SECONDS
+        waiter = _Waiter(
+            future=asyncio.get_running_loop().create_future(),
+            enqueued_at=now,
+            deadline=now + timeout,
+        )
+        self._queue.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, AdmissionRejected):
+            if waiter.future.done() and not waiter.future.exception():
+                # Granted as the timeout fired: hand the slot on
+                self._release()
+            self.expired += 1
+            waiter.future.cancel()
+            raise AdmissionRejected("expired", self.retry_after()) from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                if waiter.future.exception() is None:
+                    self._release()
+            waiter.future.cancel()
+            raise
+        finally:
+            self._waits_ms.append((time.monotonic() - waiter.enqueued_at) * 1_000)
+            # An expired or cancelled waiter leaves at once, so capacity and
+            # Retry-After only count live waiters
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._grant_next()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self._admit()
+        self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self._service_seconds += _SERVICE_TIME_ALPHA * (elapsed - self._service_seconds)
+            self._release()
+
+    def stats(self) -> dict[str, Any]:
+        waits = np.asarray(self._waits_ms) if self._waits_ms else np.zeros(1)
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": settings.ANALYZE_MAX_IN_FLIGHT,
+            "queued": len(self._queue),
+            "max_queue": settings.ANALYZE_MAX_QUEUE,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "expired": self.expired,
+            "queue_wait_p50_ms": round(float(np.percentile(waits, 50)), 2),
+            "queue_wait_p99_ms": round(float(np.percentile(waits, 99)), 2),
+            "avg_service_ms": round(self._service_seconds * 1_000, 1),
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+analysis_admission = AdmissionController()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from app.chains.prompts import PROMPT_VERSION
+from app.config import settings
+from app.models.database import async_execute_query, async_fetch_one
+from app.models.schemas import AnalyzeResponse
+from app.services.conversation_store import Watermark
+
+logger = logging.getLogger(__name__)
+
+_SQL_SELECT = """
+    SELECT summary, tags, priority, message_count, messages_digest,
+           last_message_id, last_message_at
+    FROM   conversation_analysis_state
+    WHERE  conversation_id = %s
+      AND  model = %s
+      AND  prompt_version = %s
+"""
+
+_SQL_UPSERT = """
+    INSERT INTO conversation_analysis_state
+           (conversation_id, summary, tags, priority, message_count,
+            messages_digest, last_message_id, last_message_at, model,
+            prompt_version, analysis_started_at, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+    ON CONFLICT (conversation_id) DO UPDATE
+        SET summary = EXCLUDED.summary,
+            tags = EXCLUDED.tags,
+            priority = EXCLUDED.priority,
+            message_count = EXCLUDED.message_count,
+            messages_digest = EXCLUDED.messages_digest,
+            last_message_id = EXCLUDED.last_message_id,
+            last_message_at = EXCLUDED.last_message_at,
+            model = EXCLUDED.model,
+            prompt_version = EXCLUDED.prompt_version,
+            analysis_started_at = EXCLUDED.analysis_started_at,
+            updated_at = NOW()
+        -- An analysis that started earlier never replaces a later one, even
+        -- when the history has shrunk since
+        WHERE conversation_analysis_state.analysis_started_at
+              <= EXCLUDED.analysis_started_at
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class AnalysisState:
+    result: AnalyzeResponse
+    # Watermark: the analysis covers the first message_count messages
+    message_count: int
+    messages_digest: str
+    # Position of the last covered message; only known when the service
+    # loaded the conversation itself
+    watermark: Watermark | None = None
+
+
+# Last analysis of each conversation, in conversation_analysis_state. States
+# written by another model or prompt version are ignored. Failures are logged
+# and counted; the analysis then simply runs over the full history.
+class AnalysisStateStore:
+    def __init__(self) -> None:
+        self.loads = 0
+        self.found = 0
+        self.writes = 0
+        self.errors = 0
+
+    async def get(self, conversation_id: str) -> AnalysisState | None:
+        self.loads += 1
+        try:
+            row = await async_fetch_one(
+                _SQL_SELECT,
+                (conversation_id, settings.OPENAI_MODEL, PROMPT_VERSION),
+                prepare=True,
+            )
+        except Exception:
+            self.errors += 1
+            logger.warning("Analysis state lookup failed.", exc_info=True)
+            return None
+
+        if row is None:
+            return None
+        self.found += 1
+        return AnalysisState(
+            result=AnalyzeResponse(
+                summary=row["summary"], tags=row["tags"], priority=row["priority"]
+            ),
+            message_count=row["message_count"],
+            messages_digest=row["messages_digest"],
+            watermark=(
+                Watermark(row["last_message_id"], row["last_message_at"])
+                if row["last_message_id"] is not None
+                else None
+            ),
+        )
+
+    async def save(
+        self,
+        conversation_id: str,
+        result: AnalyzeResponse,
+        message_count: int,
+        messages_digest: str,
+        started_at: datetime,
+        watermark: Watermark | None = None,
+    ) -> None:
+        try:
+            await async_execute_query(
+                _SQL_UPSERT,
+                (
+                    conversation_id,
+                    result.summary,
+                    result.tags,
+                    result.priority,
+                    message_count,
+                    messages_digest,
+                    watermark.message_id if watermark else None,
+                    watermark.created_at if watermark else None,
+                    settings.OPENAI_MODEL,
+                    PROMPT_VERSION,
+                    started_at,
+                ),
+                prepare=True,
+            )
+            self.writes += 1
+        except Exception:
+            self.errors += 1
+            logger.warning("Analysis state write failed.", exc_info=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": settings.ANALYSIS_INCREMENTAL,
+            "loads": self.loads,
+            "found": self.found,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
+
+
+analysis_state = AnalysisStateStore()
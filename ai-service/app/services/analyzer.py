@@ -3,15 +3,54 @@ from __future__ import annotations
 import asyncio
 import logging
 import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+from uuid import UUID
 
+from langchain_community.callbacks import get_openai_callback
+
+from app.chains.combined import CombinedAnalysisError, generate_analysis
+from app.chains.incremental import generate_incremental_analysis
 from app.chains.priority import generate_priority
 from app.chains.summary import generate_summary
 from app.chains.tagger import generate_tags
-from app.models.schemas import AnalyzeResponse, MessageInput
-from app.rag.retriever import async_retrieve_relevant_chunks
+from app.config import settings
+from app.core.scheduler import llm_priority
+from app.core.tokens import estimate_tokens
+from app.models.schemas import (
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchAnalyzeItem,
+    MessageInput,
+)
+from app.rag.context import build_context
+from app.rag.retriever import (
+    RetrievedChunk,
+    async_retrieve_for_projects,
+    async_retrieve_scored_chunks,
+)
+from app.services.analysis_state import AnalysisState, analysis_state
+from app.services.compactor import (
+    conversation_compactor,
+    extend_digest,
+    format_message,
+    messages_digest,
+)
+from app.services.conversation_store import (
+    Watermark,
+    load_after,
+    load_head,
+    load_messages,
+    watermark_holds,
+)
+from app.services.result_cache import analysis_cache, build_cache_key
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 _PROJECT_KEYWORDS: dict[str, str] = {
     "torre alvarez": "Torre Alvarez",
     "torre álvarez": "Torre Alvarez",
@@ -24,16 +63,8 @@ _PROJECT_KEYWORDS: dict[str, str] = {
 }
 
 
-def _format_conversation(messages: list[MessageInput]) -> str:
-    lines: list[str] = []
-    for msg in messages:
-        role_label = "Asesor" if msg.sender_type == "agent" else "Prospecto"
-        lines.append(f"[{role_label} - {msg.sender_name}]: {msg.content}")
-    return "\n".join(lines)
-
-
-def _extract_project_mentions(messages: list[MessageInput]) -> list[str]:
-    full_text = " ".join(m.content for m in messages).lower()
+def _extract_project_mentions(texts: Iterable[str]) -> list[str]:
+    full_text = " ".join(texts).lower()
     found: set[str] = set()
 
     # Sort keywords longest-first so "residencial del parque" matches before "del parque"
@@ -41,46 +72,155 @@ def _extract_project_mentions(messages: list[MessageInput]) -> list[str]:
         if re.search(re.escape(keyword), full_text):
             found.add(_PROJECT_KEYWORDS[keyword])
 
-    return list(found)
+    # Sorted so identical conversations resolve to identical retrievals
+    return sorted(found)
 
 
-async def _build_rag_context(messages: list[MessageInput]) -> str:
-    projects = _extract_project_mentions(messages)
-    chunks: list[str] = []
+class SharedRetrieval:
+    # Deduplicates retrievals across the items of one batch: the first caller
+    # for a given key starts the query, later callers await the same task.
+    def __init__(self) -> None:
+        self._tasks: dict[tuple, asyncio.Task] = {}
+        self.requested = 0
 
-    if projects:
-        for project_name in projects:
-            project_chunks = await async_retrieve_relevant_chunks(
-                query=" ".join(m.content for m in messages[:5]),
-                top_k=3,
-                project_name=project_name,
-            )
-            chunks.extend(project_chunks)
-    else:
-        query = " ".join(m.content for m in messages[:5])
-        chunks = await async_retrieve_relevant_chunks(query=query, top_k=4)
+    async def _shared(self, key: tuple, factory: Callable[[], Awaitable[T]]) -> T:
+        self.requested += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        # Shielded so one cancelled item does not cancel a shared retrieval
+        return await asyncio.shield(task)
 
-    if not chunks:
-        return ""
+    async def chunks(
+        self, query: str, top_k: int | None = None
+    ) -> list[RetrievedChunk]:
+        return await self._shared(
+            ("global", query, top_k),
+            lambda: async_retrieve_scored_chunks(query=query, top_k=top_k),
+        )
 
-    return "\n---\n".join(chunks)
+    async def chunks_for_projects(
+        self,
+        query: str,
+        project_names: list[str],
+        top_k: int | None = None,
+    ) -> dict[str, list[RetrievedChunk]]:
+        return await self._shared(
+            ("projects", tuple(project_names), query, top_k),
+            lambda: async_retrieve_for_projects(
+                query=query, project_names=project_names, top_k=top_k
+            ),
+        )
 
+    @property
+    def executed(self) -> int:
+        return len(self._tasks)
 
-async def analyze_conversation(
-    conversation_id: str,
+
+class AnalysisSuperseded(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class _InFlight:
+    # None never matches, so such a request cannot be attached to
+    fingerprint: str | None
+    task: asyncio.Task
+    superseded: bool = False
+
+
+# One running analysis per conversation: the same payload attaches to it, a
+# different one supersedes it
+class InFlightAnalyses:
+    def __init__(self) -> None:
+        self._running: dict[str, _InFlight] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.superseded = 0
+
+    async def run(
+        self,
+        conversation_id: str,
+        fingerprint: str | None,
+        factory: Callable[[], Awaitable[T]],
+    ) -> T:
+        entry = self._running.get(conversation_id)
+        if entry is not None and not entry.task.done():
+            if fingerprint is not None and entry.fingerprint == fingerprint:
+                self.coalesced += 1
+                return await self._wait(entry)
+            entry.superseded = True
+            entry.task.cancel()
+            self.superseded += 1
+            logger.info("Analysis of conversation %s superseded", conversation_id)
+
+        entry = _InFlight(fingerprint, asyncio.ensure_future(factory()))
+        self._running[conversation_id] = entry
+        self.started += 1
+        entry.task.add_done_callback(lambda _: self._release(conversation_id, entry))
+        return await self._wait(entry)
+
+    def _release(self, conversation_id: str, entry: _InFlight) -> None:
+        if self._running.get(conversation_id) is entry:
+            del self._running[conversation_id]
+
+    async def _wait(self, entry: _InFlight) -> Any:
+        try:
+            return await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            # Only translate the cancellation that came from a newer request
+            if entry.superseded and not (current and current.cancelling()):
+                raise AnalysisSuperseded() from None
+            raise
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._running),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "superseded": self.superseded,
+        }
+
+
+in_flight_analyses = InFlightAnalyses()
+
+
+async def _build_rag_context(
     messages: list[MessageInput],
-) -> AnalyzeResponse:
-    conversation_text = _format_conversation(messages)
+    shared: SharedRetrieval | None = None,
+    mention_texts: list[str] | None = None,
+) -> str:
+    projects = _extract_project_mentions(
+        mention_texts if mention_texts is not None else (m.content for m in messages)
+    )
+    query = " ".join(m.content for m in messages[:5])
+    candidates = settings.RAG_CONTEXT_CANDIDATES
 
-    project_context = await _build_rag_context(messages)
+    if projects:
+        retrieve_many = (
+            shared.chunks_for_projects if shared else async_retrieve_for_projects
+        )
+        by_project = await retrieve_many(
+            query=query, project_names=projects, top_k=candidates
+        )
+        chunks = [c for project_name in projects for c in by_project[project_name]]
+        return build_context(chunks)
 
-    logger.info(
-        "Analysing conversation %s (%d messages, %d chars of RAG context)",
-        conversation_id,
-        len(messages),
-        len(project_context),
+    retrieve = shared.chunks if shared else async_retrieve_scored_chunks
+    chunks = await retrieve(query=query, top_k=candidates)
+    # A global search is capped in total, whatever projects its hits come from
+    return build_context(
+        chunks, max_per_project=settings.RAG_TOP_K, max_chunks=settings.RAG_TOP_K
     )
 
+
+async def _run_parallel_chains(
+    conversation_id: str,
+    conversation_text: str,
+    project_context: str,
+) -> AnalyzeResponse:
     # Launch the three chains concurrently
     summary_task = generate_summary(
         conversation_id=conversation_id,
@@ -105,3 +245,316 @@ async def analyze_conversation(
         tags=tags,
         priority=priority,
     )
+
+
+async def _run_chains(
+    conversation_id: str,
+    conversation_text: str,
+    project_context: str,
+) -> tuple[AnalyzeResponse, str]:
+    if settings.ANALYSIS_MODE == "combined":
+        try:
+            result = await generate_analysis(
+                conversation_id=conversation_id,
+                conversation_text=conversation_text,
+                project_context=project_context,
+            )
+            return result, "combined"
+        except CombinedAnalysisError as exc:
+            logger.warning(
+                "Combined analysis output rejected for %s (%s); "
+                "falling back to parallel chains",
+                conversation_id,
+                exc,
+            )
+            result = await _run_parallel_chains(
+                conversation_id, conversation_text, project_context
+            )
+            return result, "combined-fallback"
+
+    result = await _run_parallel_chains(
+        conversation_id, conversation_text, project_context
+    )
+    return result, "parallel"
+
+
+async def _run_incremental(
+    conversation_id: str,
+    lines: list[str],
+    state: AnalysisState,
+    project_context: str,
+) -> tuple[AnalyzeResponse, str] | None:
+    # None means the stored state cannot be used and a full analysis is needed
+    covered = state.message_count
+    if covered > len(lines) or messages_digest(lines[:covered]) != state.messages_digest:
+        # History edited or deleted behind the watermark
+        return None
+    if covered == len(lines):
+        return state.result, "state"
+
+    new_text = "\n".join(lines[covered:])
+    if estimate_tokens(new_text) > settings.ANALYSIS_INCREMENTAL_MAX_NEW_TOKENS:
+        return None
+    try:
+        result = await generate_incremental_analysis(
+            conversation_id=conversation_id,
+            previous=state.result,
+            previous_count=covered,
+            new_messages_text=new_text,
+            project_context=project_context,
+        )
+    except CombinedAnalysisError as exc:
+        logger.warning(
+            "Incremental analysis output rejected for %s (%s); analysing in full",
+            conversation_id,
+            exc,
+        )
+        return None
+    return result, "incremental"
+
+
+def _log_analysis(conversation_id: str, mode: str, usage: Any, start: float) -> None:
+    logger.info(
+        "[analysis] conversation=%s mode=%s llm_calls=%d prompt_tokens=%d "
+        "completion_tokens=%d cost_usd=%.6f duration=%.0fms",
+        conversation_id,
+        mode,
+        usage.successful_requests,
+        usage.prompt_tokens,
+        usage.completion_tokens,
+        usage.total_cost,
+        (time.perf_counter() - start) * 1_000,
+    )
+
+
+async def analyze_conversation(
+    conversation_id: str,
+    messages: list[MessageInput],
+    shared_retrieval: SharedRetrieval | None = None,
+    incremental: bool | None = None,
+    watermark: Watermark | None = None,
+) -> AnalyzeResponse:
+    stateful = settings.ANALYSIS_INCREMENTAL if incremental is None else incremental
+    started_at = datetime.now(timezone.utc)
+    project_context = await _build_rag_context(messages, shared_retrieval)
+
+    lines = [format_message(m) for m in messages]
+    cache_key = build_cache_key(messages, project_context)
+    cached = await analysis_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Analysis cache hit for conversation %s", conversation_id)
+        # The state still has to advance, or the next analysis would extend
+        # an older watermark
+        if stateful:
+            await analysis_state.save(
+                conversation_id, cached, len(lines), messages_digest(lines), started_at, watermark
+            )
+        return cached
+
+    start = time.perf_counter()
+    with get_openai_callback() as usage:
+        outcome = None
+        if stateful:
+            state = await analysis_state.get(conversation_id)
+            if state is not None:
+                outcome = await _run_incremental(
+                    conversation_id, lines, state, project_context
+                )
+
+        if outcome is None:
+            conversation = await conversation_compactor.compact(conversation_id, messages)
+            logger.info(
+                "Analysing conversation %s (%d messages, %d verbatim, ~%d tokens, "
+                "%d chars of RAG context)",
+                conversation_id,
+                conversation.messages_total,
+                conversation.messages_verbatim,
+                conversation.tokens_after,
+                len(project_context),
+            )
+            outcome = await _run_chains(conversation_id, conversation.text, project_context)
+        result, mode = outcome
+    _log_analysis(conversation_id, mode, usage, start)
+
+    # A state served as is still gains the positional watermark, if known
+    if stateful and (mode != "state" or watermark is not None):
+        await analysis_state.save(
+            conversation_id, result, len(lines), messages_digest(lines), started_at, watermark
+        )
+    await analysis_cache.set(cache_key, result)
+    return result
+
+
+# Messages past the stored watermark, read straight from the database, or
+# None when the state cannot be extended that way (no positional watermark,
+# history changed behind it, or too many new messages).
+async def _analyze_from_watermark(
+    conversation_id: UUID,
+    state: AnalysisState,
+) -> AnalyzeResponse | None:
+    started_at = datetime.now(timezone.utc)
+    if state.watermark is None or not await watermark_holds(
+        conversation_id, state.watermark, state.message_count
+    ):
+        return None
+
+    start = time.perf_counter()
+    loaded = await load_after(conversation_id, state.watermark)
+    if not loaded.messages:
+        logger.info("[analysis] conversation=%s mode=state (no new messages)", conversation_id)
+        return state.result
+
+    new_lines = [format_message(m) for m in loaded.messages]
+    new_text = "\n".join(new_lines)
+    if estimate_tokens(new_text) > settings.ANALYSIS_INCREMENTAL_MAX_NEW_TOKENS:
+        return None
+
+    # Project mentions older than the head are carried by the stored summary
+    head = await load_head(conversation_id, 5)
+    project_context = await _build_rag_context(
+        head,
+        mention_texts=[
+            *(m.content for m in head),
+            state.result.summary,
+            *(m.content for m in loaded.messages),
+        ],
+    )
+
+    with get_openai_callback() as usage:
+        try:
+            result = await generate_incremental_analysis(
+                conversation_id=str(conversation_id),
+                previous=state.result,
+                previous_count=state.message_count,
+                new_messages_text=new_text,
+                project_context=project_context,
+            )
+        except CombinedAnalysisError as exc:
+            logger.warning(
+                "Incremental analysis output rejected for %s (%s); analysing in full",
+                conversation_id,
+                exc,
+            )
+            return None
+    _log_analysis(str(conversation_id), "incremental", usage, start)
+
+    await analysis_state.save(
+        str(conversation_id),
+        result,
+        state.message_count + len(new_lines),
+        extend_digest(state.messages_digest, new_lines),
+        started_at,
+        loaded.watermark,
+    )
+    return result
+
+
+# Loads the messages past the stored watermark, or the whole history;
+# None when the conversation has no messages
+async def _analyze_by_id(
+    conversation_id: UUID,
+    incremental: bool | None,
+) -> AnalyzeResponse | None:
+    stateful = settings.ANALYSIS_INCREMENTAL if incremental is None else incremental
+    if stateful:
+        state = await analysis_state.get(str(conversation_id))
+        if state is not None:
+            result = await _analyze_from_watermark(conversation_id, state)
+            if result is not None:
+                return result
+
+    loaded = await load_messages(conversation_id)
+    if not loaded.messages:
+        return None
+    return await analyze_conversation(
+        conversation_id=str(conversation_id),
+        messages=loaded.messages,
+        incremental=stateful,
+        watermark=loaded.watermark,
+    )
+
+
+async def analyze_latest(
+    conversation_id: str,
+    messages: list[MessageInput],
+    incremental: bool | None = None,
+) -> AnalyzeResponse:
+    fingerprint = messages_digest(
+        [f"incremental={incremental}", *(format_message(m) for m in messages)]
+    )
+    return await in_flight_analyses.run(
+        conversation_id,
+        fingerprint,
+        lambda: analyze_conversation(
+            conversation_id=conversation_id,
+            messages=messages,
+            incremental=incremental,
+        ),
+    )
+
+
+async def analyze_conversation_by_id(
+    conversation_id: UUID,
+    incremental: bool | None = None,
+) -> AnalyzeResponse | None:
+    # The messages are only known once loaded, so a newer request by id
+    # always supersedes rather than attaches
+    return await in_flight_analyses.run(
+        str(conversation_id),
+        None,
+        lambda: _analyze_by_id(conversation_id, incremental),
+    )
+
+
+async def analyze_conversations_batch(
+    items: list[AnalyzeRequest],
+    max_concurrency: int | None = None,
+) -> list[BatchAnalyzeItem]:
+    limit = min(
+        max_concurrency or settings.ANALYZE_BATCH_CONCURRENCY,
+        settings.ANALYZE_BATCH_CONCURRENCY,
+    )
+    semaphore = asyncio.Semaphore(limit)
+    retrieval = SharedRetrieval()
+
+    async def run_item(item: AnalyzeRequest) -> BatchAnalyzeItem:
+        async with semaphore:
+            try:
+                result = await analyze_conversation(
+                    conversation_id=item.conversation_id,
+                    messages=item.messages,
+                    shared_retrieval=retrieval,
+                    incremental=item.incremental,
+                )
+                return BatchAnalyzeItem(
+                    conversation_id=item.conversation_id,
+                    status="ok",
+                    result=result,
+                )
+            except Exception as exc:
+                logger.exception(
+                    "Batch item failed for conversation %s", item.conversation_id
+                )
+                return BatchAnalyzeItem(
+                    conversation_id=item.conversation_id,
+                    status="error",
+                    error=str(exc),
+                )
+
+    start = time.perf_counter()
+    # Items run as tasks that inherit the batch class, so interactive
+    # analyses are served first when the LLM scheduler queues
+    with llm_priority("batch"):
+        results = await asyncio.gather(*(run_item(item) for item in items))
+    duration_ms = (time.perf_counter() - start) * 1_000
+
+    logger.info(
+        "[batch] items=%d concurrency=%d failed=%d retrievals=%d/%d duration=%.0fms",
+        len(items),
+        limit,
+        sum(1 for r in results if r.status == "error"),
+        retrieval.executed,
+        retrieval.requested,
+        duration_ms,
+    )
+    return list(results)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from app.chains.condense import generate_condensed_history
+from app.chains.prompts import PROMPT_VERSION
+from app.config import settings
+from app.core.cache import ByteLRUCache
+from app.core.tokens import estimate_tokens
+from app.models.schemas import MessageInput
+
+logger = logging.getLogger(__name__)
+
+SummarySource = Literal["none", "cache", "incremental", "full"]
+
+
+def format_message(msg: MessageInput) -> str:
+    role_label = "Asesor" if msg.sender_type == "agent" else "Prospecto"
+    return f"[{role_label} - {msg.sender_name}]: {msg.content}"
+
+
+def format_messages(messages: list[MessageInput]) -> str:
+    return "\n".join(format_message(m) for m in messages)
+
+
+# Chained per message, so the digest of a longer history can be derived from
+# a stored digest and only the messages added since
+def extend_digest(digest: str, lines: list[str]) -> str:
+    for line in lines:
+        digest = hashlib.sha256(f"{digest}\0{line}".encode("utf-8")).hexdigest()
+    return digest
+
+
+def messages_digest(lines: list[str]) -> str:
+    seed = hashlib.sha256(f"{settings.OPENAI_MODEL}:{PROMPT_VERSION}".encode()).hexdigest()
+    return extend_digest(seed, lines)
+
+
+@dataclass(frozen=True, slots=True)
+class _Summary:
+    # Summary of the first ``covered`` messages, whose digest is ``digest``
+    covered: int
+    digest: str
+    text: str
+
+
+@dataclass(frozen=True, slots=True)
+class CompactedConversation:
+    text: str
+    messages_total: int
+    messages_verbatim: int
+    tokens_before: int
+    tokens_after: int
+    summary_source: SummarySource
+
+    @property
+    def compacted(self) -> bool:
+        return self.summary_source != "none"
+
+
+# Replaces all but the newest messages with a cached summary that is
+# extended in steps of CONVERSATION_KEEP_RECENT messages
+class ConversationCompactor:
+    def __init__(self) -> None:
+        self._summaries: ByteLRUCache[_Summary] = ByteLRUCache(
+            max_bytes=settings.CONVERSATION_SUMMARY_CACHE_MAX_BYTES,
+            ttl_seconds=settings.CONVERSATION_SUMMARY_CACHE_TTL_SECONDS,
+        )
+        self._in_flight: dict[tuple[str, str], asyncio.Task[_Summary]] = {}
+
+        self.requests = 0
+        self.compacted = 0
+        self.summary_calls = 0
+        self.by_source: dict[str, int] = {"cache": 0, "incremental": 0, "full": 0}
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def _boundary(self, lines: list[str], tokens: list[int]) -> int:
+        keep = max(1, settings.CONVERSATION_KEEP_RECENT)
+        cut = max(0, (len(lines) - keep) // keep * keep)
+        # Rarely the tail alone is over budget; give up the step alignment
+        # but never the newest ``keep`` messages
+        budget = settings.CONVERSATION_MAX_TOKENS - settings.CONVERSATION_SUMMARY_MAX_WORDS * 2
+        while len(lines) - cut > keep and sum(tokens[cut:]) > budget:
+            cut += 1
+        return cut
+
+    async def _condense(self, lines: list[str], previous: str) -> str:
+        # Folds the history in budget-sized pieces so that even a thread far
+        # beyond the model's context window can be condensed
+        summary = previous
+        piece: list[str] = []
+        size = 0
+        for line in lines:
+            cost = estimate_tokens(line)
+            if piece and size + cost > settings.CONVERSATION_MAX_TOKENS:
+                self.summary_calls += 1
+                summary = await generate_condensed_history("\n".join(piece), summary)
+                piece, size = [], 0
+            piece.append(line)
+            size += cost
+        if piece:
+            self.summary_calls += 1
+            summary = await generate_condensed_history("\n".join(piece), summary)
+        return summary
+
+    async def _summarize(
+        self, conversation_id: str, lines: list[str]
+    ) -> tuple[_Summary, SummarySource]:
+        digest = messages_digest(lines)
+        cached = self._summaries.get(conversation_id)
+        if cached is not None and cached.covered == len(lines) and cached.digest == digest:
+            return cached, "cache"
+
+        key = (conversation_id, digest)
+        task = self._in_flight.get(key)
+        source: SummarySource = "full"
+        if (
+            cached is not None
+            and cached.covered < len(lines)
+            and cached.digest == messages_digest(lines[: cached.covered])
+        ):
+            source = "incremental"
+
+        if task is None:
+            if source == "incremental":
+                work = self._condense(lines[cached.covered :], cached.text)
+            else:
+                work = self._condense(lines, "")
+
+            async def build() -> _Summary:
+                try:
+                    text = await work
+                finally:
+                    self._in_flight.pop(key, None)
+                summary = _Summary(covered=len(lines), digest=digest, text=text)
+                self._summaries.set(
+                    conversation_id, summary, len(text.encode("utf-8")) + 128
+                )
+                return summary
+
+            task = asyncio.ensure_future(build())
+            self._in_flight[key] = task
+        # Shielded so a cancelled analysis does not waste a shared summary
+        return await asyncio.shield(task), source
+
+    async def compact(
+        self,
+        conversation_id: str,
+        messages: list[MessageInput],
+    ) -> CompactedConversation:
+        self.requests += 1
+        lines = [format_message(m) for m in messages]
+        tokens = [estimate_tokens(line) + 1 for line in lines]
+        tokens_before = sum(tokens)
+        self.tokens_before += tokens_before
+
+        cut = self._boundary(lines, tokens) if settings.CONVERSATION_COMPACTION_ENABLED else 0
+        if tokens_before <= settings.CONVERSATION_MAX_TOKENS or cut == 0:
+            self.tokens_after += tokens_before
+            return CompactedConversation(
+                text="\n".join(lines),
+                messages_total=len(lines),
+                messages_verbatim=len(lines),
+                tokens_before=tokens_before,
+                tokens_after=tokens_before,
+                summary_source="none",
+            )
+
+        summary, source = await self._summarize(conversation_id, lines[:cut])
+        text = "\n".join(
+            [f"[Resumen de los {cut} mensajes anteriores]: {summary.text}", *lines[cut:]]
+        )
+        tokens_after = estimate_tokens(text)
+
+        self.compacted += 1
+        self.by_source[source] += 1
+        self.tokens_after += tokens_after
+        logger.info(
+            "[compaction] conversation=%s messages=%d verbatim=%d tokens=%d->%d summary=%s",
+            conversation_id,
+            len(lines),
+            len(lines) - cut,
+            tokens_before,
+            tokens_after,
+            source,
+        )
+        return CompactedConversation(
+            text=text,
+            messages_total=len(lines),
+            messages_verbatim=len(lines) - cut,
+            tokens_before=tokens_before,
+            tokens_after=tokens_after,
+            summary_source=source,
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": settings.CONVERSATION_COMPACTION_ENABLED,
+            "requests": self.requests,
+            "compacted": self.compacted,
+            "summary_calls": self.summary_calls,
+            "summaries": dict(self.by_source),
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved_ratio": (
+                round(1 - self.tokens_after / self.tokens_before, 4)
+                if self.tokens_before
+                else 0.0
+            ),
+            "summary_cache": self._summaries.stats(),
+        }
+
+
+conversation_compactor = ConversationCompactor()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from app.config import settings
+from app.models.database import async_fetch_one, get_async_connection
+from app.models.schemas import MessageInput
+
+logger = logging.getLogger(__name__)
+
+# Same projection as the web tier's analysis query. Ordered by (created_at,
+# id) so messages sharing a timestamp keep a stable order; the range and
+# order are served by idx_messages_created.
+_SQL_MESSAGES = """
+    SELECT m.id,
+           m.created_at,
+           m.sender_type::text                 AS sender_type,
+           COALESCE(u.name, l.name, 'Unknown') AS sender_name,
+           m.content
+    FROM   messages m
+    LEFT   JOIN users u ON m.sender_type = 'agent' AND u.id = m.sender_id
+    LEFT   JOIN leads l ON m.sender_type = 'lead' AND l.id = m.sender_id
+    WHERE  m.conversation_id = %s
+    ORDER  BY m.created_at, m.id
+"""
+
+_SQL_MESSAGES_HEAD = _SQL_MESSAGES + "    LIMIT %s\n"
+
+_SQL_MESSAGES_AFTER = """
+    SELECT m.id,
+           m.created_at,
+           m.sender_type::text                 AS sender_type,
+           COALESCE(u.name, l.name, 'Unknown') AS sender_name,
+           m.content
+    FROM   messages m
+    LEFT   JOIN users u ON m.sender_type = 'agent' AND u.id = m.sender_id
+    LEFT   JOIN leads l ON m.sender_type = 'lead' AND l.id = m.sender_id
+    WHERE  m.conversation_id = %s
+      AND  m.created_at >= %s
+      AND  (m.created_at, m.id) > (%s, %s)
+    ORDER  BY m.created_at, m.id
+"""
+
+# The watermark still describes the history if its message exists and
+# exactly message_count messages lie at or before it
+_SQL_WATERMARK_CHECK = """
+    SELECT COUNT(*)              AS cnt,
+           COALESCE(bool_or(m.id = %s), false) AS found
+    FROM   messages m
+    WHERE  m.conversation_id = %s
+      AND  (m.created_at, m.id) <= (%s, %s)
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Watermark:
+    message_id: UUID
+    created_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class LoadedMessages:
+    messages: list[MessageInput]
+    # Last message loaded; None when nothing was
+    watermark: Watermark | None
+
+
+def _message(row: dict[str, Any]) -> MessageInput:
+    return MessageInput(
+        sender_type=row["sender_type"],
+        sender_name=row["sender_name"],
+        content=row["content"],
+    )
+
+
+async def _stream(query: str, params: tuple[Any, ...]) -> LoadedMessages:
+    # Named cursor: rows are fetched from the server in batches of
+    # CONVERSATION_FETCH_BATCH instead of materializing the whole result
+    messages: list[MessageInput] = []
+    last: dict[str, Any] | None = None
+    async with get_async_connection() as conn:
+        async with conn.cursor(name="conversation_messages") as cur:
+            cur.itersize = settings.CONVERSATION_FETCH_BATCH
+            await cur.execute(query, params)
+            async for row in cur:
+                messages.append(_message(row))
+                last = row
+    watermark = Watermark(last["id"], last["created_at"]) if last else None
+    return LoadedMessages(messages=messages, watermark=watermark)
+
+
+async def load_messages(conversation_id: UUID) -> LoadedMessages:
+    return await _stream(_SQL_MESSAGES, (conversation_id,))
+
+
+async def load_head(conversation_id: UUID, count: int) -> list[MessageInput]:
+    loaded = await _stream(_SQL_MESSAGES_HEAD, (conversation_id, count))
+    return loaded.messages
+
+
+async def load_after(conversation_id: UUID, watermark: Watermark) -> LoadedMessages:
+    return await _stream(
+        _SQL_MESSAGES_AFTER,
+        (
+            conversation_id,
+            watermark.created_at,
+            watermark.created_at,
+            watermark.message_id,
+        ),
+    )
+
+
+async def watermark_holds(
+    conversation_id: UUID,
+    watermark: Watermark,
+    message_count: int,
+) -> bool:
+    row = await async_fetch_one(
+        _SQL_WATERMARK_CHECK,
+        (watermark.message_id, conversation_id, watermark.created_at, watermark.message_id),
+        prepare=True,
+    )
+    return bool(row and row["found"] and row["cnt"] == message_count)
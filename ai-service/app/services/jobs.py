@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal
+
+from app.config import settings
+from app.rag.index import ensure_all_indexes, maybe_rebuild_after_ingest
+from app.rag.ingest import (
+    API_SOURCE,
+    file_source,
+    ingest_project_document,
+    ingest_texts,
+    load_project_file,
+    project_files,
+)
+from app.rag.memory_index import memory_index
+from app.rag.pipeline import IngestProgress, ProgressCallback, delete_old_versions
+from app.rag.storage import check_storage_profile
+
+logger = logging.getLogger(__name__)
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+JobKind = Literal["ingest", "auto_ingest", "cleanup"]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class IngestJob:
+    id: str
+    kind: JobKind
+    project_name: str | None
+    documents_total: int
+    status: JobStatus = "queued"
+    documents_done: int = 0
+    chunks_split: int = 0
+    chunks_embedded: int = 0
+    chunks_written: int = 0
+    chunks_carried: int = 0
+    unchanged_projects: list[str] = field(default_factory=list)
+    error: str | None = None
+    created_at: datetime = field(default_factory=_now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def tracker(self) -> ProgressCallback:
+        # Counters accumulate across the pipeline runs of one job
+        base_split, base_embedded, base_written, base_carried = (
+            self.chunks_split,
+            self.chunks_embedded,
+            self.chunks_written,
+            self.chunks_carried,
+        )
+
+        def on_progress(progress: IngestProgress) -> None:
+            self.chunks_split = base_split + progress.chunks_split
+            self.chunks_embedded = base_embedded + progress.chunks_embedded
+            self.chunks_written = base_written + progress.chunks_written
+            self.chunks_carried = base_carried + progress.chunks_carried
+
+        return on_progress
+
+
+JobWork = Callable[[IngestJob], Awaitable[None]]
+
+
+# Ingestion runs as background asyncio tasks; the API only submits jobs and
+# polls their status. Jobs touching the same project are serialized by a
+# per-project lock, and finished jobs are kept up to JOBS_HISTORY_LIMIT.
+class JobManager:
+    def __init__(self) -> None:
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._project_locks: dict[str, asyncio.Lock] = {}
+        self._startup_job: IngestJob | None = None
+        self._startup_pending = True
+
+    @asynccontextmanager
+    async def project_lock(self, project_name: str) -> AsyncIterator[None]:
+        lock = self._project_locks.setdefault(project_name, asyncio.Lock())
+        async with lock:
+            yield
+
+    def get(self, job_id: str) -> IngestJob | None:
+        return self._jobs.get(job_id)
+
+    def submit(
+        self,
+        kind: JobKind,
+        project_name: str | None,
+        documents_total: int,
+        work: JobWork,
+    ) -> IngestJob:
+        job = IngestJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            project_name=project_name,
+            documents_total=documents_total,
+        )
+        self._jobs[job.id] = job
+        self._prune()
+
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def submit_ingest(
+        self,
+        project_name: str,
+        texts: list[str],
+        metadatas: list[dict[str, Any]] | None = None,
+        source_key: str = API_SOURCE,
+    ) -> IngestJob:
+        async def work(job: IngestJob) -> None:
+            async with self.project_lock(project_name):
+                progress = await ingest_texts(
+                    project_name, texts, metadatas, job.tracker(), source_key
+                )
+            job.documents_done = len(texts)
+            if progress.unchanged:
+                job.unchanged_projects.append(project_name)
+            else:
+                self.submit_cleanup(project_name)
+                await maybe_rebuild_after_ingest(project_name)
+
+        return self.submit("ingest", project_name, len(texts), work)
+
+    def submit_cleanup(self, project_name: str) -> IngestJob:
+        # Old versions are no longer live, so deleting them is off the ingest
+        # path; a failed cleanup is retried by the project's next one
+        async def work(job: IngestJob) -> None:
+            await delete_old_versions(project_name)
+            job.documents_done = 1
+
+        return self.submit("cleanup", project_name, 1, work)
+
+    def submit_startup_ingest(self) -> IngestJob:
+        paths = project_files()
+
+        async def work(job: IngestJob) -> None:
+            await check_storage_profile()
+            # A file only replaces its own chunks, so /v1/ingest content
+            # survives restarts
+            for path in paths:
+                project_name, data = load_project_file(path)
+                async with self.project_lock(project_name):
+                    progress = await ingest_project_document(
+                        project_name,
+                        data,
+                        {"source_file": path.name},
+                        job.tracker(),
+                        file_source(path),
+                    )
+                if progress.unchanged:
+                    job.unchanged_projects.append(project_name)
+                else:
+                    self.submit_cleanup(project_name)
+                job.documents_done += 1
+
+            if settings.RAG_INDEX_AUTO_CREATE:
+                await ensure_all_indexes()
+            if settings.RAG_RETRIEVAL_BACKEND == "memory":
+                await memory_index.refresh(force=True)
+
+        self._startup_job = self.submit("auto_ingest", None, len(paths), work)
+        self._startup_pending = False
+        return self._startup_job
+
+    def skip_startup_ingest(self) -> None:
+        # Serve in degraded mode rather than never becoming ready
+        self._startup_pending = False
+
+    @property
+    def ready(self) -> bool:
+        if self._startup_pending:
+            return False
+        return self._startup_job is None or self._startup_job.done
+
+    @property
+    def startup_job(self) -> IngestJob | None:
+        return self._startup_job
+
+    async def _run(self, job: IngestJob, work: JobWork) -> None:
+        job.status = "running"
+        job.started_at = _now()
+        logger.info("[job] %s %s started (project=%s)", job.kind, job.id, job.project_name)
+        try:
+            await work(job)
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "cancelled"
+            raise
+        except Exception as exc:
+            job.status = "failed"
+            job.error = str(exc) or exc.__class__.__name__
+            logger.exception("[job] %s %s failed", job.kind, job.id)
+        else:
+            job.status = "succeeded"
+        finally:
+            job.finished_at = _now()
+
+        logger.info(
+            "[job] %s %s %s: %d chunks written, %d carried over",
+            job.kind,
+            job.id,
+            job.status,
+            job.chunks_written,
+            job.chunks_carried,
+        )
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        excess = len(self._jobs) - settings.JOBS_HISTORY_LIMIT
+        for job_id in finished[: max(excess, 0)]:
+            del self._jobs[job_id]
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        by_status: dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "ready": self.ready,
+            "tracked": len(self._jobs),
+            "running": len(self._tasks),
+            "by_status": by_status,
+        }
+
+
+job_manager = JobManager()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any
+
+from psycopg.types.json import Jsonb
+
+from app.chains.prompts import PROMPT_VERSION
+from app.config import settings
+from app.core.cache import ByteLRUCache
+from app.models.database import async_execute_query, async_fetch_one
+from app.models.schemas import AnalyzeResponse, MessageInput
+
+logger = logging.getLogger(__name__)
+
+_PURGE_INTERVAL_SECONDS = 3_600
+
+_SQL_SELECT = """
+    SELECT result
+    FROM   analysis_cache
+    WHERE  cache_key = %s
+      AND  expires_at > NOW()
+"""
+
+_SQL_UPSERT = """
+    INSERT INTO analysis_cache (cache_key, result, model, prompt_version, expires_at)
+    VALUES (%s, %s, %s, %s, NOW() + make_interval(secs => %s))
+    ON CONFLICT (cache_key) DO UPDATE
+        SET result = EXCLUDED.result,
+            expires_at = EXCLUDED.expires_at
+"""
+
+_SQL_PURGE = "DELETE FROM analysis_cache WHERE expires_at <= NOW()"
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def build_cache_key(messages: list[MessageInput], project_context: str) -> str:
+    payload = {
+        "messages": [
+            [m.sender_type, _normalize_text(m.sender_name), _normalize_text(m.content)]
+            for m in messages
+        ],
+        "context": project_context,
+        "model": settings.OPENAI_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "mode": settings.ANALYSIS_MODE,
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class AnalysisResultCache:
+    def __init__(self) -> None:
+        self._memory: ByteLRUCache[AnalyzeResponse] = ByteLRUCache(
+            max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+            ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+        )
+        self.persistent_hits = 0
+        self.persistent_errors = 0
+        self.writes = 0
+        self._last_purge = 0.0
+
+    async def get(self, key: str) -> AnalyzeResponse | None:
+        if not settings.ANALYSIS_CACHE_ENABLED:
+            return None
+
+        result = self._memory.get(key)
+        if result is not None or not settings.ANALYSIS_CACHE_PERSIST:
+            return result
+
+        try:
+            row = await async_fetch_one(_SQL_SELECT, (key,), prepare=True)
+        except Exception:
+            self.persistent_errors += 1
+            logger.warning("Analysis cache: persistent lookup failed.", exc_info=True)
+            return None
+
+        if row is None:
+            return None
+
+        result = AnalyzeResponse.model_validate(row["result"])
+        self.persistent_hits += 1
+        self._memory.set(key, result, size=len(result.model_dump_json()))
+        return result
+
+    async def set(self, key: str, result: AnalyzeResponse) -> None:
+        if not settings.ANALYSIS_CACHE_ENABLED:
+            return
+
+        self._memory.set(key, result, size=len(result.model_dump_json()))
+        self.writes += 1
+
+        if not settings.ANALYSIS_CACHE_PERSIST:
+            return
+
+        try:
+            await async_execute_query(
+                _SQL_UPSERT,
+                (
+                    key,
+                    Jsonb(result.model_dump()),
+                    settings.OPENAI_MODEL,
+                    PROMPT_VERSION,
+                    settings.ANALYSIS_CACHE_TTL_SECONDS,
+                ),
+                prepare=True,
+            )
+            await self._maybe_purge()
+        except Exception:
+            self.persistent_errors += 1
+            logger.warning("Analysis cache: persistent write failed.", exc_info=True)
+
+    async def _maybe_purge(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        await async_execute_query(_SQL_PURGE)
+
+    def stats(self) -> dict[str, Any]:
+        memory = self._memory.stats()
+        # Every lookup first goes through the memory tier
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + self.persistent_hits
+        return {
+            "enabled": settings.ANALYSIS_CACHE_ENABLED,
+            "persistent": settings.ANALYSIS_CACHE_PERSIST,
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_hits": memory["hits"],
+            "persistent_hits": self.persistent_hits,
+            "persistent_errors": self.persistent_errors,
+            "writes": self.writes,
+            "memory": memory,
+        }
+
+
+analysis_cache = AnalysisResultCache()
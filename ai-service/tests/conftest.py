@@ -0,0 +1,5 @@
+import os
+
+# Settings are read at import time; the tests never reach either service
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
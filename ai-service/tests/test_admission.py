@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "ANALYZE_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(settings, "ANALYZE_MAX_QUEUE", 2)
+    monkeypatch.setattr(settings, "ANALYZE_MAX_QUEUE_WAIT_SECONDS", 0.05)
+
+
+async def _hold(controller, release):
+    async with controller.slot():
+        await release.wait()
+
+
+async def _try(controller):
+    try:
+        async with controller.slot():
+            return "ok"
+    except AdmissionRejected as exc:
+        return exc.reason
+
+
+def test_full_queue_is_rejected_at_once():
+    async def scenario():
+        controller = AdmissionController()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(_try(controller)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        assert await _try(controller) == "queue_full"
+        release.set()
+        await holder
+        assert await asyncio.gather(*queued) == ["ok", "ok"]
+
+    asyncio.run(scenario())
+
+
+def test_expired_waiters_free_the_queue():
+    async def scenario():
+        controller = AdmissionController()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+
+        expired = await asyncio.gather(*(_try(controller) for _ in range(2)))
+        assert expired == ["expired", "expired"]
+        assert controller.stats()["queued"] == 0
+
+        # Queue space is back while the slot is still held
+        waiting = asyncio.create_task(_try(controller))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 1
+        release.set()
+        await holder
+        assert await waiting == "ok"
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_counts_live_waiters_only():
+    async def scenario():
+        controller = AdmissionController()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        idle = controller.retry_after()
+
+        await asyncio.gather(*(_try(controller) for _ in range(2)))
+        assert controller.retry_after() == idle
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        controller = AdmissionController()
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_try(controller))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert controller.stats()["queued"] == 0
+        release.set()
+        await holder
+        assert controller.stats()["in_flight"] == 0
+        assert await _try(controller) == "ok"
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+import asyncio
+
+from app.models.schemas import AnalyzeResponse, MessageInput
+from app.services import analyzer
+from app.services.compactor import format_message, messages_digest
+
+
+def test_cache_hit_advances_the_analysis_state(monkeypatch):
+    cached = AnalyzeResponse(summary="Interesado en Torre Alta", tags=[], priority="high")
+    saved = []
+
+    async def build_rag_context(*args, **kwargs):
+        return ""
+
+    async def cache_get(key):
+        return cached
+
+    async def save(*args):
+        saved.append(args)
+
+    monkeypatch.setattr(analyzer, "_build_rag_context", build_rag_context)
+    monkeypatch.setattr(analyzer.analysis_cache, "get", cache_get)
+    monkeypatch.setattr(analyzer.analysis_state, "save", save)
+
+    messages = [
+        MessageInput(sender_type="lead", sender_name="Ana", content="Hola"),
+        MessageInput(sender_type="agent", sender_name="Luis", content="Buenas tardes"),
+    ]
+    result = asyncio.run(
+        analyzer.analyze_conversation("conv-1", messages, incremental=True)
+    )
+
+    assert result == cached
+    (conversation_id, state, count, digest, _started_at, watermark), = saved
+    assert (conversation_id, state, count, watermark) == ("conv-1", cached, 2, None)
+    assert digest == messages_digest([format_message(m) for m in messages])
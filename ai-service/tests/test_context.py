@@ -0,0 +1,18 @@
+from app.rag.context import SEPARATOR, build_context
+from app.rag.retriever import RetrievedChunk
+
+
+def _chunk(project_name, text, score):
+    return RetrievedChunk(project_name=project_name, text=text, score=score)
+
+
+def test_max_chunks_caps_total_across_projects():
+    chunks = [
+        _chunk(project, f"{project} unidad {i} con vista al mar numero {i}", 1.0 - i / 10)
+        for project in ("Torre Alvarez", "Parque Norte", "Mirador Sur")
+        for i in range(3)
+    ]
+
+    context = build_context(chunks, max_per_project=2, max_chunks=2)
+
+    assert len(context.split(SEPARATOR)) == 2
@@ -0,0 +1,38 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.core.embedder import EmbeddingService
+
+
+def test_cancelled_batch_releases_waiting_callers(monkeypatch):
+    service = EmbeddingService()
+    started = asyncio.Event()
+    calls = 0
+
+    async def resolve(texts):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            started.set()
+            await asyncio.Event().wait()
+        return {t: np.ones(4, dtype=np.float32) for t in texts}, {}
+
+    monkeypatch.setattr(service, "_resolve", resolve)
+
+    async def scenario():
+        waiting = asyncio.create_task(service.embed_query("hola"))
+        await started.wait()
+        for task in list(service._background):
+            task.cancel()
+
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(waiting, timeout=1)
+        assert not service._in_flight
+
+        # The same text is embedded afresh instead of hanging on the old future
+        vector = await asyncio.wait_for(service.embed_query("hola"), timeout=1)
+        assert vector.shape == (4,)
+
+    asyncio.run(scenario())
@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import itertools
+
+import numpy as np
+import pytest
+
+from app.rag import pipeline
+
+
+class FakeStore:
+    # Just enough of project_embeddings / project_versions for the pipeline
+    def __init__(self):
+        self.rows: list[dict] = []
+        self.live_version: dict[str, int] = {}
+        self.versions = itertools.count(1)
+
+    def live_rows(self, project, source=None):
+        return [
+            r for r in self.rows
+            if r["project_name"] == project and r["live"]
+            and (source is None or r["source"] == source)
+        ]
+
+    def execute(self, sql, params):
+        if sql is pipeline._SQL_REGISTER_PROJECT:
+            self.live_version.setdefault(params[0], 0)
+        elif sql in (pipeline._SQL_LIVE_VERSION, pipeline._SQL_LOCK_VERSION_ROW):
+            return [{"live_version": self.live_version[params[0]]}], 0
+        elif sql is pipeline._SQL_NEXT_VERSION:
+            return [{"version": next(self.versions)}], 0
+        elif sql is pipeline._SQL_LIVE_CHUNKS:
+            project, version, source = params
+            return [
+                {"chunk_hash": r["chunk_hash"], "metadata": r["metadata"]}
+                for r in self.rows
+                if (r["project_name"], r["version"], r["source"]) == (project, version, source)
+            ], 0
+        elif sql is pipeline._SQL_CARRY:
+            previous = {
+                r["chunk_hash"]: r for r in self.rows
+                if r["project_name"] == params["project"]
+                and r["version"] == params["live"]
+                and r["source"] == params["source"]
+            }
+            carried = [
+                {**previous[h], "version": params["version"], "metadata": m.obj, "live": False}
+                for h, m in zip(params["hashes"], params["metadatas"])
+                if h in previous
+            ]
+            self.rows += carried
+            return [], len(carried)
+        elif sql is pipeline._SQL_CARRY_OTHER_SOURCES:
+            others = [
+                {**r, "version": params["version"], "live": False}
+                for r in self.live_rows(params["project"])
+                if r["source"] != params["source"]
+            ]
+            self.rows += others
+            return [], len(others)
+        elif sql is pipeline._SQL_PUBLISH:
+            for r in self.rows:
+                if r["project_name"] == params["project"]:
+                    r["live"] = r["version"] == params["version"]
+        elif sql is pipeline._SQL_SWAP:
+            self.live_version[params[1]] = params[0]
+        elif sql is pipeline._SQL_DELETE_STAGED:
+            self.rows = [
+                r for r in self.rows
+                if r["live"] or (r["project_name"], r["version"]) != tuple(params)
+            ]
+        else:
+            raise AssertionError(f"unexpected statement: {sql}")
+        return [], 0
+
+
+class FakeCursor:
+    def __init__(self, store):
+        self.store = store
+        self.result = []
+        self.rowcount = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        self.result, self.rowcount = self.store.execute(sql, params)
+
+    async def fetchone(self):
+        return self.result[0]
+
+    async def fetchall(self):
+        return self.result
+
+    @contextlib.asynccontextmanager
+    async def copy(self, sql):
+        store = self.store
+        columns = ("project_name", "version", "source", "chunk_hash", "chunk_text",
+                   "embedding", "metadata")
+
+        class Copy:
+            def set_types(self, types):
+                pass
+
+            async def write_row(self, row):
+                record = dict(zip(columns, row))
+                record["metadata"] = record["metadata"].obj
+                store.rows.append({**record, "live": False})
+
+        yield Copy()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+
+    @contextlib.asynccontextmanager
+    async def connection():
+        yield type("Conn", (), {"cursor": lambda self: FakeCursor(store)})()
+
+    async def execute_query(sql, params=None):
+        store.execute(sql, params)
+
+    async def embed_documents(texts):
+        return [np.ones(4, dtype=np.float32) for _ in texts]
+
+    monkeypatch.setattr(pipeline, "get_async_connection", connection)
+    monkeypatch.setattr(pipeline, "async_execute_query", execute_query)
+    monkeypatch.setattr(pipeline.embedding_service, "embed_documents", embed_documents)
+    return store
+
+
+def _ingest(source_key, texts):
+    chunks = [(text, {}) for text in texts]
+    return asyncio.run(
+        pipeline.run_ingest_pipeline(
+            "Torre Alta", source_key, pipeline.prechunked(chunks), 1
+        )
+    )
+
+
+def _live_texts(store, source=None):
+    return sorted(r["chunk_text"] for r in store.live_rows("Torre Alta", source))
+
+
+def test_api_ingest_keeps_file_chunks(store):
+    _ingest("file:torre.json", ["amenidades", "precios"])
+    _ingest("api", ["promocion de temporada"])
+
+    assert _live_texts(store) == ["amenidades", "precios", "promocion de temporada"]
+
+
+def test_file_resync_keeps_api_chunks(store):
+    _ingest("file:torre.json", ["amenidades", "precios"])
+    _ingest("api", ["promocion de temporada"])
+
+    # A restart re-syncs the unchanged file: nothing is published
+    progress = _ingest("file:torre.json", ["amenidades", "precios"])
+    assert progress.unchanged
+    assert _live_texts(store, "api") == ["promocion de temporada"]
+
+    # An edited file replaces only its own chunks
+    progress = _ingest("file:torre.json", ["amenidades", "precios nuevos"])
+    assert not progress.unchanged
+    assert _live_texts(store, "file:torre.json") == ["amenidades", "precios nuevos"]
+    assert _live_texts(store, "api") == ["promocion de temporada"]
+
+
+def test_reingesting_a_source_replaces_its_chunks(store):
+    _ingest("api", ["promocion de temporada"])
+    _ingest("api", ["promocion de invierno"])
+
+    assert _live_texts(store) == ["promocion de invierno"]
@@ -0,0 +1,41 @@
+import asyncio
+
+from app.config import settings
+from app.rag import retrieval_cache as rc
+
+
+def test_key_follows_persisted_live_versions(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_BACKEND", "postgres")
+    live = {"Torre Alvarez": 4, "Parque Norte": 2}
+
+    async def fetch_all(query, params=None, **kwargs):
+        return [
+            {"project_name": name, "live_version": live[name]}
+            for name in params[0]
+            if name in live
+        ]
+
+    async def fetch_one(query, params=None, **kwargs):
+        return {"projects": len(live), "total": sum(live.values())}
+
+    monkeypatch.setattr(rc, "async_fetch_all", fetch_all)
+    monkeypatch.setattr(rc, "async_fetch_one", fetch_one)
+    cache = rc.RetrievalCache()
+
+    async def scenario():
+        scoped = await cache.key("piscina", 4, ["Torre Alvarez"])
+        everything = await cache.key("piscina", 4, None)
+        cache.set(scoped, [("Torre Alvarez", "piscina techada", 0.9)])
+        cache.set(everything, [(None, "piscina techada", 0.9)])
+        other = await cache.key("piscina", 4, ["Parque Norte"])
+        cache.set(other, [("Parque Norte", "alberca", 0.8)])
+
+        # Another replica publishes a new version of the project
+        live["Torre Alvarez"] = 9
+        assert cache.get(await cache.key("piscina", 4, ["Torre Alvarez"])) is None
+        assert cache.get(await cache.key("piscina", 4, None)) is None
+        # Other projects keep their entries
+        assert cache.get(await cache.key("piscina", 4, ["Parque Norte"])) is not None
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.rag import retriever
+
+
+@pytest.fixture
+def memory_hybrid(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_BACKEND", "memory")
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(settings, "RAG_LEXICAL_FAST_PATH", False)
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_CACHE_ENABLED", False)
+
+    async def lexical_search(query, top_k, project_names):
+        return [(None, "Torre Alvarez: piscina", 0.2)]
+
+    async def memory_search(query_vector, top_k, project_names):
+        # The memory index tags every hit with its real project
+        return [
+            ("Torre Alvarez", "Torre Alvarez: piscina", 0.9),
+            ("Parque Norte", "Parque Norte: 3 habitaciones", 0.8),
+        ]
+
+    async def embed_query(query):
+        return np.zeros(8, dtype=np.float32)
+
+    monkeypatch.setattr(retriever, "lexical_search", lexical_search)
+    monkeypatch.setattr(retriever.memory_index, "search", memory_search)
+    monkeypatch.setattr(retriever.embedding_service, "embed_query", embed_query)
+
+
+def test_global_hybrid_query_on_memory_backend(memory_hybrid):
+    chunks = asyncio.run(
+        retriever.async_retrieve_scored_chunks("tiene piscina?", top_k=2)
+    )
+
+    assert {c.project_name for c in chunks} == {None}
+    assert [c.text for c in chunks] == [
+        "Torre Alvarez: piscina",
+        "Parque Norte: 3 habitaciones",
+    ]
@@ -0,0 +1,202 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import BadRequestError, RateLimitError
+
+from app.config import settings
+from app.core import scheduler
+
+
+def _error(cls, status, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return cls("error", response=response, body=None)
+
+
+class FlakyChain:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", 0)
+    monkeypatch.setattr(settings, "LLM_TPM_LIMIT", 0)
+    sched = scheduler.LLMScheduler()
+    monkeypatch.setattr(scheduler, "llm_scheduler", sched)
+    return sched
+
+
+def test_rate_limit_is_retried_through_a_new_slot(fresh_scheduler, monkeypatch):
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(scheduler.asyncio, "sleep", sleep)
+    chain = FlakyChain([_error(RateLimitError, 429, {"retry-after": "2"})])
+
+    assert asyncio.run(scheduler.run_chain(chain, {"q": "hola"})) == "ok"
+    assert chain.calls == 2
+    assert delays == [2.0]
+    assert fresh_scheduler.rate_limited == 1
+    assert fresh_scheduler.retries == 1
+    assert sum(fresh_scheduler.granted.values()) == 2
+
+
+def test_non_retryable_errors_raise_at_once(fresh_scheduler):
+    chain = FlakyChain([_error(BadRequestError, 400)])
+
+    with pytest.raises(BadRequestError):
+        asyncio.run(scheduler.run_chain(chain, {"q": "hola"}))
+    assert chain.calls == 1
+
+
+def test_retries_are_bounded(fresh_scheduler, monkeypatch):
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr(scheduler.asyncio, "sleep", sleep)
+    chain = FlakyChain([_error(RateLimitError, 429) for _ in range(5)])
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(scheduler.run_chain(chain, {"q": "hola"}))
+    assert chain.calls == 3
+
+
+async def _use_slot(sched, name, order, tokens=1, release=None):
+    async with sched.slot(tokens):
+        order.append(name)
+        if release is not None:
+            await release.wait()
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler.time, "monotonic", clock)
+    bucket = scheduler.TokenBucket(60)
+
+    bucket.consume(60)
+    assert bucket.seconds_until(1) == pytest.approx(1.0)
+
+    clock.now += 30
+    assert bucket.level == pytest.approx(30)
+    assert bucket.seconds_until(30) == 0.0
+
+    # Requests above the whole budget wait for a full bucket, not forever
+    assert bucket.seconds_until(600) == pytest.approx(30)
+    clock.now += 600
+    assert bucket.level == pytest.approx(60)
+
+
+def test_disabled_token_bucket_never_waits():
+    bucket = scheduler.TokenBucket(0)
+    bucket.consume(1_000)
+    bucket.drain()
+
+    assert bucket.seconds_until(1_000) == 0.0
+
+
+def test_interactive_calls_are_served_before_batch(fresh_scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 1)
+    order = []
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_use_slot(fresh_scheduler, "holder", order, release=release))
+        await asyncio.sleep(0)
+
+        tasks = []
+        with scheduler.llm_priority("batch"):
+            tasks.append(asyncio.create_task(_use_slot(fresh_scheduler, "batch-1", order)))
+            tasks.append(asyncio.create_task(_use_slot(fresh_scheduler, "batch-2", order)))
+        tasks.append(asyncio.create_task(_use_slot(fresh_scheduler, "interactive", order)))
+        await asyncio.sleep(0)
+        assert fresh_scheduler.stats()["queue_depth"] == 3
+
+        release.set()
+        await asyncio.wait_for(asyncio.gather(holder, *tasks), timeout=1)
+
+    asyncio.run(scenario())
+    assert order == ["holder", "interactive", "batch-1", "batch-2"]
+    assert fresh_scheduler.granted == {"interactive": 2, "batch": 2}
+    assert fresh_scheduler.max_queue_depth == 3
+
+
+def test_slot_waits_for_the_token_budget(fresh_scheduler):
+    # 6,000 tokens a minute refill 100 a second
+    fresh_scheduler._tpm = scheduler.TokenBucket(6_000)
+    fresh_scheduler._tpm.consume(6_000)
+    order = []
+
+    async def scenario():
+        task = asyncio.create_task(_use_slot(fresh_scheduler, "call", order, tokens=5))
+        await asyncio.sleep(0)
+        assert order == []
+        assert fresh_scheduler.stats()["queue_depth"] == 1
+
+        await asyncio.wait_for(task, timeout=1)
+
+    asyncio.run(scenario())
+    assert order == ["call"]
+    assert fresh_scheduler.stats()["in_flight"] == 0
+
+
+def test_rate_limited_retry_waits_for_the_drained_budget(fresh_scheduler):
+    fresh_scheduler._rpm = scheduler.TokenBucket(6_000)
+    chain = FlakyChain([_error(RateLimitError, 429, {"retry-after-ms": "1"})])
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await asyncio.wait_for(scheduler.run_chain(chain, {"q": "hola"}), timeout=1)
+        return result, loop.time() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == "ok"
+    # The 429 emptied the request bucket: one request refills in 10 ms,
+    # well past the 1 ms retry-after
+    assert elapsed >= 0.009
+    assert fresh_scheduler.rate_limited == 1
+    assert fresh_scheduler.retries == 1
+    assert fresh_scheduler.granted["interactive"] == 2
+
+
+def test_cancelled_waiter_frees_its_place(fresh_scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 1)
+    order = []
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_use_slot(fresh_scheduler, "holder", order, release=release))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(_use_slot(fresh_scheduler, "cancelled", order))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert fresh_scheduler.stats()["queue_depth"] == 0
+
+        release.set()
+        await holder
+        await asyncio.wait_for(_use_slot(fresh_scheduler, "next", order), timeout=1)
+
+    asyncio.run(scenario())
+    assert order == ["holder", "next"]
+    assert fresh_scheduler.stats()["in_flight"] == 0
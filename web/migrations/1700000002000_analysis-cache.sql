@@ -0,0 +1,18 @@
+-- Up Migration
+-- EstateFlow AI — Persistent tier of the ai-service analysis result cache
+-- Fully idempotent — safe to run on existing databases
+
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    cache_key CHAR(64) PRIMARY KEY,
+    result JSONB NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    prompt_version VARCHAR(32) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires ON analysis_cache (expires_at);
+
+-- Down Migration
+
+DROP TABLE IF EXISTS analysis_cache;
@@ -0,0 +1,18 @@
+-- Up Migration
+-- EstateFlow AI — Persistent embedding store
+-- Embeddings keyed by the SHA-256 of the source text, the embedding model and
+-- the output dimensions, so restarts, new replicas and re-ingests reuse them.
+-- Fully idempotent — safe to run on existing databases
+
+CREATE TABLE IF NOT EXISTS embedding_store (
+    text_hash BYTEA NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    dimensions INTEGER NOT NULL,
+    embedding vector NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (text_hash, model, dimensions)
+);
+
+-- Down Migration
+
+DROP TABLE IF EXISTS embedding_store;
@@ -0,0 +1,30 @@
+-- Up Migration
+-- EstateFlow AI — Versioned project snapshots
+-- Each ingest writes a new version of a project's chunks and switches
+-- project_versions.live_version in the same transaction; retrieval only reads
+-- the live version. chunk_hash (SHA-256 of chunk_text) lets unchanged chunks
+-- be carried over without re-embedding.
+-- Fully idempotent — safe to run on existing databases
+
+CREATE TABLE IF NOT EXISTS project_versions (
+    project_name VARCHAR(255) PRIMARY KEY,
+    live_version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE project_embeddings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE project_embeddings ADD COLUMN IF NOT EXISTS chunk_hash BYTEA;
+
+UPDATE project_embeddings
+SET chunk_hash = sha256(convert_to(chunk_text, 'UTF8'))
+WHERE chunk_hash IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_project_version_hash
+    ON project_embeddings (project_name, version, chunk_hash);
+
+-- Down Migration
+
+DROP INDEX IF EXISTS idx_embeddings_project_version_hash;
+ALTER TABLE project_embeddings DROP COLUMN IF EXISTS chunk_hash;
+ALTER TABLE project_embeddings DROP COLUMN IF EXISTS version;
+DROP TABLE IF EXISTS project_versions;
@@ -0,0 +1,18 @@
+-- Up Migration
+-- EstateFlow AI — Full-text search over project chunks
+-- chunk_tsv is maintained by Postgres from chunk_text with the Spanish
+-- configuration (stemming, stop words) so exact terms such as "Infonavit",
+-- "enganche" or unit codes can be matched lexically next to vector search.
+-- Fully idempotent — safe to run on existing databases
+
+ALTER TABLE project_embeddings
+    ADD COLUMN IF NOT EXISTS chunk_tsv TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('spanish', chunk_text)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_chunk_tsv
+    ON project_embeddings USING GIN (chunk_tsv);
+
+-- Down Migration
+
+DROP INDEX IF EXISTS idx_embeddings_chunk_tsv;
+ALTER TABLE project_embeddings DROP COLUMN IF EXISTS chunk_tsv;
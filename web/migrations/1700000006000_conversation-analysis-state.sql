@@ -0,0 +1,22 @@
+-- Up Migration
+-- EstateFlow AI — Rolling analysis state per conversation
+-- The ai-service keeps the last analysis of each conversation together with
+-- a watermark (how many messages it covered) and a digest of those messages,
+-- so a later analysis only has to process the messages past the watermark.
+-- Fully idempotent — safe to run on existing databases
+
+CREATE TABLE IF NOT EXISTS conversation_analysis_state (
+    conversation_id VARCHAR(255) PRIMARY KEY,
+    summary TEXT NOT NULL,
+    tags TEXT[] NOT NULL DEFAULT '{}',
+    priority VARCHAR(10) NOT NULL,
+    message_count INTEGER NOT NULL,
+    messages_digest CHAR(64) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    prompt_version VARCHAR(32) NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Down Migration
+
+DROP TABLE IF EXISTS conversation_analysis_state;
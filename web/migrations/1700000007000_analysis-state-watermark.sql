@@ -0,0 +1,14 @@
+-- Up Migration
+-- EstateFlow AI — Positional watermark for conversation_analysis_state
+-- The id and created_at of the last analyzed message let the ai-service read
+-- only the messages after it, through idx_messages_created, when it loads a
+-- conversation from the database itself.
+-- Fully idempotent — safe to run on existing databases
+
+ALTER TABLE conversation_analysis_state ADD COLUMN IF NOT EXISTS last_message_id UUID;
+ALTER TABLE conversation_analysis_state ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMPTZ;
+
+-- Down Migration
+
+ALTER TABLE conversation_analysis_state DROP COLUMN IF EXISTS last_message_at;
+ALTER TABLE conversation_analysis_state DROP COLUMN IF EXISTS last_message_id;
@@ -0,0 +1,20 @@
+-- Up Migration
+-- EstateFlow AI — Live flag on project chunks
+-- Exactly the rows of each project's live version carry live = TRUE; the
+-- version swap flips the flags in the same transaction as
+-- project_versions.live_version. The ANN indexes are partial on live, so
+-- older or staged versions never take up nearest-neighbour candidates.
+-- Fully idempotent — safe to run on existing databases
+
+ALTER TABLE project_embeddings ADD COLUMN IF NOT EXISTS live BOOLEAN NOT NULL DEFAULT FALSE;
+
+UPDATE project_embeddings e
+SET    live = TRUE
+WHERE  NOT e.live
+  AND  e.version = COALESCE(
+           (SELECT v.live_version FROM project_versions v
+            WHERE  v.project_name = e.project_name), 0);
+
+-- Down Migration
+
+ALTER TABLE project_embeddings DROP COLUMN IF EXISTS live;
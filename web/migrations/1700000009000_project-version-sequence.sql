@@ -0,0 +1,20 @@
+-- Up Migration
+-- EstateFlow AI — Version numbers for project snapshots
+-- An ingest reserves its version up front and stages rows outside any
+-- transaction held on project_versions, so versions come from a sequence:
+-- unique across concurrent ingests and replicas, and always above every
+-- version already stored.
+-- Fully idempotent — safe to run on existing databases
+
+CREATE SEQUENCE IF NOT EXISTS project_version_seq;
+
+SELECT setval('project_version_seq', GREATEST(
+    (SELECT last_value FROM project_version_seq),
+    COALESCE((SELECT MAX(version) FROM project_embeddings), 0),
+    COALESCE((SELECT MAX(live_version) FROM project_versions), 0),
+    1
+));
+
+-- Down Migration
+
+DROP SEQUENCE IF EXISTS project_version_seq;
@@ -0,0 +1,18 @@
+-- Up Migration
+-- EstateFlow AI — Source of each project chunk
+-- An ingest replaces only the chunks of its own source ('file:<name>' for
+-- the bundled documents, 'api' or the request's source for /v1/ingest) and
+-- carries the project's other sources into the new version unchanged.
+-- Fully idempotent — safe to run on existing databases
+
+ALTER TABLE project_embeddings
+    ADD COLUMN IF NOT EXISTS source VARCHAR(255) NOT NULL DEFAULT 'api';
+
+UPDATE project_embeddings
+SET    source = 'file:' || (metadata->>'source_file')
+WHERE  source = 'api'
+  AND  metadata ? 'source_file';
+
+-- Down Migration
+
+ALTER TABLE project_embeddings DROP COLUMN IF EXISTS source;
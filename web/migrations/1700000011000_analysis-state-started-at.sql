@@ -0,0 +1,18 @@
+-- Up Migration
+-- EstateFlow AI — Write order of conversation_analysis_state
+-- analysis_started_at is when the stored analysis started; an analysis that
+-- started earlier but finishes later does not replace it. Existing rows take
+-- their updated_at.
+-- Fully idempotent — safe to run on existing databases
+
+ALTER TABLE conversation_analysis_state ADD COLUMN IF NOT EXISTS analysis_started_at TIMESTAMPTZ;
+
+UPDATE conversation_analysis_state
+SET    analysis_started_at = updated_at
+WHERE  analysis_started_at IS NULL;
+
+ALTER TABLE conversation_analysis_state ALTER COLUMN analysis_started_at SET NOT NULL;
+
+-- Down Migration
+
+ALTER TABLE conversation_analysis_state DROP COLUMN IF EXISTS analysis_started_at;
@@ -4,6 +4,9 @@ import { broadcastToConversation } from '@/backend/server/socket/io';
 
 const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://localhost:8000';
 const AI_SERVICE_API_KEY = process.env.AI_SERVICE_API_KEY || '';
+// The ai-service reads the messages from the shared database itself; set to
+// 'false' to post the full history to /v1/analyze instead
+const AI_ANALYZE_BY_ID = process.env.AI_ANALYZE_BY_ID !== 'false';
 
 const MAX_RETRIES = 3;
 const RETRY_BASE_MS = 2_000;
@@ -16,6 +19,16 @@ function isRetryable(status: number): boolean {
   return status >= 500 || status === 408 || status === 429;
 }
 
+// Delay requested by an overloaded ai-service, capped so a bad header
+// cannot stall the retry loop
+const MAX_RETRY_AFTER_MS = 60_000;
+
+function retryAfterMs(response: Response): number | null {
+  const seconds = Number(response.headers.get('Retry-After'));
+  if (!Number.isFinite(seconds) || seconds <= 0) return null;
+  return Math.min(seconds * 1000, MAX_RETRY_AFTER_MS);
+}
+
 interface MessageForAnalysis {
   sender_type: 'agent' | 'lead';
   sender_name: string;
@@ -69,37 +82,55 @@ export function debouncedTriggerAIAnalysis(conversationId: string): void {
   }
 }
 
-async function triggerAIAnalysis(conversationId: string): Promise<void> {
-  try {
-    const messages = await db.queryMany<MessageForAnalysis>(
-      SQL_ALL_MESSAGES_WITH_SENDERS,
-      [conversationId],
-    );
+async function buildAnalysisRequest(
+  conversationId: string,
+): Promise<{ url: string; body: string } | null> {
+  if (AI_ANALYZE_BY_ID) {
+    return {
+      url: `${AI_SERVICE_URL}/v1/conversations/${conversationId}/analyze`,
+      body: '{}',
+    };
+  }
+
+  const messages = await db.queryMany<MessageForAnalysis>(
+    SQL_ALL_MESSAGES_WITH_SENDERS,
+    [conversationId],
+  );
 
-    if (messages.length === 0) return;
+  if (messages.length === 0) return null;
 
-    const payload = JSON.stringify({
+  return {
+    url: `${AI_SERVICE_URL}/v1/analyze`,
+    body: JSON.stringify({
       conversation_id: conversationId,
       messages: messages.map((m) => ({
         sender_type: m.sender_type,
         sender_name: m.sender_name,
         content: m.content,
       })),
-    });
+    }),
+  };
+}
+
+async function triggerAIAnalysis(conversationId: string): Promise<void> {
+  try {
+    const request = await buildAnalysisRequest(conversationId);
+    if (!request) return;
 
     let lastError: Error | null = null;
 
     for (let attempt = 0; attempt < MAX_RETRIES; attempt++) {
+      let requestedDelay: number | null = null;
       try {
         const headers: Record<string, string> = { 'Content-Type': 'application/json' };
         if (AI_SERVICE_API_KEY) {
           headers['x-api-key'] = AI_SERVICE_API_KEY;
         }
 
-        const response = await fetch(`${AI_SERVICE_URL}/v1/analyze`, {
+        const response = await fetch(request.url, {
           method: 'POST',
           headers,
-          body: payload,
+          body: request.body,
         });
 
         if (response.ok) {
@@ -121,18 +152,29 @@ async function triggerAIAnalysis(conversationId: string): Promise<void> {
           return;
         }
 
+        // Conversation without messages
+        if (response.status === 404) return;
+
+        // Superseded by a newer analysis of the same conversation, which
+        // will deliver the update
+        if (response.status === 409) return;
+
         if (!isRetryable(response.status)) {
           console.error(`[AI Analysis] Non-retryable error for ${conversationId}: ${response.status}`);
           return;
         }
 
+        requestedDelay = retryAfterMs(response);
         lastError = new Error(`HTTP ${response.status}`);
       } catch (err) {
         lastError = err instanceof Error ? err : new Error(String(err));
       }
 
       if (attempt < MAX_RETRIES - 1) {
-        const backoff = RETRY_BASE_MS * Math.pow(2, attempt);
+        // Jitter spreads retries from callers rejected at the same moment
+        const backoff = requestedDelay !== null
+          ? Math.round(requestedDelay + Math.random() * RETRY_BASE_MS)
+          : RETRY_BASE_MS * Math.pow(2, attempt);
         console.warn(`[AI Analysis] Attempt ${attempt + 1} failed for ${conversationId}, retrying in ${backoff}ms`);
         await delay(backoff);
       }